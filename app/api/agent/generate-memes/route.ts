@@ -117,14 +117,18 @@ export async function POST(request: NextRequest) {
 }
 
 /**
- * GET /api/agent/generate-memes
- * Get current agent status
+ * GET /api/agent/generate-memes?job_id=...
+ * Get the status of one job, or of the agent's most recent job without job_id
  */
 export async function GET(request: NextRequest) {
   try {
-    console.log('[GENERATE_MEMES] Checking agent status...');
+    const jobId = request.nextUrl.searchParams.get('job_id');
+    console.log(`[GENERATE_MEMES] Checking agent status${jobId ? ` for job ${jobId}` : ''}...`);
 
-    const response = await fetch(`${KULFY_AGENT_URL}/status`, {
+    const statusUrl = jobId
+      ? `${KULFY_AGENT_URL}/jobs/${encodeURIComponent(jobId)}`
+      : `${KULFY_AGENT_URL}/status`;
+    const response = await fetch(statusUrl, {
       method: 'GET',
       headers: {
         'Content-Type': 'application/json',
@@ -0,0 +1,92 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { connectToDB } from '@/lib/db';
+import { validateUpload, getUploadUser, createUpload, UploadOutcome } from '@/lib/uploads';
+
+export const runtime = 'nodejs';
+
+// Keeps one request well under typical body size limits (6MB per file)
+const MAX_BULK_ITEMS = 10;
+
+/**
+ * Upload several memes in one multipart request.
+ *
+ * Item i is sent as `file.i` with optional `title.i`, `thumbnail.i`,
+ * `width.i`, `height.i` and `sourceUrl.i`; a plain `sourceUrl` applies to
+ * every item. Items are processed independently and the response lists
+ * one result per item, in index order.
+ */
+export async function POST(request: NextRequest) {
+  try {
+    const formData = await request.formData();
+
+    const indexes = Array.from(formData.keys())
+      .map(key => /^file\.(\d+)$/.exec(key))
+      .filter((match): match is RegExpExecArray => match !== null)
+      .map(match => Number(match[1]))
+      .sort((a, b) => a - b);
+
+    if (indexes.length === 0) {
+      return NextResponse.json(
+        { ok: false, error: 'No files provided' },
+        { status: 400 }
+      );
+    }
+    if (indexes.length > MAX_BULK_ITEMS) {
+      return NextResponse.json(
+        { ok: false, error: `At most ${MAX_BULK_ITEMS} files per request` },
+        { status: 400 }
+      );
+    }
+
+    const sharedSourceUrl = formData.get('sourceUrl') as string | null;
+
+    // Connect to MongoDB once for the whole batch
+    await connectToDB();
+    const user = await getUploadUser();
+
+    const results: (UploadOutcome & { index: number })[] = [];
+    for (const index of indexes) {
+      const fields = {
+        title: formData.get(`title.${index}`) as string | null,
+        sourceUrl: (formData.get(`sourceUrl.${index}`) as string | null) || sharedSourceUrl,
+        file: formData.get(`file.${index}`) as File,
+        thumbnail: formData.get(`thumbnail.${index}`) as File | null,
+        width: formData.get(`width.${index}`) as string | null,
+        height: formData.get(`height.${index}`) as string | null,
+      };
+
+      const { errors, ...dimensions } = validateUpload(fields);
+      if (errors.length > 0) {
+        results.push({ index, ok: false, error: 'Validation failed', details: errors });
+        continue;
+      }
+
+      try {
+        results.push({ index, ...await createUpload(fields, dimensions, user._id) });
+      } catch (error: any) {
+        console.error(`[UPLOAD] Bulk item ${index} failed:`, error);
+        results.push({ index, ok: false, error: error.message || 'Upload failed' });
+      }
+    }
+
+    const uploaded = results.filter(r => r.ok).length;
+    console.log(`[UPLOAD] Bulk upload: ${uploaded}/${results.length} items succeeded`);
+
+    return NextResponse.json({
+      ok: uploaded > 0,
+      results,
+      message: `${uploaded}/${results.length} files uploaded. Pending moderation.`,
+    });
+
+  } catch (error: any) {
+    console.error('[UPLOAD] Bulk error:', error);
+    return NextResponse.json(
+      {
+        ok: false,
+        error: 'Upload failed',
+        message: error.message
+      },
+      { status: 500 }
+    );
+  }
+}
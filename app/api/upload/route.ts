@@ -1,28 +1,14 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { z } from 'zod';
 import { connectToDB } from '@/lib/db';
-import { pinFileToPinata } from '@/lib/pinata';
-import User from '@/models/User';
+import { validateUpload, getUploadUser, createUpload } from '@/lib/uploads';
 import Post from '@/models/Post';
 
 export const runtime = 'nodejs';
 
-// Validation schema
-const uploadSchema = z.object({
-  title: z.string().max(140).optional(),
-  sourceUrl: z.string().url().optional().or(z.literal('')),
-  file: z.object({
-    type: z.enum(['image/png', 'image/jpeg', 'image/webp', 'image/gif']),
-    size: z.number().max(6 * 1024 * 1024), // 6MB max
-  }),
-});
-
 export async function POST(request: NextRequest) {
   try {
     // Parse multipart form data
     const formData = await request.formData();
-    const title = formData.get('title') as string | null;
-    const sourceUrl = formData.get('sourceUrl') as string | null;
     const file = formData.get('file') as File | null;
 
     if (!file) {
@@ -32,56 +18,38 @@ export async function POST(request: NextRequest) {
       );
     }
 
-    // Validate file
-    const validation = uploadSchema.safeParse({
-      title: title || undefined,
-      sourceUrl: sourceUrl || undefined,
-      file: {
-        type: file.type,
-        size: file.size,
-      },
-    });
+    const fields = {
+      title: formData.get('title') as string | null,
+      sourceUrl: formData.get('sourceUrl') as string | null,
+      file,
+      thumbnail: formData.get('thumbnail') as File | null,
+      width: formData.get('width') as string | null,
+      height: formData.get('height') as string | null,
+    };
 
-    if (!validation.success) {
-      const errors = validation.error.errors.map(e => `${e.path.join('.')}: ${e.message}`);
+    // Validate file
+    const { errors, ...dimensions } = validateUpload(fields);
+    if (errors.length > 0) {
       return NextResponse.json(
         { ok: false, error: 'Validation failed', details: errors },
         { status: 400 }
       );
     }
 
-    // Upload to Pinata
-    console.log(`[UPLOAD] Uploading file to Pinata: ${file.name} (${file.type}, ${file.size} bytes)`);
-    const { cid } = await pinFileToPinata(file);
-    console.log(`[UPLOAD] File uploaded successfully. CID: ${cid}`);
-
     // Connect to MongoDB
     await connectToDB();
+    const user = await getUploadUser();
 
-    // Upsert demo user
-    let user = await User.findOne({ handle: 'demo' });
-    if (!user) {
-      user = await User.create({ handle: 'demo' });
-      console.log('[UPLOAD] Created demo user');
+    const outcome = await createUpload(fields, dimensions, user._id);
+    if (!outcome.ok) {
+      return NextResponse.json(outcome, { status: 400 });
     }
 
-    // Create post with PENDING status
-    const post = await Post.create({
-      cid,
-      title: title || undefined,
-      mime: file.type,
-      userId: user._id,
-      status: 'PENDING',
-      sourceUrl: sourceUrl || undefined,
-    });
-
-    console.log(`[UPLOAD] Post created with ID: ${post._id}, status: ${post.status}`);
-
     return NextResponse.json({
-      ok: true,
-      id: post._id.toString(),
-      cid,
-      message: 'File uploaded successfully. Pending moderation.',
+      ...outcome,
+      message: outcome.duplicate
+        ? 'File was already uploaded.'
+        : 'File uploaded successfully. Pending moderation.',
     });
 
   } catch (error: any) {
@@ -97,3 +65,28 @@ export async function POST(request: NextRequest) {
   }
 }
 
+/**
+ * Check whether a CID is already posted, without sending the file.
+ * HEAD /api/upload?cid=<cid> answers 200 with the post ID in `X-Post-Id`, or 404.
+ */
+export async function HEAD(request: NextRequest) {
+  const cid = request.nextUrl.searchParams.get('cid');
+  if (!cid) {
+    return new NextResponse(null, { status: 400 });
+  }
+
+  try {
+    await connectToDB();
+    const post = await Post.findOne({ cid }).select('_id');
+    if (!post) {
+      return new NextResponse(null, { status: 404 });
+    }
+    return new NextResponse(null, {
+      status: 200,
+      headers: { 'X-Post-Id': post._id.toString() },
+    });
+  } catch (error: any) {
+    console.error('[UPLOAD] CID check error:', error);
+    return new NextResponse(null, { status: 500 });
+  }
+}
@@ -8,6 +8,7 @@ export const dynamic = 'force-dynamic';
 interface PostData {
   _id: string;
   cid: string;
+  thumbCid?: string;
   title?: string;
   mime: string;
   createdAt: Date;
@@ -24,6 +25,7 @@ async function getApprovedPosts(): Promise<PostData[]> {
   return posts.map(post => ({
     _id: post._id.toString(),
     cid: post.cid,
+    thumbCid: post.thumbCid,
     title: post.title,
     mime: post.mime,
     createdAt: post.createdAt,
@@ -76,7 +78,7 @@ export default async function FeedPage() {
             {posts.map((post) => (
               <Card
                 key={post._id}
-                imageUrl={cidToUrl(post.cid)}
+                imageUrl={cidToUrl(post.thumbCid || post.cid)}
                 title={post.title}
                 alt={post.title || 'Kulfy meme'}
                 postId={post._id}
@@ -102,7 +102,7 @@ export default function GeneratePage() {
       setProgress(10);
 
       // Poll for status with detailed updates
-      pollDetailedStatus();
+      pollDetailedStatus(data.job_id);
     } catch (err: any) {
       console.error('Failed to start generation:', err);
       setStatus('error');
@@ -112,7 +112,7 @@ export default function GeneratePage() {
     }
   };
 
-  const pollDetailedStatus = async () => {
+  const pollDetailedStatus = async (jobId?: string) => {
     let pollCount = 0;
     const maxPolls = 200; // 10 minutes max (200 * 3s)
     
@@ -120,7 +120,9 @@ export default function GeneratePage() {
       pollCount++;
       
       try {
-        const response = await fetch('/api/agent/generate-memes');
+        const response = await fetch(
+          jobId ? `/api/agent/generate-memes?job_id=${encodeURIComponent(jobId)}` : '/api/agent/generate-memes'
+        );
         const data = await response.json();
 
         // Update logs if available
@@ -140,7 +142,7 @@ export default function GeneratePage() {
         }
 
         // Update progress based on status
-        if (data.status === 'running' || data.is_running) {
+        if (data.status === 'queued' || data.status === 'running' || data.is_running) {
           // Estimate progress based on typical timings
           if (pollCount < 5) {
             if (!data.current_step) setCurrentStep('📥 Fetching content from URLs...');
@@ -155,11 +157,11 @@ export default function GeneratePage() {
           }
         }
 
-        if (data.status === 'idle' || data.status === 'completed' || data.status === 'error') {
+        if (data.status === 'idle' || data.status === 'completed' || data.status === 'failed' || data.status === 'error') {
           clearInterval(interval);
           setIsGenerating(false);
           
-          if (data.last_result) {
+          if (data.last_result && data.status !== 'failed') {
             setStatus('completed');
             setResult(data.last_result);
             setProgress(100);
@@ -170,10 +172,11 @@ export default function GeneratePage() {
               const summary = data.last_result.summary;
               addLog(`📊 Summary: ${summary.successful_uploads}/${summary.images_created} memes uploaded successfully`, 'success');
             }
-          } else if (data.status === 'error') {
+          } else if (data.status === 'error' || data.status === 'failed') {
+            const message = data.error || data.last_result?.error || 'Generation failed';
             setStatus('error');
-            setError(data.error || 'Generation failed');
-            addLog(`❌ Generation failed: ${data.error}`, 'error');
+            setError(message);
+            addLog(`❌ Generation failed: ${message}`, 'error');
           }
         }
 
@@ -11,19 +11,35 @@ This agent:
 
 import os
 import json
+import time
+import hashlib
+import random
+import threading
 import base64
 import requests
-from io import BytesIO
-from typing import TypedDict, List, Dict, Any, Annotated, Optional
-from bs4 import BeautifulSoup
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict, List, Dict, Any, Annotated, Optional, Callable
+from openai import OpenAI, RateLimitError
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import HumanMessage
-import aiohttp
 import asyncio
 from dotenv import load_dotenv
 import logging
 
+from fetcher import fetch_urls
+from extract import extract_articles, save_selector_profiles
+from cache import article_cache, concept_cache, image_cache, ARTICLE_CACHE_FRESH_SECONDS
+from dedupe import collapse_duplicates, story_index, image_hash, image_index, hamming, IMAGE_DEDUPE_DISTANCE, IMAGE_DEDUPE_ACTION
+from feeds import poll_feeds
+from json_stream import ConceptStreamParser
+from pipeline import Stage, StagePipeline
+from renditions import make_renditions, IMAGE_OUTPUT_FORMAT, TRANSCODE_POOL_SIZE
+from blobs import BlobStore
+from captions import render_caption
+from uploader import post_upload, find_existing, bulk_supported, mark_bulk_unsupported, BULK_UNSUPPORTED_STATUSES
+from cids import ipfs_cid, cid_index, UPLOAD_CID_CHECK
+from outbox import outbox, is_transient, start_worker as start_outbox_worker
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -54,6 +70,37 @@ os.environ['LANGCHAIN_VERBOSE'] = 'true'
 
 # Initialize OpenAI client
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+# 'streaming' starts image generation while concepts are still streaming in;
+# 'staged' finishes all concepts before the first image
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "streaming")
+
+# DALL-E calls in flight at once (shared by all jobs) and rate-limit backoff
+IMAGE_CONCURRENCY = int(os.getenv("IMAGE_CONCURRENCY", "5"))
+IMAGE_RATE_LIMIT_RETRIES = int(os.getenv("IMAGE_RATE_LIMIT_RETRIES", "4"))
+IMAGE_BACKOFF_SECONDS = float(os.getenv("IMAGE_BACKOFF_SECONDS", "2"))
+
+# Worker threads for the download and upload stages of the image pipeline
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "4"))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "2"))
+
+# 'single' uploads each meme as soon as it is ready; 'batch' sends a job's
+# memes to the bulk endpoint in requests of up to UPLOAD_BATCH_SIZE
+UPLOAD_MODE = os.getenv("UPLOAD_MODE", "single")
+UPLOAD_BATCH_SIZE = int(os.getenv("UPLOAD_BATCH_SIZE", "10"))
+
+# 'b64_json' returns the image bytes inside the DALL-E response;
+# 'url' returns a link that has to be downloaded separately
+IMAGE_RESPONSE_FORMAT = os.getenv("IMAGE_RESPONSE_FORMAT", "b64_json")
+
+# 'dalle' bakes the caption into the DALL-E prompt; 'template' generates a
+# caption-free base scene and renders captions locally (see captions.py)
+CAPTION_MODE = os.getenv("CAPTION_MODE", "dalle")
+
+# The graph is synchronous (blocking HTTP and OpenAI calls), so the async
+# entry points run it on this pool and never block the caller's event loop
+GRAPH_WORKERS = int(os.getenv("GRAPH_WORKERS", "4"))
+_graph_executor = ThreadPoolExecutor(GRAPH_WORKERS, thread_name_prefix="kulfy-graph")
 logger.info("="*60)
 logger.info("🎭 KULFY MEME GENERATION AGENT - LANGCHAIN LOGGING ENABLED")
 logger.info("="*60)
@@ -69,6 +116,13 @@ class AgentState(TypedDict):
     errors: List[str]                        # Any errors encountered
     status: str                              # Current status
     status_callback: Any                     # Callback for status updates
+    covered_stories: List[Dict[str, Any]]    # Articles we already generated concepts for
+    force_refresh: bool                      # Bypass cached results and call the APIs again
+    concept_listener: Any                    # Called with each concept as soon as it is parsed
+    stage_timings: Dict[str, Dict[str, Any]] # Per-stage timing of the image pipeline
+    image_store: Any                         # BlobStore holding this job's image payloads
+    memory_stats: Dict[str, Any]             # Current/peak image payload bytes and process peak RSS
+    caption_mode: str                        # 'dalle' or 'template' (see CAPTION_MODE)
 
 
 # ============================================================================
@@ -107,94 +161,82 @@ def fetch_content_from_urls(state: AgentState) -> AgentState:
         state['status'] = 'scraped_fallback'
         return state
     
-    articles = []
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-    }
+    urls = urls[:10]  # Limit to 10 URLs
+    fetched = {}  # url -> article, so results keep the input order
     
-    for url in urls[:10]:  # Limit to 10 URLs
-        try:
-            log(f"   Fetching: {url[:60]}...")
-            response = requests.get(url, headers=headers, timeout=15)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # DEBUG: Show raw HTML structure
-            print(f"\n🔍 [DEBUG] Parsing URL: {url}")
-            
-            # Try to extract title - improved selectors
-            title = None
-            title_selectors = [
-                'h1.article-title',
-                'h1.entry-title', 
-                'h1[itemprop="headline"]',
-                'meta[property="og:title"]',
-                'h1',
-                'h2.title',
-                '.article-title',
-                '.post-title',
-                'title'
-            ]
-            
-            for selector in title_selectors:
-                if selector.startswith('meta'):
-                    element = soup.select_one(selector)
-                    if element and element.get('content'):
-                        title = element.get('content')
-                        print(f"   ✅ Title found via {selector}: {title[:60]}...")
-                        break
-                else:
-                    element = soup.select_one(selector)
-                    if element:
-                        title = element.get_text(strip=True)
-                        if len(title) > 10 and not title.lower().startswith(('home', 'menu', 'skip')):
-                            print(f"   ✅ Title found via {selector}: {title[:60]}...")
-                            break
-            
-            # Try to extract main content - improved selectors
-            content = ''
-            content_selectors = [
-                'div[itemprop="articleBody"]',
-                'article.post-content',
-                'div.article-content',
-                '.entry-content',
-                'article',
-                '.post-content',
-                'main article'
-            ]
-            
-            for selector in content_selectors:
-                elements = soup.select(selector)
-                if elements:
-                    # Get text from all paragraphs within the content
-                    paragraphs = elements[0].find_all('p')
-                    if paragraphs:
-                        content = ' '.join([p.get_text(strip=True) for p in paragraphs[:10]])
-                        if len(content) > 100:
-                            print(f"   ✅ Content found via {selector}: {len(content)} chars")
-                            break
-            
-            # Extract all paragraphs as fallback
-            if len(content) < 100:
-                paragraphs = soup.find_all('p')
-                content = ' '.join([p.get_text(strip=True) for p in paragraphs[:10]])
-                print(f"   ⚠️  Using fallback paragraph extraction: {len(content)} chars")
-            
-            if title or content:
-                articles.append({
-                    'title': title or 'Article from ' + url.split('/')[2],
-                    'snippet': content[:500] if content else '',  # First 500 chars
-                    'url': url
-                })
-                log(f"   ✅ Fetched: {title or 'Untitled'}", 'success')
-            else:
-                print(f"   ⚠️  No content found")
-                
-        except Exception as e:
-            error_msg = f"Failed to fetch {url}: {str(e)}"
+    # Serve fresh cache hits directly; revalidate stale entries with conditional GETs
+    cache = article_cache()
+    cached_entries = {}
+    conditional_headers = {}
+    urls_to_fetch = []
+    for url in urls:
+        entry = cache.get(url)
+        if entry and time.time() - entry['stored_at'] < ARTICLE_CACHE_FRESH_SECONDS:
+            fetched[url] = json.loads(entry['value'])
+            log(f"   ♻️  Cache hit: {fetched[url]['title'][:60]}", 'success')
+            continue
+        if entry:
+            cached_entries[url] = entry
+            validators = {}
+            if entry['meta'].get('etag'):
+                validators['If-None-Match'] = entry['meta']['etag']
+            if entry['meta'].get('last_modified'):
+                validators['If-Modified-Since'] = entry['meta']['last_modified']
+            if validators:
+                conditional_headers[url] = validators
+        urls_to_fetch.append(url)
+        log(f"   Fetching: {url[:60]}...")
+    
+    # Fetch all URLs concurrently - the batch takes about as long as the slowest URL
+    start_time = time.time()
+    responses = fetch_urls(urls_to_fetch, conditional_headers)
+    if urls_to_fetch:
+        log(f"   ⏱️  Fetched {len(urls_to_fetch)} URLs in {time.time() - start_time:.1f} seconds", 'info')
+    
+    to_parse = []  # Raw pages handed to the parser pool in one batch
+    for response in responses:
+        url = response['url']
+        if response['status'] == 304 and url in cached_entries:
+            # Not modified - reuse the cached extraction without parsing
+            cache.refresh(url, {
+                'etag': response['headers'].get('etag'),
+                'last_modified': response['headers'].get('last-modified'),
+            })
+            fetched[url] = json.loads(cached_entries[url]['value'])
+            log(f"   ♻️  Not modified: {fetched[url]['title'][:60]}", 'success')
+        elif response['error']:
+            error_msg = f"Failed to fetch {url}: {response['error']}"
+            print(f"   ❌ {error_msg}")
+            state['errors'].append(error_msg)
+        else:
+            if response['truncated']:
+                print(f"   ✂️  Stopped reading {url[:60]} after {len(response['content']) // 1024} KB")
+            to_parse.append(response)
+    
+    parsed = extract_articles([(response['content'], response['url']) for response in to_parse])
+    for response, (article, error) in zip(to_parse, parsed):
+        url = response['url']
+        if error:
+            error_msg = f"Failed to fetch {url}: {error}"
             print(f"   ❌ {error_msg}")
             state['errors'].append(error_msg)
+        elif article:
+            fetched[url] = article
+            cache.put(url, json.dumps(article).encode('utf-8'), {
+                'etag': response['headers'].get('etag'),
+                'last_modified': response['headers'].get('last-modified'),
+            })
+            log(f"   ✅ Fetched: {article['title']}", 'success')
+        else:
+            print(f"   ⚠️  No content found")
+    
+    articles = [fetched[url] for url in urls if url in fetched]
+    save_selector_profiles()
+    
+    # The same story is often syndicated under several URLs - keep one of each
+    articles, duplicates = collapse_duplicates(articles)
+    for duplicate in duplicates:
+        log(f"   🔁 Skipping near-duplicate story: {duplicate['title'][:60]}")
     
     if len(articles) == 0:
         print("⚠️  [FETCH] No articles fetched, using fallback content...")
@@ -223,6 +265,128 @@ def fetch_content_from_urls(state: AgentState) -> AgentState:
 # NODE 2: ANALYZE & GENERATE MEME CONCEPTS
 # ============================================================================
 
+# Bump CONCEPT_PROMPT_VERSION whenever the concepts prompt changes, so cached
+# concepts generated from the old prompt are not reused
+CONCEPT_MODEL = "gpt-4-turbo-preview"
+CONCEPT_TEMPERATURE = 0.8  # Balanced creativity with coherence
+CONCEPT_PROMPT_VERSION = "1"
+
+CONCEPT_SYSTEM_PROMPT = """You are an expert Telugu meme creator specializing in content for young Telugu audiences (20-40 years old).
+
+Your memes are:
+- Witty and culturally relevant to modern Telugu youth
+- Use correct English spelling and grammar (NO TYPOS)
+- Reference Telugu cinema, OTT content, tech, and contemporary lifestyle
+- Avoid outdated references or old-generation humor
+- Shareable on social media platforms
+
+Focus on native Telugu appeal - not generic Indian content. The humor should resonate specifically with Telugu-speaking millennials and Gen Z who are bilingual, tech-savvy, and consume both Telugu and English content."""
+
+
+def concept_cache_key(content_summary: str) -> str:
+    """Cache key for concepts: content, prompt version, model and temperature"""
+    payload = json.dumps([content_summary, CONCEPT_PROMPT_VERSION, CONCEPT_MODEL, CONCEPT_TEMPERATURE])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def request_meme_concepts(prompt: str, log, on_concept=None) -> List[Dict[str, str]]:
+    """
+    Calls GPT-4 with the concepts prompt and returns up to 5 parsed meme concepts.
+    Raises if the call fails or no concepts can be found in the response.
+    
+    The completion is streamed: each concept is parsed and passed to
+    on_concept(index, concept) as soon as its JSON object closes, long before
+    the whole response has arrived.
+    """
+    log("   🤖 Calling GPT-4 API (this may take 30-60 seconds)...", 'info', 'GPT-4 analyzing')
+    log("   ⏳ Streaming meme concepts as GPT-4 writes them...")
+    
+    parser = ConceptStreamParser()
+    try:
+        start_time = time.time()
+        
+        stream = client.chat.completions.create(
+            model=CONCEPT_MODEL,
+            messages=[
+                {"role": "system", "content": CONCEPT_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=CONCEPT_TEMPERATURE,
+            response_format={"type": "json_object"},
+            timeout=90.0,  # 90 second timeout
+            stream=True,
+        )
+        
+        for chunk in stream:
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            completed = parser.feed(chunk.choices[0].delta.content)
+            first_index = len(parser.concepts) - len(completed) + 1
+            for index, concept in enumerate(completed, first_index):
+                if index > 5:
+                    continue
+                if index == 1:
+                    log(f"   ⚡ First concept after {time.time() - start_time:.1f} seconds", 'info')
+                if on_concept:
+                    on_concept(index, concept)
+        
+        elapsed_time = time.time() - start_time
+        log(f"   ⏱️  GPT-4 API call took {elapsed_time:.1f} seconds", 'info')
+        
+    except Exception as api_error:
+        error_msg = f"GPT-4 API call failed: {str(api_error)}"
+        print(f"   ❌ {error_msg}")
+        raise Exception(error_msg)
+    
+    log("   ✅ GPT-4 response received! Parsing meme concepts...", 'success')
+    
+    # The full response stays authoritative - streamed concepts are an early preview
+    return parse_meme_concepts(parser.text, log)
+
+
+def parse_meme_concepts(raw_response: str, log) -> List[Dict[str, str]]:
+    """Finds the meme concepts array in a GPT-4 JSON response (returns up to 5)"""
+    log(f"   🔍 Raw GPT-4 response preview: {raw_response[:200]}...")
+    
+    memes_data = json.loads(raw_response)
+    print(f"   🔍 Parsed JSON type: {type(memes_data)}")
+    print(f"   🔍 JSON keys: {memes_data.keys() if isinstance(memes_data, dict) else 'N/A'}")
+    
+    # Handle different JSON structures
+    meme_concepts = []
+    if isinstance(memes_data, dict):
+        # Try different possible keys
+        for key in ['memes', 'concepts', 'meme_concepts', 'data', 'items']:
+            if key in memes_data:
+                meme_concepts = memes_data[key]
+                print(f"   ✅ Found memes under key: '{key}'")
+                break
+        
+        # If no array found, check if the dict itself contains meme properties
+        if not meme_concepts and all(k in memes_data for k in ['title', 'text_overlay']):
+            # Single meme returned as dict instead of array
+            meme_concepts = [memes_data]
+            print(f"   ⚠️  Single meme detected, wrapping in array")
+        
+        # Last resort: look for any key with array value
+        if not meme_concepts:
+            for key, value in memes_data.items():
+                if isinstance(value, list) and len(value) > 0:
+                    meme_concepts = value
+                    print(f"   ⚠️  Found array under key: '{key}'")
+                    break
+    elif isinstance(memes_data, list):
+        meme_concepts = memes_data
+        print(f"   ✅ Response is already an array")
+    
+    # Validate we got memes
+    if not meme_concepts:
+        raise ValueError(f"No meme concepts found in GPT-4 response. Response keys: {memes_data.keys() if isinstance(memes_data, dict) else 'N/A'}")
+    
+    # Ensure we have exactly 5 concepts
+    return meme_concepts[:5]
+
+
 def generate_meme_concepts(state: AgentState) -> AgentState:
     """
     Uses GPT-4 to analyze scraped content and generate 5 meme concepts.
@@ -236,6 +400,36 @@ def generate_meme_concepts(state: AgentState) -> AgentState:
     
     log("🧠 [ANALYZE] Generating meme concepts with GPT-4...", 'info', 'Analyzing content')
     
+    # Skip stories we already covered in an earlier run and surface their concepts instead
+    # (unless the caller asked for fresh concepts)
+    index = story_index()
+    articles = []
+    covered = []
+    for article in state['scraped_content'][:10]:
+        match = index.find(article) if article.get('url') and not state.get('force_refresh') else None
+        if match:
+            covered.append({
+                'title': article['title'],
+                'url': article.get('url'),
+                'covered_title': match['title'],
+                'covered_at': match['created_at'],
+                'concepts': match['concepts'],
+            })
+            log(f"   ♻️  Already covered: {article['title'][:60]} ({len(match['concepts'])} earlier concepts)")
+        else:
+            articles.append(article)
+    state['covered_stories'] = covered
+    
+    if covered and not articles:
+        # Nothing new to analyze - reuse the earlier concepts without calling GPT-4
+        meme_concepts = [concept for story in covered for concept in story['concepts']][:5]
+        log(f"✅ [ANALYZE] All stories already covered, reusing {len(meme_concepts)} earlier meme concepts", 'success')
+        for i, meme in enumerate(meme_concepts, 1):
+            log(f"   {i}. {meme.get('title', 'Untitled')}")
+        state['meme_concepts'] = meme_concepts
+        state['status'] = 'concepts_ready'
+        return state
+    
     # Verify OpenAI API key
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
@@ -249,15 +443,15 @@ def generate_meme_concepts(state: AgentState) -> AgentState:
         log("   📝 Preparing content summary from fetched articles...")
         content_summary = "\n".join([
             f"- {article['title']}: {article['snippet'][:100]}"
-            for article in state['scraped_content'][:10]
+            for article in articles
         ])
-        log(f"   ✅ Content summary prepared ({len(state['scraped_content'])} articles)", 'success')
+        log(f"   ✅ Content summary prepared ({len(articles)} articles)", 'success')
         
         # DEBUG: Show what content is being sent to GPT-4
         print("\n" + "="*60)
         print("🔍 [DEBUG] Content being sent to GPT-4:")
         print("="*60)
-        for i, article in enumerate(state['scraped_content'][:10], 1):
+        for i, article in enumerate(articles, 1):
             print(f"\n📄 Article {i}:")
             print(f"   Title: {article['title']}")
             print(f"   URL: {article.get('url', 'N/A')}")
@@ -309,87 +503,31 @@ Generate exactly 5 meme concepts as a JSON array. Ensure ALL text has correct sp
         print(prompt)
         print("="*60 + "\n")
 
-        log("   🤖 Calling GPT-4 API (this may take 30-60 seconds)...", 'info', 'GPT-4 analyzing')
-        log("   ⏳ Please wait while AI analyzes content and generates meme concepts...")
+        def on_concept(index, concept):
+            """Publishes each concept to /status the moment it is parsed"""
+            message = f"   💡 Concept {index}/5: {concept.get('title', 'Untitled')}"
+            print(message)
+            if callback:
+                callback('concept', message, f'Concept {index}/5 ready', data=concept)
+            listener = state.get('concept_listener')
+            if listener:
+                listener(index, concept)
         
-        try:
-            import time
-            start_time = time.time()
-            
-            response = client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": """You are an expert Telugu meme creator specializing in content for young Telugu audiences (20-40 years old).
-
-Your memes are:
-- Witty and culturally relevant to modern Telugu youth
-- Use correct English spelling and grammar (NO TYPOS)
-- Reference Telugu cinema, OTT content, tech, and contemporary lifestyle
-- Avoid outdated references or old-generation humor
-- Shareable on social media platforms
-
-Focus on native Telugu appeal - not generic Indian content. The humor should resonate specifically with Telugu-speaking millennials and Gen Z who are bilingual, tech-savvy, and consume both Telugu and English content."""
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.8,  # Balanced creativity with coherence
-                response_format={"type": "json_object"},
-                timeout=90.0  # 90 second timeout
-            )
-            
-            elapsed_time = time.time() - start_time
-            log(f"   ⏱️  GPT-4 API call took {elapsed_time:.1f} seconds", 'info')
-            
-        except Exception as api_error:
-            error_msg = f"GPT-4 API call failed: {str(api_error)}"
-            print(f"   ❌ {error_msg}")
-            raise Exception(error_msg)
-        
-        log("   ✅ GPT-4 response received! Parsing meme concepts...", 'success')
-        
-        # Parse JSON response
-        raw_response = response.choices[0].message.content
-        log(f"   🔍 Raw GPT-4 response preview: {raw_response[:200]}...")
-        
-        memes_data = json.loads(raw_response)
-        print(f"   🔍 Parsed JSON type: {type(memes_data)}")
-        print(f"   🔍 JSON keys: {memes_data.keys() if isinstance(memes_data, dict) else 'N/A'}")
-        
-        # Handle different JSON structures
-        meme_concepts = []
-        if isinstance(memes_data, dict):
-            # Try different possible keys
-            for key in ['memes', 'concepts', 'meme_concepts', 'data', 'items']:
-                if key in memes_data:
-                    meme_concepts = memes_data[key]
-                    print(f"   ✅ Found memes under key: '{key}'")
-                    break
-            
-            # If no array found, check if the dict itself contains meme properties
-            if not meme_concepts and all(k in memes_data for k in ['title', 'text_overlay']):
-                # Single meme returned as dict instead of array
-                meme_concepts = [memes_data]
-                print(f"   ⚠️  Single meme detected, wrapping in array")
-            
-            # Last resort: look for any key with array value
-            if not meme_concepts:
-                for key, value in memes_data.items():
-                    if isinstance(value, list) and len(value) > 0:
-                        meme_concepts = value
-                        print(f"   ⚠️  Found array under key: '{key}'")
-                        break
-        elif isinstance(memes_data, list):
-            meme_concepts = memes_data
-            print(f"   ✅ Response is already an array")
-        
-        # Validate we got memes
-        if not meme_concepts:
-            raise ValueError(f"No meme concepts found in GPT-4 response. Response keys: {memes_data.keys() if isinstance(memes_data, dict) else 'N/A'}")
-        
-        # Ensure we have exactly 5 concepts
-        meme_concepts = meme_concepts[:5]
+        # Identical content (e.g. an editor retrying) reuses the concepts from last time
+        cache_key = concept_cache_key(content_summary)
+        cached = None if state.get('force_refresh') else concept_cache().get(cache_key)
+        if cached:
+            meme_concepts = json.loads(cached['value'])
+            age_minutes = (time.time() - cached['stored_at']) / 60
+            log(f"   ⚡ Reusing cached concepts for identical content (cached {age_minutes:.0f} min ago)", 'success', 'Using cached concepts')
+            for index, concept in enumerate(meme_concepts, 1):
+                on_concept(index, concept)
+        else:
+            meme_concepts = request_meme_concepts(prompt, log, on_concept)
+            concept_cache().put(cache_key, json.dumps(meme_concepts).encode('utf-8'), {
+                'model': CONCEPT_MODEL,
+                'prompt_version': CONCEPT_PROMPT_VERSION,
+            })
         
         log(f"✅ [ANALYZE] Generated {len(meme_concepts)} meme concepts", 'success')
         for i, meme in enumerate(meme_concepts, 1):
@@ -398,6 +536,11 @@ Focus on native Telugu appeal - not generic Indian content. The humor should res
         state['meme_concepts'] = meme_concepts
         state['status'] = 'concepts_ready'
         
+        # Remember which stories these concepts cover so later runs can skip them
+        for article in articles:
+            if article.get('url'):
+                index.add(article, meme_concepts)
+        
     except Exception as e:
         error_msg = f"Concept generation failed: {str(e)}"
         print(f"❌ [ANALYZE] {error_msg}")
@@ -447,45 +590,111 @@ Focus on native Telugu appeal - not generic Indian content. The humor should res
 # NODE 3: GENERATE IMAGES WITH DALL-E 3
 # ============================================================================
 
-def generate_images(state: AgentState, custom_prompts: Optional[List[Dict[str, str]]] = None) -> AgentState:
+IMAGE_MODEL = "dall-e-3"
+IMAGE_SIZE = "1024x1024"  # Square format
+IMAGE_QUALITY = "standard"  # "hd" is more expensive
+
+# Process-wide, so concurrent jobs share the same DALL-E budget
+_dalle_slots = threading.BoundedSemaphore(max(1, IMAGE_CONCURRENCY))
+
+
+def image_cache_key(dalle_prompt: str) -> str:
+    """Cache key for a generated image: final prompt, model, size and quality"""
+    payload = json.dumps([dalle_prompt, IMAGE_MODEL, IMAGE_SIZE, IMAGE_QUALITY])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def generate_dalle_image(dalle_prompt: str, log, response_format: str = IMAGE_RESPONSE_FORMAT):
     """
-    Creates cartoon-style meme images using DALL-E 3.
-    Generates one image per meme concept.
-    Saves to local disk and uploads immediately after each generation.
-    
-    Args:
-        state: Agent state with meme concepts
-        custom_prompts: Optional list of custom prompts to override concepts.
-                        Each dict should have 'visual_description' and 'text_overlay'
+    Calls DALL-E 3, backing off exponentially (with jitter, or as long as the
+    Retry-After header asks) when the API rate-limits us.
     """
-    callback = state.get('status_callback')
-    def log(msg, log_type='info', step=None):
-        print(msg)
-        if callback:
-            callback(log_type, msg, step)
+    for attempt in range(IMAGE_RATE_LIMIT_RETRIES + 1):
+        try:
+            with _dalle_slots:
+                return client.images.generate(
+                    model=IMAGE_MODEL,
+                    prompt=dalle_prompt,
+                    size=IMAGE_SIZE,
+                    quality=IMAGE_QUALITY,
+                    response_format=response_format,
+                    n=1,
+                )
+        except RateLimitError as e:
+            if attempt == IMAGE_RATE_LIMIT_RETRIES:
+                raise
+            delay = IMAGE_BACKOFF_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5)
+            retry_after = getattr(getattr(e, 'response', None), 'headers', {}).get('retry-after')
+            try:
+                delay = max(delay, float(retry_after))
+            except (TypeError, ValueError):
+                pass
+            log(f"   ⏳ DALL-E rate limit hit, retrying in {delay:.1f}s (attempt {attempt + 2}/{IMAGE_RATE_LIMIT_RETRIES + 1})", 'warning')
+            time.sleep(delay)
+
+
+def caption_variants(concept: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Expands a concept with 'caption_variants' into one concept per caption.
+    In template mode they all share one base scene.
+    """
+    variants = concept.get('caption_variants') or []
+    if not variants:
+        return [concept]
+    expanded = []
+    for n, caption in enumerate([concept.get('text_overlay', '')] + list(variants), 1):
+        if not caption or any(c['text_overlay'] == caption for c in expanded):
+            continue
+        variant = {k: v for k, v in concept.items() if k != 'caption_variants'}
+        variant['text_overlay'] = caption
+        if n > 1:
+            variant['title'] = f"{concept.get('title', 'Meme')} ({n})"
+        expanded.append(variant)
+    return expanded
+
+
+def meme_pipeline(state: AgentState, total: Callable[[], int], log) -> StagePipeline:
+    """
+    Starts the generate -> download -> caption -> transcode -> dedupe -> upload
+    pipeline for one job.
     
-    log("\n🎨 [DALLE] Generating cartoon images...", 'info', 'Generating images')
+    Submit {'index': i, 'concept': concept} items, then call finish_images().
+    total() is the number of items submitted so far, for progress messages;
+    while concepts stream in it can still grow.
+    Each stage records its own errors in state['errors']. In batch upload mode
+    the upload stage only collects items; they are sent when the pipeline closes.
+    """
+    upload_url = os.getenv("KULFY_UPLOAD_URL", "http://localhost:3000/api/upload")
+    bulk_url = os.getenv("KULFY_BULK_UPLOAD_URL", upload_url.rstrip('/') + '/bulk')
+    batch = UPLOAD_MODE == 'batch'
+    source_url = None
+    if state.get('scraped_content') and len(state['scraped_content']) > 0:
+        source_url = state['scraped_content'][0].get('url')
     
-    # Use custom prompts if provided, otherwise use concepts from state
-    concepts_to_use = custom_prompts if custom_prompts else state['meme_concepts']
-    log(f"   🎯 Will create {len(concepts_to_use)} memes")
-    if custom_prompts:
-        log("   ✏️  Using custom/edited prompts from user", 'info')
+    # Image payloads live here; state only holds handles to them
+    store = BlobStore()
+    state['image_store'] = store
     
-    generated_images = []
-    upload_url = os.getenv("KULFY_UPLOAD_URL", "http://localhost:3000/api/upload")
-    upload_results = []
+    template = (state.get('caption_mode') or CAPTION_MODE) == 'template'
+    # Base scenes being generated in this job, so caption variants wait for one
+    # DALL-E call instead of each making their own
+    bases = {}
+    bases_lock = threading.Lock()
     
-    for i, concept in enumerate(concepts_to_use, 1):
+    def generate(item):
+        i, concept = item['index'], item['concept']
         try:
             title = concept.get('title', f'Meme {i}')
             text_overlay = concept.get('text_overlay', '')
             visual_desc = concept.get('visual_description', concept.get('title', ''))
             
-            log(f"\n   🖼️  Generating image {i}/{len(concepts_to_use)}: {title}", 'info', f'Generating image {i}/{len(concepts_to_use)}')
+            log(f"\n   🖼️  Generating image {i}/{total()}: {title}", 'info', f'Generating image {i}/{total()}')
             log(f"   📝 Text overlay: {text_overlay[:60]}...")
             log(f"   🎨 Visual description: {visual_desc[:80]}...")
             
+            if template:
+                return generate_base(item, visual_desc)
+            
             # Craft DALL-E prompt
             dalle_prompt = f"""Create a cartoon-style meme image:
 
@@ -503,109 +712,537 @@ STYLE:
 
 Make it funny and exaggerated!"""
 
-            log(f"   🎨 Calling DALL-E 3 API (this may take 20-40 seconds)...")
-            
-            # Generate image with DALL-E 3
-            response = client.images.generate(
-                model="dall-e-3",
-                prompt=dalle_prompt,
-                size="1024x1024",  # Square format
-                quality="standard",  # "hd" is more expensive
-                n=1,
-            )
+            # Resubmitted prompts (e.g. after a failed upload) reuse the earlier art
+            item['cache_key'] = image_cache_key(dalle_prompt)
+            cached = None if state.get('force_refresh') else image_cache().get(item['cache_key'])
+            if cached:
+                item['image_url'] = None
+                item['image_data'] = cached['value']
+                item['cached'] = True
+                log(f"   ⚡ Reusing cached image {i} for an identical prompt", 'success')
+                return item
             
-            image_url = response.data[0].url
-            log(f"   ✅ DALL-E 3 image generated!", 'success')
+            log(f"   🎨 Calling DALL-E 3 API for image {i} (this may take 20-40 seconds)...")
             
-            # Download image
-            log(f"   📥 Downloading image from OpenAI...")
-            img_response = requests.get(image_url, timeout=30)
-            img_response.raise_for_status()
-            image_data = img_response.content
-            log(f"   ✅ Image downloaded ({len(image_data) // 1024} KB)", 'success')
-            
-            generated_images.append({
-                'concept': concept,
-                'image_url': image_url,
-                'image_data': image_data,
-                'mime': 'image/png',
-                'title': concept.get('title', f'Telugu Meme {i}'),
-                'source_url': state['scraped_content'][0]['url'] if state.get('scraped_content') and len(state['scraped_content']) > 0 else None,
-            })
+            # Generate image with DALL-E 3
+            response = generate_dalle_image(dalle_prompt, log)
             
-            # Upload immediately to Kulfy
-            log(f"   ⬆️  Uploading to Kulfy app...", 'info', f'Uploading image {i}/5')
+            image = response.data[0]
+            item['image_url'] = image.url
+            if image.b64_json:
+                # Decoded once here; these bytes go straight into the upload
+                item['image_data'] = base64.b64decode(image.b64_json)
+            log(f"   ✅ DALL-E 3 image {i} generated!", 'success')
+            return item
+        except Exception as e:
+            error_msg = f"Image {i} generation failed: {str(e)}"
+            print(f"   ❌ {error_msg}")
+            state['errors'].append(error_msg)
+            return None
+    
+    def generate_base(item, visual_desc):
+        """Template mode: one caption-free scene per visual description"""
+        i = item['index']
+        item['caption'] = item['concept'].get('text_overlay', '')
+        base_prompt = f"""Create a cartoon-style meme background image:
+
+SCENE: {visual_desc}
+
+STYLE:
+- Cartoon/comic art style
+- Bold, expressive characters
+- Telugu cinema/culture aesthetic
+- Bright colors
+- Suitable for social media meme format
+- Leave clear space at the top and bottom for a caption
+- Do NOT include any text, letters, captions or speech bubbles
+
+Make it funny and exaggerated!"""
+        item['cache_key'] = image_cache_key(base_prompt)
+        item['image_url'] = None
+        
+        with bases_lock:
+            shared = bases.get(item['cache_key'])
+            owner = shared is None
+            if owner:
+                shared = bases[item['cache_key']] = {'ready': threading.Event(), 'data': None}
+        if not owner:
+            log(f"   🧩 Image {i} reuses the base scene of another caption variant")
+            shared['ready'].wait()
+            if shared['data'] is None:
+                raise RuntimeError("base scene generation failed")
+            item['image_data'] = shared['data']
+            item['cached'] = item['shared_base'] = True
+            return item
+        
+        try:
+            cached = None if state.get('force_refresh') else image_cache().get(item['cache_key'])
+            if cached:
+                item['image_data'] = cached['value']
+                item['cached'] = True
+                log(f"   ⚡ Reusing cached base scene for image {i}", 'success')
+            else:
+                log(f"   🎨 Calling DALL-E 3 API for caption-free base scene {i} (this may take 20-40 seconds)...")
+                # Inline bytes, so waiting caption variants can share them
+                response = generate_dalle_image(base_prompt, log, response_format='b64_json')
+                item['image_data'] = base64.b64decode(response.data[0].b64_json)
+                log(f"   ✅ DALL-E 3 base scene {i} generated!", 'success')
+            shared['data'] = item['image_data']
+            return item
+        finally:
+            shared['ready'].set()
+    
+    def download(item):
+        i, concept = item['index'], item['concept']
+        # Inline (b64_json) images arrive with their bytes - nothing to fetch
+        image_data = item.pop('image_data', None)
+        if image_data is None:
             try:
-                files = {
-                    'file': ('meme.png', BytesIO(image_data), 'image/png')
-                }
-                
-                # Include source URL if available
-                source_url = None
-                if state.get('scraped_content') and len(state['scraped_content']) > 0:
-                    source_url = state['scraped_content'][0].get('url')
-                
-                data = {
-                    'title': f"🤖 {concept.get('title', f'Telugu Meme {i}')} [AI-Generated]",
-                }
-                
-                if source_url:
-                    data['sourceUrl'] = source_url
-                
-                upload_response = requests.post(
-                    upload_url,
-                    files=files,
-                    data=data,
-                    timeout=30
-                )
-                
-                if upload_response.status_code == 200:
-                    result = upload_response.json()
-                    upload_results.append({
-                        'success': True,
-                        'title': concept.get('title', f'Telugu Meme {i}'),
-                        'cid': result.get('cid'),
-                        'id': result.get('id'),
-                    })
-                    log(f"   ✅ Upload successful!", 'success')
-                    log(f"   🔗 CID: {result.get('cid', 'N/A')[:20]}...")
-                    log(f"   🆔 Post ID: {result.get('id', 'N/A')}")
-                else:
-                    error_msg = f"Upload failed with status {upload_response.status_code}"
-                    print(f"   ❌ {error_msg}")
-                    upload_results.append({
-                        'success': False,
-                        'title': concept.get('title', f'Telugu Meme {i}'),
-                        'error': error_msg,
-                    })
-                    state['errors'].append(error_msg)
-                    
-            except Exception as upload_error:
-                error_msg = f"Upload failed: {str(upload_error)}"
+                log(f"   📥 Downloading image {i} from OpenAI...")
+                img_response = requests.get(item['image_url'], timeout=30)
+                img_response.raise_for_status()
+                image_data = img_response.content
+                log(f"   ✅ Image {i} downloaded ({len(image_data) // 1024} KB)", 'success')
+            except Exception as e:
+                error_msg = f"Image {i} download failed: {str(e)}"
                 print(f"   ❌ {error_msg}")
-                upload_results.append({
-                    'success': False,
-                    'title': concept.get('title', f'Telugu Meme {i}'),
-                    'error': error_msg,
-                })
                 state['errors'].append(error_msg)
-            
+                return None
+        
+        if not item.get('cached'):
+            image_cache().put(item['cache_key'], image_data, {'model': IMAGE_MODEL, 'size': IMAGE_SIZE, 'quality': IMAGE_QUALITY})
+        
+        item['generated_image'] = {
+            'concept': concept,
+            'image_url': item['image_url'],
+            'image': store.put(image_data),
+            'mime': 'image/png',
+            'title': concept.get('title', f'Telugu Meme {i}'),
+            'source_url': source_url,
+            'cached': bool(item.get('cached')),
+        }
+        return item
+    
+    def caption(item):
+        i = item['index']
+        image = item['generated_image']
+        if 'caption' not in item:
+            return item
+        try:
+            captioned = render_caption(image['image'].read(), item['caption'])
         except Exception as e:
-            error_msg = f"Image {i} generation failed: {str(e)}"
+            error_msg = f"Image {i} caption rendering failed: {str(e)}"
             print(f"   ❌ {error_msg}")
             state['errors'].append(error_msg)
+            image['image'].release()
+            return None
+        log(f"   🔤 Rendered caption on image {i}: {item['caption'][:60]}")
+        image['image'].release()
+        image['image'] = store.put(captioned)
+        image['caption'] = item['caption']
+        return item
+    
+    # Hashes of this job's images, so two near-identical images in flight
+    # at the same time are caught before either has been uploaded
+    job_hashes = []
+    
+    def dedupe(item):
+        i = item['index']
+        image = item['generated_image']
+        # Exact bytes Kulfy already has are not duplicates to skip, they are
+        # already uploaded; this needs the transcoded bytes, hence the stage order
+        if already_uploaded(item):
+            return item
+        try:
+            fingerprint = image_hash(image['image'].read())
+        except Exception as e:
+            log(f"   ⚠️  Could not hash image {i}, skipping duplicate check: {str(e)}", 'warning')
+            return item
+        item['image_hash'] = fingerprint
+        
+        # Caption variants on a deliberately reused base scene are not duplicates
+        reused_base = 'caption' in item and item.get('cached')
+        match = None if reused_base else image_index().find(fingerprint)
+        if match is None:
+            for title, other, base_key in job_hashes:
+                if 'caption' in item and base_key == item['cache_key']:
+                    continue
+                if hamming(fingerprint, other) <= IMAGE_DEDUPE_DISTANCE:
+                    match = {'title': title, 'cid': None, 'distance': hamming(fingerprint, other)}
+                    break
+        job_hashes.append((image['title'], fingerprint, item.get('cache_key')))
+        if match is None:
+            return item
+        
+        image['duplicate_of'] = match
+        if IMAGE_DEDUPE_ACTION != 'skip':
+            log(f"   🚩 Image {i} looks like '{match['title']}' ({match['distance']} bits apart); uploading anyway", 'warning')
+            return item
+        
+        log(f"   ♻️  Skipping image {i}: near-duplicate of '{match['title']}' ({match['distance']} bits apart)", 'warning')
+        release_payloads(image)
+        item['upload_result'] = {
+            'success': False,
+            'skipped': True,
+            'title': image['title'],
+            'error': f"Near-duplicate of '{match['title']}'",
+            'duplicate_of': match,
+        }
+        return item
+    
+    def transcode(item):
+        i = item['index']
+        image = item['generated_image']
+        if 'upload_result' in item:
+            return item
+        try:
+            rendition = make_renditions(image['image'].read())
+        except Exception as e:
+            # The original PNG is still uploadable
+            log(f"   ⚠️  Could not transcode image {i}, uploading the original PNG: {str(e)}", 'warning')
+            return item
+        
+        original = image['image']
+        log(f"   🗜️  Image {i}: {original.size // 1024} KB PNG -> {len(rendition['data']) // 1024} KB {rendition['extension'].upper()}")
+        image['original_bytes'] = original.size
+        image['image'] = store.put(rendition['data'])
+        original.release()
+        image['mime'] = rendition['mime']
+        image['extension'] = rendition['extension']
+        image['width'] = rendition['width']
+        image['height'] = rendition['height']
+        thumbnail = rendition['thumbnail']
+        if thumbnail:
+            image['thumbnail'] = {
+                'image': store.put(thumbnail['data']),
+                'mime': thumbnail['mime'],
+                'width': thumbnail['width'],
+                'height': thumbnail['height'],
+            }
+        return item
+    
+    def upload_fields(item, suffix=''):
+        """Multipart (files, data) for one item; bulk uploads number the fields"""
+        i, concept = item['index'], item['concept']
+        image = item['generated_image']
+        files = [
+            (f'file{suffix}', (f"meme.{image.get('extension', 'png')}", image['image'].open(), image['mime']))
+        ]
+        thumbnail = image.get('thumbnail')
+        if thumbnail:
+            files.append((f'thumbnail{suffix}', (f"thumb.{thumbnail['mime'].split('/')[-1]}", thumbnail['image'].open(), thumbnail['mime'])))
+        
+        data = {
+            f'title{suffix}': f"🤖 {concept.get('title', f'Telugu Meme {i}')} [AI-Generated]",
+        }
+        if image.get('width'):
+            data[f'width{suffix}'] = str(image['width'])
+            data[f'height{suffix}'] = str(image['height'])
+        
+        # Include source URL if available
+        if source_url:
+            data[f'sourceUrl{suffix}'] = source_url
+        return files, data
+    
+    def release_payloads(image):
+        image['image'].release()
+        if image.get('thumbnail'):
+            image['thumbnail']['image'].release()
+    
+    def upload_succeeded(item, result, timing):
+        i, concept = item['index'], item['concept']
+        image = item['generated_image']
+        item['upload_result'] = {
+            'success': True,
+            'title': concept.get('title', f'Telugu Meme {i}'),
+            'cid': result.get('cid'),
+            'id': result.get('id'),
+            'timing': timing,
+        }
+        log(f"   ✅ Upload {i} successful! ({timing['seconds']:.2f}s, {timing['attempts']} attempt(s))", 'success')
+        log(f"   🔗 CID: {result.get('cid', 'N/A')[:20]}...")
+        log(f"   🆔 Post ID: {result.get('id', 'N/A')}")
+        # Uploaded - nothing needs these bytes any more
+        release_payloads(image)
+        if result.get('cid'):
+            if image.get('cid') and image['cid'] != result['cid']:
+                log(f"   ⚠️  Local CID {image['cid'][:20]}... differs from Kulfy's; check the IPFS chunking settings", 'warning')
+            cid_index().add(result['cid'], result.get('id'), image['title'])
+        if item.get('image_hash') is not None:
+            image_index().add(item['image_hash'], image['title'], result.get('cid'))
+        if image.get('duplicate_of'):
+            item['upload_result']['duplicate_of'] = image['duplicate_of']
+    
+    def already_uploaded(item):
+        """Skips the upload if Kulfy already has these exact bytes"""
+        if UPLOAD_CID_CHECK == 'off':
+            return False
+        i, concept = item['index'], item['concept']
+        image = item['generated_image']
+        try:
+            cid = image['cid'] = ipfs_cid(image['image'].read())
+        except Exception as e:
+            log(f"   ⚠️  Could not compute the CID of image {i}: {str(e)}", 'warning')
+            return False
+        
+        known = cid_index().find(cid)
+        if known is not None:
+            post_id = known['post_id']
+        elif UPLOAD_CID_CHECK == 'remote' and (post_id := find_existing(upload_url, cid)) is not None:
+            cid_index().add(cid, post_id, image['title'])
+        else:
+            return False
+        
+        item['upload_result'] = {
+            'success': True,
+            'already_uploaded': True,
+            'title': concept.get('title', f'Telugu Meme {i}'),
+            'cid': cid,
+            'id': post_id or None,
+        }
+        log(f"   ⏭️  Image {i} is already in Kulfy (CID {cid[:20]}...), skipping upload", 'success')
+        release_payloads(image)
+        return True
+    
+    def upload_failed(item, error_msg, timing=None, transient=False):
+        i, concept = item['index'], item['concept']
+        print(f"   ❌ {error_msg}")
+        item['upload_result'] = {
+            'success': False,
+            'title': concept.get('title', f'Telugu Meme {i}'),
+            'error': error_msg,
+        }
+        if timing:
+            item['upload_result']['timing'] = timing
+        state['errors'].append(error_msg)
+        if transient:
+            park(item, error_msg)
+    
+    def park(item, error_msg):
+        """Keeps a failed upload in the outbox so the image is not lost"""
+        image = item['generated_image']
+        try:
+            files, data = upload_fields(item)
+            outbox_id = outbox().add(upload_url, image['title'], files, data, error_msg, item.get('image_hash'))
+        except Exception as e:
+            log(f"   ⚠️  Could not queue image {item['index']} for redelivery: {str(e)}", 'warning')
+            return
+        item['upload_result']['queued'] = True
+        item['upload_result']['outbox_id'] = outbox_id
+        log(f"   📮 Image {item['index']} queued in the upload outbox (#{outbox_id}) for redelivery", 'warning')
+        release_payloads(image)
+        start_outbox_worker()
+    
+    def upload_one(item):
+        i = item['index']
+        log(f"   ⬆️  Uploading image {i} to Kulfy app...", 'info', f'Uploading image {i}/{total()}')
+        try:
+            files, data = upload_fields(item)
+            upload_response, timing = post_upload(upload_url, files, data, log)
+            
+            if upload_response.status_code == 200:
+                upload_succeeded(item, upload_response.json(), timing)
+            else:
+                upload_failed(item, f"Upload failed with status {upload_response.status_code} after {timing['attempts']} attempt(s)", timing,
+                              transient=is_transient(upload_response.status_code))
+                
+        except Exception as upload_error:
+            upload_failed(item, f"Upload failed: {str(upload_error)}", transient=True)
+    
+    def upload_batch(items):
+        """One bulk request for a batch; False if the server has no bulk endpoint"""
+        log(f"   ⬆️  Uploading {len(items)} images to Kulfy app in one request...", 'info', f'Uploading {len(items)} images')
+        files, data = [], {}
+        for n, item in enumerate(items):
+            item_files, item_data = upload_fields(item, f'.{n}')
+            files.extend(item_files)
+            data.update(item_data)
+        try:
+            upload_response, timing = post_upload(bulk_url, files, data, log)
+        except Exception as upload_error:
+            for item in items:
+                upload_failed(item, f"Bulk upload failed: {str(upload_error)}", transient=True)
+            return True
+        
+        if upload_response.status_code in BULK_UNSUPPORTED_STATUSES:
+            mark_bulk_unsupported(bulk_url)
+            return False
+        if upload_response.status_code != 200:
+            for item in items:
+                upload_failed(item, f"Bulk upload failed with status {upload_response.status_code} after {timing['attempts']} attempt(s)", timing,
+                              transient=is_transient(upload_response.status_code))
+            return True
+        
+        timing = dict(timing, batch_size=len(items))
+        results = {r.get('index'): r for r in upload_response.json().get('results', [])}
+        for n, item in enumerate(items):
+            result = results.get(n)
+            if result is None:
+                upload_failed(item, "Bulk upload returned no result for this item", timing, transient=True)
+            elif result.get('ok'):
+                upload_succeeded(item, result, timing)
+            else:
+                details = '; '.join(result.get('details') or [])
+                # Validation errors come with details; anything else (e.g. pinning) may pass next time
+                upload_failed(item, f"Upload failed: {result.get('error')}" + (f" ({details})" if details else ''), timing,
+                              transient=not details)
+        return True
+    
+    def upload(item):
+        if 'upload_result' in item:
+            return item
+        if batch:
+            # Sent together by flush_uploads once the pipeline drains
+            return item
+        upload_one(item)
+        return item
+    
+    def flush_uploads(results):
+        pending = [results[index] for index in sorted(results)
+                   if results[index] and 'upload_result' not in results[index]]
+        for start in range(0, len(pending), UPLOAD_BATCH_SIZE):
+            chunk = pending[start:start + UPLOAD_BATCH_SIZE]
+            if bulk_supported(bulk_url) and upload_batch(chunk):
+                continue
+            log(f"   ↩️  {bulk_url} does not support bulk uploads, uploading one by one", 'warning')
+            for item in chunk:
+                upload_one(item)
+    
+    if template:
+        log("   🧩 Template mode: caption-free base scenes, captions rendered locally")
+    log(f"   ⚡ Pipeline workers: generate={IMAGE_CONCURRENCY}, download={DOWNLOAD_CONCURRENCY}, "
+        f"transcode={max(1, TRANSCODE_POOL_SIZE)} ({IMAGE_OUTPUT_FORMAT}), dedupe=1, upload={'batch' if batch else UPLOAD_CONCURRENCY}")
+    return StagePipeline([
+        Stage('generate', generate, IMAGE_CONCURRENCY),
+        Stage('download', download, DOWNLOAD_CONCURRENCY),
+        Stage('caption', caption, max(1, TRANSCODE_POOL_SIZE)),
+        Stage('transcode', transcode, max(1, TRANSCODE_POOL_SIZE)),
+        Stage('dedupe', dedupe, 1),  # One worker, so job_hashes needs no lock
+        Stage('upload', upload, UPLOAD_CONCURRENCY),
+    ], finalize=flush_uploads if batch else None)
+
+
+def finish_images(state: AgentState, pipeline: StagePipeline) -> AgentState:
+    """Waits for the image pipeline and stores its results in state, in concept order"""
+    results = pipeline.close()
+    items = [results[index] for index in sorted(results)]
+    generated_images = [item['generated_image'] for item in items if item]
+    upload_results = [item['upload_result'] for item in items if item]
     
     state['generated_images'] = generated_images
     state['upload_results'] = upload_results  # Store upload results here
+    state['stage_timings'] = pipeline.timings()
+    state['memory_stats'] = state['image_store'].stats()
     state['status'] = 'images_ready'
     
     successful_uploads = sum(1 for r in upload_results if r.get('success'))
-    print(f"✅ [DALLE] Generated {len(generated_images)}/5 images")
+    skipped_duplicates = sum(1 for r in upload_results if r.get('skipped'))
+    queued_uploads = sum(1 for r in upload_results if r.get('queued'))
+    print(f"✅ [DALLE] Generated {len(generated_images)}/{len(items)} images")
     print(f"✅ [UPLOAD] Uploaded {successful_uploads}/{len(generated_images)} memes")
+    if skipped_duplicates:
+        print(f"♻️  [DEDUPE] Skipped {skipped_duplicates} near-duplicate memes")
+    if queued_uploads:
+        print(f"📮 [OUTBOX] Queued {queued_uploads} failed uploads for redelivery")
+    for name, timing in state['stage_timings'].items():
+        print(f"⏱️  [PIPELINE] {name}: {timing['items']} items, {timing['avg_seconds']:.2f}s avg, {timing['wall_seconds']:.2f}s wall")
+    memory = state['memory_stats']
+    print(f"🧠 [MEMORY] Peak image payloads: {memory['peak_image_bytes_in_memory'] // 1024} KB in memory, "
+          f"{memory['peak_image_bytes_on_disk'] // 1024} KB spooled; {memory['image_bytes_in_memory'] // 1024} KB still held")
     
     return state
 
 
+def generate_images(state: AgentState, custom_prompts: Optional[List[Dict[str, str]]] = None) -> AgentState:
+    """
+    Creates cartoon-style meme images using DALL-E 3.
+    Generates one image per meme concept.
+    Saves to local disk and uploads immediately after each generation.
+    
+    Args:
+        state: Agent state with meme concepts
+        custom_prompts: Optional list of custom prompts to override concepts.
+                        Each dict should have 'visual_description' and 'text_overlay'
+    """
+    callback = state.get('status_callback')
+    def log(msg, log_type='info', step=None):
+        print(msg)
+        if callback:
+            callback(log_type, msg, step)
+    
+    log("\n🎨 [DALLE] Generating cartoon images...", 'info', 'Generating images')
+    
+    # Use custom prompts if provided, otherwise use concepts from state
+    concepts_to_use = custom_prompts if custom_prompts else state['meme_concepts']
+    concepts_to_use = [variant for concept in concepts_to_use for variant in caption_variants(concept)]
+    log(f"   🎯 Will create {len(concepts_to_use)} memes")
+    if custom_prompts:
+        log("   ✏️  Using custom/edited prompts from user", 'info')
+    
+    pipeline = meme_pipeline(state, lambda: len(concepts_to_use), log)
+    for i, concept in enumerate(concepts_to_use, 1):
+        pipeline.submit(i, {'index': i, 'concept': concept})
+    
+    return finish_images(state, pipeline)
+
+
+# ============================================================================
+# NODE 2+3 (STREAMING PIPELINE MODE): CONCEPTS FEED IMAGE GENERATION
+# ============================================================================
+
+def generate_concepts_and_images(state: AgentState) -> AgentState:
+    """
+    Runs concept generation and image generation as one pipelined step.
+    
+    Each concept parsed from the GPT-4 stream is submitted to the image
+    pipeline straight away, so DALL-E calls overlap with the rest of concept
+    generation and with each other. Leaves the same state behind as analyze + generate_images.
+    """
+    callback = state.get('status_callback')
+    def log(msg, log_type='info', step=None):
+        print(msg)
+        if callback:
+            callback(log_type, msg, step)
+    
+    enqueued = []
+    submitted = []
+    # Caption variants can add several items per concept
+    pipeline = meme_pipeline(state, lambda: len(submitted), log)
+    
+    def enqueue(index, concept):
+        if len(enqueued) >= 5 or concept in enqueued:
+            return
+        enqueued.append(concept)
+        log(f"   🚚 Queued concept {len(enqueued)} for image generation", 'info')
+        for variant in caption_variants(concept):
+            submitted.append(variant)
+            pipeline.submit(len(submitted), {'index': len(submitted), 'concept': variant})
+    
+    state['concept_listener'] = enqueue
+    try:
+        state = generate_meme_concepts(state)
+    except Exception:
+        # Let already-queued images finish so no pipeline threads are left waiting
+        pipeline.close()
+        raise
+    finally:
+        state['concept_listener'] = None
+    
+    concepts = state.get('meme_concepts', [])
+    if enqueued and not any(concept in enqueued for concept in concepts):
+        # The stream failed part-way and concept generation fell back to sample
+        # concepts; keep this run to the streamed ones instead of mixing them
+        state['meme_concepts'] = list(enqueued)
+    else:
+        # Concepts that did not come through the stream (covered stories, only in
+        # the full response, fallback after an empty stream, ...) go now
+        for concept in concepts:
+            enqueue(None, concept)
+    log("\n🎨 [DALLE] Waiting for pipelined image generation to finish...", 'info', 'Generating images')
+    
+    return finish_images(state, pipeline)
+
+
 # ============================================================================
 # NODE 4: UPLOAD TO KULFY APP
 # ============================================================================
@@ -635,21 +1272,30 @@ def upload_to_kulfy(state: AgentState) -> AgentState:
 def create_meme_agent():
     """
     Creates the LangGraph agent workflow.
+    
+    In the default 'streaming' PIPELINE_MODE, concept and image generation run
+    as one pipelined node so images start while GPT-4 is still writing.
+    'staged' keeps them as separate analyze -> generate_images nodes.
     """
     # Define the graph
     workflow = StateGraph(AgentState)
     
     # Add nodes
     workflow.add_node("fetch", fetch_content_from_urls)
-    workflow.add_node("analyze", generate_meme_concepts)
-    workflow.add_node("generate_images", generate_images)
     workflow.add_node("upload", upload_to_kulfy)
+    workflow.set_entry_point("fetch")
     
     # Define edges (flow)
-    workflow.set_entry_point("fetch")
-    workflow.add_edge("fetch", "analyze")
-    workflow.add_edge("analyze", "generate_images")
-    workflow.add_edge("generate_images", "upload")
+    if PIPELINE_MODE == 'streaming':
+        workflow.add_node("analyze_and_generate", generate_concepts_and_images)
+        workflow.add_edge("fetch", "analyze_and_generate")
+        workflow.add_edge("analyze_and_generate", "upload")
+    else:
+        workflow.add_node("analyze", generate_meme_concepts)
+        workflow.add_node("generate_images", generate_images)
+        workflow.add_edge("fetch", "analyze")
+        workflow.add_edge("analyze", "generate_images")
+        workflow.add_edge("generate_images", "upload")
     workflow.add_edge("upload", END)
     
     # Compile the graph
@@ -679,7 +1325,26 @@ def create_concepts_only_agent():
 # MAIN EXECUTION FUNCTION
 # ============================================================================
 
-async def run_meme_generation_concepts_only(urls: Optional[List[str]] = None, status_callback=None):
+async def run_blocking(func, *args):
+    """Runs a blocking call on the graph pool and awaits its result"""
+    return await asyncio.get_running_loop().run_in_executor(_graph_executor, func, *args)
+
+
+def poll_feed_urls(feeds: List[str], log) -> List[str]:
+    """
+    Polls RSS/Atom/sitemap feeds and returns the URLs of items that are new
+    since the last poll. Feed watermarks advance as a side effect.
+    """
+    log(f"📡 Polling {len(feeds)} feed(s) for new items...", 'info', 'Polling feeds')
+    poll = poll_feeds(feeds, log=log)
+    for error in poll['errors']:
+        log(f"   ⚠️  {error}", 'warning')
+    new_urls = [item['url'] for item in poll['items']]
+    log(f"✅ {len(new_urls)} new item(s) from feeds ({poll['not_modified']} feed(s) unchanged)", 'success')
+    return new_urls
+
+
+async def run_meme_generation_concepts_only(urls: Optional[List[str]] = None, status_callback=None, feeds: Optional[List[str]] = None, force_refresh: bool = False):
     """
     Runs only the concept generation phase (fetch + analyze).
     Stops before image generation so user can review prompts.
@@ -687,6 +1352,8 @@ async def run_meme_generation_concepts_only(urls: Optional[List[str]] = None, st
     Args:
         urls: Optional list of URLs to fetch content from
         status_callback: Optional callback function to send status updates
+        feeds: Optional RSS/Atom/sitemap URLs; only items new since the last poll are used
+        force_refresh: Ignore cached concepts and call GPT-4 again
         
     Returns concepts with DALL-E prompts ready for review.
     """
@@ -701,6 +1368,19 @@ async def run_meme_generation_concepts_only(urls: Optional[List[str]] = None, st
     log("🎭 KULFY MEME GENERATION - CONCEPTS PHASE")
     log("="*60 + "\n")
     
+    if feeds:
+        feed_urls = await run_blocking(poll_feed_urls, feeds, log)
+        if not feed_urls and not urls:
+            log("💤 No new feed items since the last poll - nothing to do", 'info', 'No new items')
+            return {
+                'status': 'no_new_items',
+                'concepts': [],
+                'dalle_prompts': [],
+                'articles_scraped': 0,
+                'covered_stories': [],
+            }
+        urls = (urls or []) + feed_urls
+    
     if urls:
         log(f"📰 Using {len(urls)} provided URLs", 'info', 'Fetching content')
     else:
@@ -714,7 +1394,14 @@ async def run_meme_generation_concepts_only(urls: Optional[List[str]] = None, st
         'upload_results': [],
         'errors': [],
         'status': 'starting',
-        'status_callback': status_callback
+        'status_callback': status_callback,
+        'covered_stories': [],
+        'force_refresh': force_refresh,
+        'concept_listener': None,
+        'stage_timings': {},
+        'image_store': None,
+        'memory_stats': {},
+        'caption_mode': None,
     }
     
     log("🔧 Creating concepts-only agent workflow...", 'info', 'Initializing agent')
@@ -722,7 +1409,7 @@ async def run_meme_generation_concepts_only(urls: Optional[List[str]] = None, st
     log("✅ Agent workflow created", 'success')
     
     log("🚀 Running fetch + analyze phases...", 'info', 'Generating concepts')
-    final_state = agent.invoke(initial_state)
+    final_state = await run_blocking(agent.invoke, initial_state)
     
     log("✅ Concept generation completed", 'success')
     
@@ -761,16 +1448,21 @@ Make it funny and exaggerated!"""
         'concepts': final_state.get('meme_concepts', []),
         'dalle_prompts': dalle_prompts,
         'articles_scraped': len(final_state.get('scraped_content', [])),
+        'covered_stories': final_state.get('covered_stories', []),
     }
 
 
-async def run_meme_generation(urls: Optional[List[str]] = None, status_callback=None, custom_prompts: Optional[List[Dict[str, str]]] = None):
+async def run_meme_generation(urls: Optional[List[str]] = None, status_callback=None, custom_prompts: Optional[List[Dict[str, Any]]] = None, feeds: Optional[List[str]] = None, force_refresh: bool = False, caption_mode: Optional[str] = None):
     """
     Runs the entire meme generation pipeline.
     
     Args:
         urls: Optional list of URLs to fetch content from
         status_callback: Optional callback function to send status updates
+        custom_prompts: Optional edited prompts; skips fetch and analyze
+        feeds: Optional RSS/Atom/sitemap URLs; only items new since the last poll are used
+        force_refresh: Ignore cached concepts and images and call OpenAI again
+        caption_mode: 'dalle' or 'template' (default: CAPTION_MODE env var)
         
     Returns summary of results.
     """
@@ -785,6 +1477,28 @@ async def run_meme_generation(urls: Optional[List[str]] = None, status_callback=
     log("🎭 KULFY MEME GENERATION AGENT - LANGCHAIN EXECUTION")
     log("="*60 + "\n")
     
+    if feeds and not custom_prompts:
+        feed_urls = await run_blocking(poll_feed_urls, feeds, log)
+        if not feed_urls and not urls:
+            log("💤 No new feed items since the last poll - nothing to do", 'info', 'No new items')
+            return {
+                'status': 'no_new_items',
+                'articles_scraped': 0,
+                'stories_already_covered': 0,
+                'concepts_generated': 0,
+                'images_created': 0,
+                'successful_uploads': 0,
+                'failed_uploads': 0,
+                'queued_uploads': 0,
+                'already_uploaded': 0,
+                'skipped_duplicates': 0,
+                'errors': [],
+                'upload_results': [],
+                'stage_timings': {},
+                'memory_stats': {},
+            }
+        urls = (urls or []) + feed_urls
+    
     if urls:
         log(f"📰 Using {len(urls)} provided URLs", 'info', 'Fetching content')
     else:
@@ -817,7 +1531,14 @@ async def run_meme_generation(urls: Optional[List[str]] = None, status_callback=
             'upload_results': [],
             'errors': [],
             'status': 'concepts_ready',
-            'status_callback': status_callback
+            'status_callback': status_callback,
+            'covered_stories': [],
+            'force_refresh': force_refresh,
+            'concept_listener': None,
+            'stage_timings': {},
+            'image_store': None,
+            'memory_stats': {},
+            'caption_mode': caption_mode,
         }
         
         # Create a simplified workflow that just generates images
@@ -837,7 +1558,14 @@ async def run_meme_generation(urls: Optional[List[str]] = None, status_callback=
             'upload_results': [],
             'errors': [],
             'status': 'starting',
-            'status_callback': status_callback
+            'status_callback': status_callback,
+            'covered_stories': [],
+            'force_refresh': force_refresh,
+            'concept_listener': None,
+            'stage_timings': {},
+            'image_store': None,
+            'memory_stats': {},
+            'caption_mode': caption_mode,
         }
         
         log("🔧 Creating LangGraph agent workflow...", 'info', 'Initializing agent')
@@ -849,7 +1577,7 @@ async def run_meme_generation(urls: Optional[List[str]] = None, status_callback=
     logger.info("LANGGRAPH AGENT INVOCATION START")
     logger.info("="*60)
     
-    final_state = agent.invoke(initial_state)
+    final_state = await run_blocking(agent.invoke, initial_state)
     
     logger.info("="*60)
     logger.info("LANGGRAPH AGENT INVOCATION COMPLETE")
@@ -860,14 +1588,24 @@ async def run_meme_generation(urls: Optional[List[str]] = None, status_callback=
     summary = {
         'status': final_state['status'],
         'articles_scraped': len(final_state['scraped_content']),
+        'stories_already_covered': len(final_state.get('covered_stories', [])),
         'concepts_generated': len(final_state['meme_concepts']),
         'images_created': len(final_state['generated_images']),
         'successful_uploads': sum(1 for r in final_state['upload_results'] if r.get('success')),
-        'failed_uploads': sum(1 for r in final_state['upload_results'] if not r.get('success')),
+        'failed_uploads': sum(1 for r in final_state['upload_results'] if not r.get('success') and not r.get('skipped')),
+        'queued_uploads': sum(1 for r in final_state['upload_results'] if r.get('queued')),
+        'already_uploaded': sum(1 for r in final_state['upload_results'] if r.get('already_uploaded')),
+        'skipped_duplicates': sum(1 for r in final_state['upload_results'] if r.get('skipped')),
         'errors': final_state['errors'],
         'upload_results': final_state['upload_results'],
+        'stage_timings': final_state.get('stage_timings', {}),
+        'memory_stats': final_state.get('memory_stats', {}),
     }
     
+    # The summary only reports counts; drop any image payloads still held
+    if final_state.get('image_store'):
+        final_state['image_store'].close()
+    
     print("\n" + "="*60)
     print("📊 GENERATION SUMMARY")
     print("="*60)
@@ -876,7 +1614,14 @@ async def run_meme_generation(urls: Optional[List[str]] = None, status_callback=
     print(f"Concepts Generated: {summary['concepts_generated']}")
     print(f"Images Created: {summary['images_created']}")
     print(f"Successful Uploads: {summary['successful_uploads']}")
-    print(f"Failed Uploads: {summary['failed_uploads']}")
+    print(f"Failed Uploads: {summary['failed_uploads']} ({summary['queued_uploads']} queued for redelivery)")
+    print(f"Skipped Duplicates: {summary['skipped_duplicates']}")
+    print(f"Already In Kulfy (not re-sent): {summary['already_uploaded']}")
+    for name, timing in summary['stage_timings'].items():
+        print(f"⏱️  {name.title()} Stage: {timing['items']} items, {timing['busy_seconds']:.1f}s busy, {timing['wall_seconds']:.1f}s wall")
+    if summary['memory_stats']:
+        print(f"Peak Image Memory: {summary['memory_stats']['peak_image_bytes_in_memory'] // 1024} KB "
+              f"(process peak RSS {summary['memory_stats']['process_peak_rss_mb']} MB)")
     if summary['errors']:
         print(f"\n⚠️  Errors: {len(summary['errors'])}")
         for error in summary['errors']:
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the article extraction engines
+Parses every saved page in fixtures/html/ with each engine and reports
+the per-page time and speedup over the legacy html.parser engine.
+
+Usage: python bench_extract.py [iterations]
+"""
+
+import os
+import sys
+import glob
+import time
+
+from extract import ENGINES
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'html')
+
+
+def time_engine(engine, html, url, iterations):
+    """Returns (best seconds per page, extracted article)"""
+    article = None
+    best = float('inf')
+    for _ in range(iterations):
+        start = time.perf_counter()
+        article, _ = engine.extract(html, url, verbose=False)
+        best = min(best, time.perf_counter() - start)
+    return best, article
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    fixtures = sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.html')))
+    if not fixtures:
+        print(f"❌ No fixtures found in {FIXTURES_DIR}")
+        sys.exit(1)
+
+    engines = {name: factory() for name, factory in ENGINES.items()}
+
+    print("="*80)
+    print("⏱️  ARTICLE EXTRACTION BENCHMARK")
+    print("="*80)
+    for name, engine in engines.items():
+        print(f"   {name}: {engine}")
+    print(f"   Best of {iterations} runs per page")
+    print("-"*80)
+
+    totals = {name: 0.0 for name in engines}
+    for path in fixtures:
+        with open(path, 'rb') as f:
+            html = f.read()
+        url = f"https://example.com/{os.path.basename(path)}"
+
+        results = {name: time_engine(engine, html, url, iterations) for name, engine in engines.items()}
+        legacy_time, legacy_article = results['legacy']
+
+        print(f"\n📄 {os.path.basename(path)} ({len(html) // 1024} KB)")
+        for name, (elapsed, article) in results.items():
+            totals[name] += elapsed
+            same = '✅' if article == legacy_article else '⚠️  differs from legacy'
+            print(f"   {name:<8} {elapsed * 1000:8.2f} ms  {legacy_time / elapsed:5.1f}x  {same}")
+
+    print("\n" + "-"*80)
+    for name, total in totals.items():
+        print(f"   {name:<8} {total / len(fixtures) * 1000:8.2f} ms/page  {totals['legacy'] / total:5.1f}x")
+    print("="*80)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Image payload handles for the Kulfy meme agent
+
+Generated images used to sit in agent state as raw bytes until the job
+returned, so every concurrent job kept all of its images in RSS. Image
+payloads now live in a per-job `BlobStore` and state only holds `ImageBlob`
+handles. In low-memory mode, payloads larger than IMAGE_SPOOL_MAX_KB are
+spooled to anonymous temp files instead of being kept in memory. Either
+way, a blob is released as soon as its upload succeeds.
+
+The store tracks how many payload bytes are held in memory and on disk and
+the peak of each, which is reported in the job summary next to the
+process's peak RSS.
+
+Configuration (environment variables):
+    LOW_MEMORY_MODE    - Spool image payloads to temp files (default: false)
+    IMAGE_SPOOL_MAX_KB - Payloads up to this size stay in memory (default: 64)
+"""
+
+import os
+import tempfile
+import threading
+from io import BytesIO
+from typing import Dict, Any, BinaryIO, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+LOW_MEMORY_MODE = os.getenv("LOW_MEMORY_MODE", "false").lower() in ("1", "true", "yes")
+IMAGE_SPOOL_MAX_KB = int(os.getenv("IMAGE_SPOOL_MAX_KB", "64"))
+
+
+class ImageBlob:
+    """Handle to one image payload, held in memory or in a temp file"""
+
+    def __init__(self, store: 'BlobStore', data: bytes, spool: bool):
+        self.size = len(data)
+        self._store = store
+        self._data: Optional[bytes] = None
+        self._file: Optional[BinaryIO] = None
+        if spool:
+            self._file = tempfile.TemporaryFile(prefix="kulfy-image-")
+            self._file.write(data)
+        else:
+            self._data = data
+
+    @property
+    def on_disk(self) -> bool:
+        return self._file is not None
+
+    @property
+    def released(self) -> bool:
+        return self._data is None and self._file is None
+
+    def read(self) -> bytes:
+        """Returns the payload bytes"""
+        if self._file is not None:
+            self._file.seek(0)
+            return self._file.read()
+        if self._data is None:
+            raise ValueError("Image blob was already released")
+        return self._data
+
+    def open(self) -> BinaryIO:
+        """Returns a file object positioned at the start, e.g. for a multipart upload"""
+        if self._file is not None:
+            self._file.seek(0)
+            return self._file
+        return BytesIO(self.read())
+
+    def release(self):
+        """Frees the payload; safe to call more than once"""
+        with self._store._lock:
+            if self.released:
+                return
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._store._on_disk -= self.size
+            else:
+                self._data = None
+                self._store._in_memory -= self.size
+
+    def __repr__(self):
+        where = 'released' if self.released else ('disk' if self.on_disk else 'memory')
+        return f"<ImageBlob {self.size // 1024} KB {where}>"
+
+
+class BlobStore:
+    """
+    Per-job holder of image payloads.
+
+    Args:
+        spool: Spool payloads larger than spool_max_bytes to temp files
+        spool_max_bytes: Largest payload kept in memory when spooling
+    """
+
+    def __init__(self, spool: bool = LOW_MEMORY_MODE, spool_max_bytes: int = IMAGE_SPOOL_MAX_KB * 1024):
+        self.spool = spool
+        self.spool_max_bytes = spool_max_bytes
+        self._lock = threading.Lock()
+        self._blobs: List[ImageBlob] = []
+        self._in_memory = 0
+        self._on_disk = 0
+        self._peak_in_memory = 0
+        self._peak_on_disk = 0
+
+    def put(self, data: bytes) -> ImageBlob:
+        """Stores a payload and returns its handle"""
+        blob = ImageBlob(self, data, spool=self.spool and len(data) > self.spool_max_bytes)
+        with self._lock:
+            self._blobs.append(blob)
+            if blob.on_disk:
+                self._on_disk += blob.size
+                self._peak_on_disk = max(self._peak_on_disk, self._on_disk)
+            else:
+                self._in_memory += blob.size
+                self._peak_in_memory = max(self._peak_in_memory, self._in_memory)
+        return blob
+
+    def stats(self) -> Dict[str, Any]:
+        """Current and peak payload bytes, plus the process's peak RSS"""
+        with self._lock:
+            stats = {
+                'low_memory_mode': self.spool,
+                'image_bytes_in_memory': self._in_memory,
+                'image_bytes_on_disk': self._on_disk,
+                'peak_image_bytes_in_memory': self._peak_in_memory,
+                'peak_image_bytes_on_disk': self._peak_on_disk,
+            }
+        stats['process_peak_rss_mb'] = peak_rss_mb()
+        return stats
+
+    def close(self):
+        """Releases every payload still held"""
+        with self._lock:
+            blobs, self._blobs = self._blobs, []
+        for blob in blobs:
+            blob.release()
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB, where the platform reports it"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    divisor = 1024 * 1024 if os.uname().sysname == 'Darwin' else 1024
+    return round(peak / divisor, 1)
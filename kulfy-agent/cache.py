@@ -0,0 +1,205 @@
+"""
+On-disk caches for the Kulfy meme agent
+
+`DiskCache` stores byte blobs as files under KULFY_CACHE_DIR/<name>/ and
+keeps a small SQLite index next to them with per-entry metadata, size and
+access times. Entries are evicted least-recently-used first once the cache
+grows past its size budget, and optionally expire after a TTL.
+
+Configuration (environment variables):
+    KULFY_CACHE_DIR            - Root directory for all caches (default: .kulfy-cache)
+    ARTICLE_CACHE_MAX_MB       - Size budget of the article cache (default: 20)
+    ARTICLE_CACHE_FRESH_SECONDS - Serve cached articles without revalidating
+                                  for this long (default: 900)
+    CONCEPT_CACHE_MAX_MB       - Size budget of the meme concept cache (default: 10)
+    CONCEPT_CACHE_TTL_HOURS    - Cached concepts expire after this long (default: 24)
+    IMAGE_CACHE_MAX_MB         - Size budget of the generated image cache (default: 200)
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+KULFY_CACHE_DIR = os.getenv("KULFY_CACHE_DIR", ".kulfy-cache")
+ARTICLE_CACHE_MAX_MB = float(os.getenv("ARTICLE_CACHE_MAX_MB", "20"))
+ARTICLE_CACHE_FRESH_SECONDS = float(os.getenv("ARTICLE_CACHE_FRESH_SECONDS", "900"))
+CONCEPT_CACHE_MAX_MB = float(os.getenv("CONCEPT_CACHE_MAX_MB", "10"))
+CONCEPT_CACHE_TTL_HOURS = float(os.getenv("CONCEPT_CACHE_TTL_HOURS", "24"))
+IMAGE_CACHE_MAX_MB = float(os.getenv("IMAGE_CACHE_MAX_MB", "200"))
+
+
+@contextmanager
+def sqlite_transaction(path: str) -> Iterator[sqlite3.Connection]:
+    """
+    Opens a connection for one transaction: commits (or rolls back) and closes it.
+    A bare sqlite3 connection used as a context manager never closes itself.
+    """
+    db = sqlite3.connect(path, timeout=10)
+    try:
+        with db:
+            yield db
+    finally:
+        db.close()
+
+
+class DiskCache:
+    """
+    Size-bounded LRU cache of byte blobs on local disk.
+
+    Args:
+        name: Subdirectory of KULFY_CACHE_DIR for this cache
+        max_bytes: Evict least-recently-used entries beyond this total size
+        ttl: Optional max age in seconds; older entries are treated as misses
+    """
+
+    def __init__(self, name: str, max_bytes: int, ttl: Optional[float] = None):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directory = os.path.join(KULFY_CACHE_DIR, name)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(self.directory, 'blobs'), exist_ok=True)
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    blob TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    meta TEXT NOT NULL,
+                    stored_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+
+    def _connect(self):
+        return sqlite_transaction(os.path.join(self.directory, 'index.sqlite3'))
+
+    def _blob_path(self, blob: str) -> str:
+        return os.path.join(self.directory, 'blobs', blob)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns {'value': bytes, 'meta': dict, 'stored_at': float} for a key,
+        or None on a miss. A hit counts as a use for LRU eviction.
+        """
+        now = time.time()
+        with self._lock, self._connect() as db:
+            row = db.execute(
+                "SELECT blob, meta, stored_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            blob, meta, stored_at = row
+            if self.ttl is not None and now - stored_at > self.ttl:
+                self._delete(db, key, blob)
+                return None
+            try:
+                with open(self._blob_path(blob), 'rb') as f:
+                    value = f.read()
+            except OSError:
+                # Blob went missing underneath us - drop the index entry
+                self._delete(db, key, blob)
+                return None
+            db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return {'value': value, 'meta': json.loads(meta), 'stored_at': stored_at}
+
+    def put(self, key: str, value: bytes, meta: Optional[Dict[str, Any]] = None):
+        """Stores a value, replacing any existing entry, then evicts down to budget"""
+        now = time.time()
+        blob = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        path = self._blob_path(blob)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, blob, size, meta, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, blob, len(value), json.dumps(meta or {}), now, now),
+            )
+            self._evict(db)
+
+    def refresh(self, key: str, meta: Optional[Dict[str, Any]] = None):
+        """Marks an entry as freshly stored (e.g. after revalidation), merging in new metadata"""
+        now = time.time()
+        with self._lock, self._connect() as db:
+            row = db.execute("SELECT meta FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return
+            merged = json.loads(row[0])
+            merged.update({k: v for k, v in (meta or {}).items() if v is not None})
+            db.execute(
+                "UPDATE entries SET meta = ?, stored_at = ?, accessed_at = ? WHERE key = ?",
+                (json.dumps(merged), now, now, key),
+            )
+
+    def delete(self, key: str):
+        """Removes an entry if present"""
+        with self._lock, self._connect() as db:
+            row = db.execute("SELECT blob FROM entries WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._delete(db, key, row[0])
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns entry count and total size"""
+        with self._lock, self._connect() as db:
+            entries, total = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {'name': self.name, 'entries': entries, 'bytes': total, 'max_bytes': self.max_bytes}
+
+    def _delete(self, db: sqlite3.Connection, key: str, blob: str):
+        db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        try:
+            os.remove(self._blob_path(blob))
+        except OSError:
+            pass
+
+    def _evict(self, db: sqlite3.Connection):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, blob, size in db.execute(
+            "SELECT key, blob, size FROM entries ORDER BY accessed_at ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._delete(db, key, blob)
+            total -= size
+            evicted += 1
+        logger.info(f"[CACHE] Evicted {evicted} entries from '{self.name}' cache")
+
+
+_caches: Dict[str, DiskCache] = {}
+_caches_lock = threading.Lock()
+
+
+def _get_cache(name: str, max_bytes: int, ttl: Optional[float] = None) -> DiskCache:
+    """Returns the process-wide DiskCache for a name, creating it on first use"""
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = DiskCache(name, max_bytes, ttl)
+        return _caches[name]
+
+
+def article_cache() -> DiskCache:
+    """Cache of extracted articles keyed by URL, with HTTP validators in the metadata"""
+    return _get_cache('articles', int(ARTICLE_CACHE_MAX_MB * 1024 * 1024))
+
+
+def concept_cache() -> DiskCache:
+    """Cache of GPT-4 meme concepts keyed by a hash of the prompt inputs"""
+    return _get_cache('concepts', int(CONCEPT_CACHE_MAX_MB * 1024 * 1024), ttl=CONCEPT_CACHE_TTL_HOURS * 3600)
+
+
+def image_cache() -> DiskCache:
+    """Cache of DALL-E images keyed by a hash of the final prompt, model, size and quality"""
+    return _get_cache('images', int(IMAGE_CACHE_MAX_MB * 1024 * 1024))
@@ -0,0 +1,116 @@
+"""
+Local meme caption rendering for the Kulfy meme agent
+
+In template mode DALL-E only draws a caption-free base scene and the
+text_overlay is rendered here with Pillow, classic meme style: bold white
+text with a dark outline, word-wrapped and shrunk until it fits. A base
+scene can then serve any number of caption variants, and captions are
+always spelled exactly as written (DALL-E often garbles baked-in text).
+
+A caption containing '|' is split into a top line and a bottom line,
+e.g. "When the trailer drops | When the movie releases".
+
+Telugu captions need a font with Telugu glyphs (e.g. Noto Sans Telugu) and
+a Pillow build with libraqm for correct shaping.
+
+Configuration (environment variables):
+    CAPTION_FONT          - Path to a .ttf/.otf font (default: DejaVu Sans Bold, else Pillow's default)
+    CAPTION_POSITION      - 'bottom' or 'top' for captions without '|' (default: bottom)
+    CAPTION_MAX_FONT_SIZE - Largest font size in pixels at 1024px wide (default: 80)
+    CAPTION_UPPERCASE     - Upper-case Latin captions (default: true)
+"""
+
+import os
+from functools import lru_cache
+from io import BytesIO
+from typing import List
+
+CAPTION_FONT = os.getenv("CAPTION_FONT", "")
+CAPTION_POSITION = os.getenv("CAPTION_POSITION", "bottom")
+CAPTION_MAX_FONT_SIZE = int(os.getenv("CAPTION_MAX_FONT_SIZE", "80"))
+CAPTION_UPPERCASE = os.getenv("CAPTION_UPPERCASE", "true").lower() in ("1", "true", "yes")
+
+MIN_FONT_SIZE = 24
+MAX_LINES = 3
+MARGIN = 0.04  # of the image width
+
+
+@lru_cache(maxsize=32)
+def _load_font(path: str, size: int):
+    from PIL import ImageFont
+
+    if path:
+        return ImageFont.truetype(path, size)
+    try:
+        return ImageFont.truetype("DejaVuSans-Bold.ttf", size)
+    except OSError:
+        return ImageFont.load_default(size=size)
+
+
+def _wrap(draw, text: str, font, max_width: float, stroke: int) -> List[str]:
+    """Greedy word wrap by rendered width"""
+    lines, line = [], ''
+    for word in text.split():
+        candidate = f"{line} {word}".strip()
+        if line and draw.textlength(candidate, font=font) + 2 * stroke > max_width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _fit(draw, text: str, font_path: str, max_size: int, max_width: float):
+    """Largest font size at which the text wraps to MAX_LINES lines that all fit"""
+    for size in range(max_size, MIN_FONT_SIZE - 1, -4):
+        font = _load_font(font_path, size)
+        stroke = max(2, size // 12)
+        lines = _wrap(draw, text, font, max_width, stroke)
+        if len(lines) <= MAX_LINES and all(draw.textlength(l, font=font) + 2 * stroke <= max_width for l in lines):
+            return font, stroke, lines
+    return font, stroke, lines[:MAX_LINES]
+
+
+def _draw_block(draw, text: str, width: int, height: int, top: bool, font_path: str, max_size: int):
+    margin = int(width * MARGIN)
+    font, stroke, lines = _fit(draw, text, font_path, max_size, width - 2 * margin)
+    line_height = int(font.size * 1.15) + stroke
+    y = margin if top else height - margin - line_height * len(lines)
+    for line in lines:
+        x = (width - draw.textlength(line, font=font)) / 2
+        draw.text((x, y), line, font=font, fill='white', stroke_width=stroke, stroke_fill='black')
+        y += line_height
+
+
+def render_caption(image_data: bytes,
+                   text: str,
+                   font_path: str = CAPTION_FONT,
+                   position: str = CAPTION_POSITION,
+                   max_font_size: int = CAPTION_MAX_FONT_SIZE,
+                   uppercase: bool = CAPTION_UPPERCASE) -> bytes:
+    """Returns a PNG of the base image with the caption drawn on it"""
+    from PIL import Image, ImageDraw
+
+    with Image.open(BytesIO(image_data)) as base:
+        image = base.convert('RGB')
+    width, height = image.size
+    draw = ImageDraw.Draw(image)
+    max_size = max(MIN_FONT_SIZE, int(max_font_size * width / 1024))
+
+    text = ' '.join(text.split())
+    if uppercase:
+        text = text.upper()
+    if '|' in text:
+        top_text, bottom_text = (part.strip() for part in text.split('|', 1))
+        if top_text:
+            _draw_block(draw, top_text, width, height, True, font_path, max_size)
+        if bottom_text:
+            _draw_block(draw, bottom_text, width, height, False, font_path, max_size)
+    elif text:
+        _draw_block(draw, text, width, height, position == 'top', font_path, max_size)
+
+    buffer = BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
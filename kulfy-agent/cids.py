@@ -0,0 +1,144 @@
+"""
+Local IPFS CIDs for the Kulfy meme agent
+
+Kulfy identifies memes by the CID Pinata assigns when it pins them, which
+the agent used to learn only after sending the full image. `ipfs_cid()`
+computes the same CID locally, so the agent can tell before uploading
+whether those exact bytes are already in Kulfy and skip the upload.
+
+Pinata pins with cidVersion 1, i.e. the UnixFS importer defaults for
+CIDv1: 256 KiB chunks stored as raw leaves, sha256 hashes, base32 CIDs.
+A file that fits in one chunk is a single raw block ("bafkrei..."); a
+larger one is a dag-pb root linking its chunks ("bafybei..."). Images
+are at most 6 MB, well within one layer of links.
+
+`CidIndex` remembers the CIDs this agent has uploaded and their post IDs.
+A CID it does not know can still be checked against Kulfy with
+`HEAD /api/upload?cid=...`, which sends no image bytes.
+
+Configuration (environment variables):
+    UPLOAD_CID_CHECK - 'remote' (local index, then HEAD), 'local' (index only) or 'off' (default: remote)
+"""
+
+import os
+import time
+import base64
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+from cache import KULFY_CACHE_DIR, sqlite_transaction
+
+UPLOAD_CID_CHECK = os.getenv("UPLOAD_CID_CHECK", "remote")
+
+CHUNK_SIZE = 256 * 1024
+MAX_LINKS = 174  # Links per node in the importer's balanced layout
+
+RAW = 0x55
+DAG_PB = 0x70
+SHA2_256 = 0x12
+
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = n & 0x7f
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field(number: int, value: bytes) -> bytes:
+    """Length-delimited protobuf field"""
+    return _varint(number << 3 | 2) + _varint(len(value)) + value
+
+
+def _uint_field(number: int, value: int) -> bytes:
+    return _varint(number << 3) + _varint(value)
+
+
+def _cid_bytes(codec: int, block: bytes) -> bytes:
+    digest = hashlib.sha256(block).digest()
+    return _varint(1) + _varint(codec) + _varint(SHA2_256) + _varint(len(digest)) + digest
+
+
+def _cid_string(cid: bytes) -> str:
+    # Multibase 'b': lower-case base32 without padding
+    return 'b' + base64.b32encode(cid).decode('ascii').rstrip('=').lower()
+
+
+def ipfs_cid(data: bytes) -> str:
+    """CIDv1 that `ipfs add --cid-version 1` (and Pinata) give these bytes"""
+    if len(data) <= CHUNK_SIZE:
+        return _cid_string(_cid_bytes(RAW, data))
+
+    chunks = [data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE)]
+    if len(chunks) > MAX_LINKS:
+        raise ValueError(f"Files over {MAX_LINKS * CHUNK_SIZE // (1024 * 1024)} MB need a deeper DAG than ipfs_cid() builds")
+
+    # dag-pb encodes links (field 2) before data (field 1)
+    links = b''.join(
+        _field(2, _field(1, _cid_bytes(RAW, chunk)) + _field(2, b'') + _uint_field(3, len(chunk)))
+        for chunk in chunks
+    )
+    unixfs = _uint_field(1, 2) + _uint_field(3, len(data)) + b''.join(_uint_field(4, len(chunk)) for chunk in chunks)
+    return _cid_string(_cid_bytes(DAG_PB, links + _field(1, unixfs)))
+
+
+class CidIndex:
+    """Persistent record of CIDs this agent has uploaded"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS cids (
+                    cid TEXT PRIMARY KEY,
+                    post_id TEXT,
+                    title TEXT NOT NULL,
+                    uploaded_at REAL NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        return sqlite_transaction(self.path)
+
+    def find(self, cid: str) -> Optional[Dict[str, Any]]:
+        """Returns {'cid', 'post_id', 'title', 'uploaded_at'} for a known CID, or None"""
+        with self._lock, self._connect() as db:
+            row = db.execute(
+                "SELECT cid, post_id, title, uploaded_at FROM cids WHERE cid = ?", (cid,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'cid': row[0], 'post_id': row[1], 'title': row[2], 'uploaded_at': row[3]}
+
+    def add(self, cid: str, post_id: Optional[str], title: str):
+        """Records an uploaded CID"""
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO cids (cid, post_id, title, uploaded_at) VALUES (?, ?, ?, ?)",
+                (cid, post_id, title, time.time()),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock, self._connect() as db:
+            return {'cids': db.execute("SELECT COUNT(*) FROM cids").fetchone()[0]}
+
+
+_cid_index: Optional[CidIndex] = None
+_cid_index_lock = threading.Lock()
+
+
+def cid_index() -> CidIndex:
+    """Returns the process-wide index of uploaded CIDs"""
+    global _cid_index
+    with _cid_index_lock:
+        if _cid_index is None:
+            _cid_index = CidIndex(os.path.join(KULFY_CACHE_DIR, 'cids.sqlite3'))
+        return _cid_index
@@ -0,0 +1,338 @@
+"""
+Near-duplicate story detection for the Kulfy meme agent
+
+The same story often shows up under several URLs and again on the next
+run. Each article gets a 64-bit SimHash over its title and snippet; two
+articles whose fingerprints differ in at most STORY_DEDUPE_DISTANCE bits
+are treated as the same story.
+
+`StoryIndex` persists fingerprints together with the meme concepts that
+were generated for them, so stories we already covered can be dropped
+from the GPT-4 prompt and their earlier concepts surfaced instead.
+Fingerprints are split into four 16-bit bands stored in indexed columns;
+any two fingerprints within 3 bits share at least one band, so lookups
+only compare against a handful of candidates.
+
+Generated images get the same treatment: DALL-E often draws near-identical
+compositions for similar concepts. Each image gets a 64-bit perceptual hash
+(dHash or pHash, computed with NumPy), and `ImageIndex` remembers the hashes
+of recently uploaded memes so near-duplicates can be skipped or flagged
+before they are uploaded and sent to moderation.
+
+Configuration (environment variables):
+    STORY_DEDUPE_DISTANCE     - Max differing bits for a near-duplicate, 0-3 (default: 3)
+    STORY_INDEX_MAX_AGE_DAYS  - Forget stories older than this (default: 30)
+    IMAGE_HASH_ALGORITHM      - 'phash' or 'dhash' (default: phash)
+    IMAGE_DEDUPE_DISTANCE     - Max differing hash bits for a near-duplicate image (default: 8)
+    IMAGE_DEDUPE_ACTION       - 'skip' the upload or just 'flag' it (default: skip)
+    IMAGE_INDEX_MAX_AGE_DAYS  - Forget uploaded images older than this (default: 14)
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import logging
+from collections import Counter
+from io import BytesIO
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from cache import KULFY_CACHE_DIR, sqlite_transaction
+
+logger = logging.getLogger(__name__)
+
+STORY_DEDUPE_DISTANCE = int(os.getenv("STORY_DEDUPE_DISTANCE", "3"))
+STORY_INDEX_MAX_AGE_DAYS = float(os.getenv("STORY_INDEX_MAX_AGE_DAYS", "30"))
+IMAGE_HASH_ALGORITHM = os.getenv("IMAGE_HASH_ALGORITHM", "phash")
+IMAGE_DEDUPE_DISTANCE = int(os.getenv("IMAGE_DEDUPE_DISTANCE", "8"))
+IMAGE_DEDUPE_ACTION = os.getenv("IMAGE_DEDUPE_ACTION", "skip")
+IMAGE_INDEX_MAX_AGE_DAYS = float(os.getenv("IMAGE_INDEX_MAX_AGE_DAYS", "14"))
+
+_BANDS = 4
+_BAND_BITS = 64 // _BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+# Fingerprints further apart than this may share no band, so the index would miss them
+MAX_STORY_DEDUPE_DISTANCE = _BANDS - 1
+
+if not 0 <= STORY_DEDUPE_DISTANCE <= MAX_STORY_DEDUPE_DISTANCE:
+    raise ValueError(f"STORY_DEDUPE_DISTANCE must be between 0 and {MAX_STORY_DEDUPE_DISTANCE}, got {STORY_DEDUPE_DISTANCE}")
+
+
+def _features(text: str) -> Counter:
+    """Word unigrams and bigrams - short headlines need both to be stable"""
+    tokens = re.findall(r'\w+', text.lower())
+    return Counter(tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])])
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of a piece of text"""
+    weights = [0] * 64
+    for feature, count in _features(text).items():
+        h = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(64):
+            weights[bit] += count if (h >> bit) & 1 else -count
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def article_fingerprint(article: Dict[str, str]) -> int:
+    """SimHash of an article's title and snippet"""
+    return simhash(f"{article.get('title', '')} {article.get('snippet', '')}")
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits between two fingerprints"""
+    return bin(a ^ b).count('1')
+
+
+def _bands(fingerprint: int) -> List[int]:
+    return [(fingerprint >> (i * _BAND_BITS)) & _BAND_MASK for i in range(_BANDS)]
+
+
+def _to_signed(fingerprint: int) -> int:
+    """SQLite integers are signed 64-bit"""
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def collapse_duplicates(articles: List[Dict[str, str]], distance: int = STORY_DEDUPE_DISTANCE):
+    """
+    Drops near-duplicate articles within one batch, keeping the first of each story.
+    Returns (unique_articles, dropped_articles).
+    """
+    kept, kept_fingerprints, dropped = [], [], []
+    for article in articles:
+        fingerprint = article_fingerprint(article)
+        if any(hamming(fingerprint, other) <= distance for other in kept_fingerprints):
+            dropped.append(article)
+        else:
+            kept.append(article)
+            kept_fingerprints.append(fingerprint)
+    return kept, dropped
+
+
+class StoryIndex:
+    """Persistent SimHash index of stories we generated concepts for"""
+
+    def __init__(self, path: str, distance: int = STORY_DEDUPE_DISTANCE):
+        if not 0 <= distance <= MAX_STORY_DEDUPE_DISTANCE:
+            raise ValueError(f"Story index distance must be between 0 and {MAX_STORY_DEDUPE_DISTANCE}, got {distance}")
+        self.path = path
+        self.distance = distance
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS stories (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    fingerprint INTEGER NOT NULL,
+                    band0 INTEGER NOT NULL,
+                    band1 INTEGER NOT NULL,
+                    band2 INTEGER NOT NULL,
+                    band3 INTEGER NOT NULL,
+                    title TEXT NOT NULL,
+                    url TEXT,
+                    concepts TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            for band in range(_BANDS):
+                db.execute(f"CREATE INDEX IF NOT EXISTS stories_band{band} ON stories (band{band})")
+
+    def _connect(self):
+        return sqlite_transaction(self.path)
+
+    def find(self, article: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """Returns the closest stored story within the distance, or None"""
+        fingerprint = article_fingerprint(article)
+        bands = _bands(fingerprint)
+        cutoff = time.time() - STORY_INDEX_MAX_AGE_DAYS * 86400
+        with self._lock, self._connect() as db:
+            rows = db.execute(
+                "SELECT fingerprint, title, url, concepts, created_at FROM stories "
+                "WHERE created_at >= ? AND (band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?)",
+                (cutoff, *bands),
+            ).fetchall()
+        best = None
+        for stored, title, url, concepts, created_at in rows:
+            distance = hamming(fingerprint, stored & ((1 << 64) - 1))
+            if distance <= self.distance and (best is None or distance < best['distance']):
+                best = {
+                    'title': title,
+                    'url': url,
+                    'concepts': json.loads(concepts),
+                    'created_at': created_at,
+                    'distance': distance,
+                }
+        return best
+
+    def add(self, article: Dict[str, str], concepts: List[Dict[str, str]]):
+        """Records an article as covered by the given concepts"""
+        fingerprint = article_fingerprint(article)
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT INTO stories (fingerprint, band0, band1, band2, band3, title, url, concepts, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (_to_signed(fingerprint), *_bands(fingerprint), article.get('title', ''),
+                 article.get('url'), json.dumps(concepts), time.time()),
+            )
+
+    def prune(self):
+        """Forgets stories older than STORY_INDEX_MAX_AGE_DAYS"""
+        cutoff = time.time() - STORY_INDEX_MAX_AGE_DAYS * 86400
+        with self._lock, self._connect() as db:
+            deleted = db.execute("DELETE FROM stories WHERE created_at < ?", (cutoff,)).rowcount
+        if deleted:
+            logger.info(f"[DEDUPE] Pruned {deleted} old stories")
+
+
+_story_index: Optional[StoryIndex] = None
+_story_index_lock = threading.Lock()
+
+
+def story_index() -> StoryIndex:
+    """Returns the process-wide story index"""
+    global _story_index
+    with _story_index_lock:
+        if _story_index is None:
+            _story_index = StoryIndex(os.path.join(KULFY_CACHE_DIR, 'stories.sqlite3'))
+            _story_index.prune()
+        return _story_index
+
+
+# ============================================================================
+# Perceptual hashes of generated images
+# ============================================================================
+
+def _grayscale(image_data: bytes, width: int, height: int) -> np.ndarray:
+    """Decodes an image and shrinks it to a width x height grayscale float array"""
+    from PIL import Image
+
+    with Image.open(BytesIO(image_data)) as image:
+        small = image.convert('L').resize((width, height), Image.LANCZOS)
+    return np.asarray(small, dtype=np.float64)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.astype(np.uint8).ravel()).tobytes(), 'big')
+
+
+def dhash(image_data: bytes) -> int:
+    """64-bit difference hash: is each pixel brighter than its right neighbour?"""
+    pixels = _grayscale(image_data, 9, 8)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def phash(image_data: bytes) -> int:
+    """64-bit DCT hash: is each low-frequency coefficient above the median?"""
+    pixels = _grayscale(image_data, 32, 32)
+    low = (_DCT_32 @ pixels @ _DCT_32.T)[:8, :8]
+    return _bits_to_int(low > np.median(low.ravel()[1:]))
+
+
+IMAGE_HASHES = {
+    'phash': phash,
+    'dhash': dhash,
+}
+
+
+def image_hash(image_data: bytes, algorithm: str = IMAGE_HASH_ALGORITHM) -> int:
+    """Perceptual hash of an image with the configured algorithm"""
+    if algorithm not in IMAGE_HASHES:
+        raise ValueError(f"Unknown IMAGE_HASH_ALGORITHM '{algorithm}' (use one of {', '.join(IMAGE_HASHES)})")
+    return IMAGE_HASHES[algorithm](image_data)
+
+
+def hamming_many(fingerprint: int, fingerprints: np.ndarray) -> np.ndarray:
+    """Differing bits between one fingerprint and an array of uint64 fingerprints"""
+    xor = np.bitwise_xor(fingerprints, np.uint64(fingerprint))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class ImageIndex:
+    """Persistent perceptual-hash index of recently uploaded memes"""
+
+    def __init__(self, path: str, algorithm: str = IMAGE_HASH_ALGORITHM, distance: int = IMAGE_DEDUPE_DISTANCE):
+        self.path = path
+        self.algorithm = algorithm
+        self.distance = distance
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS images (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    algorithm TEXT NOT NULL,
+                    fingerprint INTEGER NOT NULL,
+                    title TEXT NOT NULL,
+                    cid TEXT,
+                    created_at REAL NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS images_recent ON images (algorithm, created_at)")
+
+    def _connect(self):
+        return sqlite_transaction(self.path)
+
+    def find(self, fingerprint: int) -> Optional[Dict[str, Any]]:
+        """
+        Returns the closest recent image within the distance, or None.
+        The recent window is small, so every hash in it is compared at once.
+        """
+        cutoff = time.time() - IMAGE_INDEX_MAX_AGE_DAYS * 86400
+        with self._lock, self._connect() as db:
+            rows = db.execute(
+                "SELECT fingerprint, title, cid, created_at FROM images WHERE algorithm = ? AND created_at >= ?",
+                (self.algorithm, cutoff),
+            ).fetchall()
+        if not rows:
+            return None
+        stored = np.array([row[0] for row in rows], dtype=np.int64).view(np.uint64)
+        distances = hamming_many(fingerprint, stored)
+        best = int(np.argmin(distances))
+        if distances[best] > self.distance:
+            return None
+        _, title, cid, created_at = rows[best]
+        return {'title': title, 'cid': cid, 'created_at': created_at, 'distance': int(distances[best])}
+
+    def add(self, fingerprint: int, title: str, cid: Optional[str]):
+        """Records an uploaded image"""
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT INTO images (algorithm, fingerprint, title, cid, created_at) VALUES (?, ?, ?, ?, ?)",
+                (self.algorithm, _to_signed(fingerprint), title, cid, time.time()),
+            )
+
+    def prune(self):
+        """Forgets images older than IMAGE_INDEX_MAX_AGE_DAYS"""
+        cutoff = time.time() - IMAGE_INDEX_MAX_AGE_DAYS * 86400
+        with self._lock, self._connect() as db:
+            deleted = db.execute("DELETE FROM images WHERE created_at < ?", (cutoff,)).rowcount
+        if deleted:
+            logger.info(f"[DEDUPE] Pruned {deleted} old image hashes")
+
+
+_image_index: Optional[ImageIndex] = None
+_image_index_lock = threading.Lock()
+
+
+def image_index() -> ImageIndex:
+    """Returns the process-wide image index"""
+    global _image_index
+    with _image_index_lock:
+        if _image_index is None:
+            _image_index = ImageIndex(os.path.join(KULFY_CACHE_DIR, 'images.sqlite3'))
+            _image_index.prune()
+        return _image_index
@@ -0,0 +1,446 @@
+"""
+Article extraction engine for the Kulfy meme agent
+
+Turns raw article HTML into the {title, snippet, url} dict used by the
+fetch node. The engine is pluggable so the parser backend and parsing
+strategy can be swapped without touching the graph:
+
+    fast   - lxml parser (if installed) with SoupStrainer partial parsing.
+             Only <head> meta/title, headings, article containers and <p>
+             subtrees are built; navigation, scripts and ad markup are skipped.
+    legacy - Full html.parser tree, exactly as the agent used to parse.
+
+Each news domain tends to match the same selectors on every page, so the
+engine keeps a per-domain profile of which title/content selector won.
+The winner is tried first next time and the rest of the list is only
+evaluated on a miss. Profiles persist to KULFY_CACHE_DIR/selector_profiles.json.
+
+Parsing is CPU-bound, so `extract_articles()` hands raw page bytes to a
+pool of worker processes and gets back only the small extracted dicts.
+Each page has a parse timeout; a worker that blows through it (or hangs)
+gets the pool recycled so a pathological page cannot stall the service.
+
+Configuration (environment variables):
+    EXTRACT_ENGINE        - 'fast' or 'legacy' (default: fast)
+    EXTRACT_POOL_SIZE     - Parser worker processes, 0 parses in-process (default: 2)
+    EXTRACT_PARSE_TIMEOUT - Max seconds to parse one page on the pool; in-process parsing has no limit (default: 10)
+
+Run `python bench_extract.py` to compare engines on the saved HTML fixtures.
+"""
+
+import os
+import json
+import time
+import atexit
+import math
+import signal
+import threading
+import logging
+import multiprocessing
+from importlib.util import find_spec
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from cache import KULFY_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+EXTRACT_ENGINE = os.getenv("EXTRACT_ENGINE", "fast")
+EXTRACT_POOL_SIZE = int(os.getenv("EXTRACT_POOL_SIZE", "2"))
+EXTRACT_PARSE_TIMEOUT = float(os.getenv("EXTRACT_PARSE_TIMEOUT", "10"))
+
+# Selectors are tried in order; the first good match wins
+TITLE_SELECTORS = [
+    'h1.article-title',
+    'h1.entry-title',
+    'h1[itemprop="headline"]',
+    'meta[property="og:title"]',
+    'h1',
+    'h2.title',
+    '.article-title',
+    '.post-title',
+    'title'
+]
+
+CONTENT_SELECTORS = [
+    'div[itemprop="articleBody"]',
+    'article.post-content',
+    'div.article-content',
+    '.entry-content',
+    'article',
+    '.post-content',
+    'main article'
+]
+
+# Tags and attributes the selectors above can match - everything else is skipped
+# by the partial parser (matching tags keep their whole subtree)
+_KEEP_TAGS = {'title', 'meta', 'h1', 'article', 'p'}
+_KEEP_CLASSES = {'article-title', 'entry-title', 'post-title', 'article-content', 'entry-content', 'post-content'}
+_KEEP_ITEMPROPS = {'articleBody', 'headline'}
+
+
+def _keep_tag(name: str, attrs: Dict) -> bool:
+    """SoupStrainer filter: keep only subtrees the selectors can match"""
+    if name in _KEEP_TAGS:
+        return True
+    classes = attrs.get('class') or ''
+    if isinstance(classes, str):
+        classes = classes.split()
+    if name == 'h2' and 'title' in classes:
+        return True
+    if _KEEP_CLASSES.intersection(classes):
+        return True
+    return attrs.get('itemprop') in _KEEP_ITEMPROPS
+
+
+def _default_parser() -> str:
+    """Fastest BeautifulSoup tree builder that is installed"""
+    return 'lxml' if find_spec('lxml') else 'html.parser'
+
+
+class ExtractionEngine:
+    """
+    Extracts article title and snippet from HTML.
+
+    Args:
+        parser: BeautifulSoup tree builder ('lxml', 'html.parser', ...)
+        partial: Build only the subtrees the selectors can match (SoupStrainer)
+    """
+
+    def __init__(self, parser: str = 'html.parser', partial: bool = False):
+        self.parser = parser
+        self.partial = partial
+        self._strainer = SoupStrainer(_keep_tag) if partial else None
+
+    def __repr__(self):
+        return f"ExtractionEngine(parser={self.parser!r}, partial={self.partial})"
+
+    def parse(self, html: bytes) -> BeautifulSoup:
+        """Builds the (possibly partial) soup for a page"""
+        return BeautifulSoup(html, self.parser, parse_only=self._strainer)
+
+    def extract(
+        self,
+        html: bytes,
+        url: str,
+        title_selectors: List[str] = TITLE_SELECTORS,
+        content_selectors: List[str] = CONTENT_SELECTORS,
+        verbose: bool = True,
+    ) -> Tuple[Optional[Dict[str, str]], Dict[str, Optional[str]]]:
+        """
+        Extracts the article title and a text snippet from raw page HTML.
+
+        Returns (article, matched) where article is a {title, snippet, url} dict
+        (or None if nothing useful was found) and matched names the selectors
+        that produced the title and content (None where nothing matched).
+        """
+        soup = self.parse(html)
+        title, title_selector = find_title(soup, title_selectors)
+        if verbose and title_selector:
+            print(f"   ✅ Title found via {title_selector}: {title[:60]}...")
+
+        content, content_selector = find_content(soup, content_selectors)
+        if verbose:
+            if content_selector:
+                print(f"   ✅ Content found via {content_selector}: {len(content)} chars")
+            else:
+                print(f"   ⚠️  Using fallback paragraph extraction: {len(content)} chars")
+
+        matched = {'title': title_selector, 'content': content_selector}
+        return build_article(title, content, url), matched
+
+
+def find_title(soup: BeautifulSoup, selectors: List[str]):
+    """Returns (title, selector) for the first selector that yields a usable title"""
+    title = None
+    for selector in selectors:
+        element = soup.select_one(selector)
+        if not element:
+            continue
+        if selector.startswith('meta'):
+            if element.get('content'):
+                return element.get('content'), selector
+        else:
+            title = element.get_text(strip=True)
+            if len(title) > 10 and not title.lower().startswith(('home', 'menu', 'skip')):
+                return title, selector
+    # Like the original loop, fall back to the last (rejected) candidate text
+    return title, None
+
+
+def find_content(soup: BeautifulSoup, selectors: List[str]):
+    """Returns (content, selector); selector is None when the <p> fallback was used"""
+    content = ''
+    for selector in selectors:
+        element = soup.select_one(selector)
+        if element:
+            # Get text from all paragraphs within the content
+            paragraphs = element.find_all('p', limit=10)
+            if paragraphs:
+                content = ' '.join([p.get_text(strip=True) for p in paragraphs])
+                if len(content) > 100:
+                    return content, selector
+
+    # Extract all paragraphs as fallback
+    paragraphs = soup.find_all('p', limit=10)
+    return ' '.join([p.get_text(strip=True) for p in paragraphs]), None
+
+
+def build_article(title: Optional[str], content: str, url: str) -> Optional[Dict[str, str]]:
+    """Assembles the article dict the rest of the graph expects"""
+    if not (title or content):
+        return None
+    return {
+        'title': title or 'Article from ' + url.split('/')[2],
+        'snippet': content[:500] if content else '',  # First 500 chars
+        'url': url
+    }
+
+
+class SelectorProfiles:
+    """
+    Per-domain record of which selectors matched, persisted as JSON.
+
+    Layout: {domain: {'title': {selector: hits}, 'content': {selector: hits}}}
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._profiles: Dict[str, Dict[str, Dict[str, int]]] = {}
+        try:
+            with open(path) as f:
+                self._profiles = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable selector profiles {path}: {e}")
+
+    def order(self, domain: str, field: str, selectors: List[str]) -> List[str]:
+        """Returns selectors with the domain's most successful one first"""
+        with self._lock:
+            hits = self._profiles.get(domain, {}).get(field, {})
+            winner = max(hits, key=hits.get, default=None)
+        if winner not in selectors:
+            return selectors
+        return [winner] + [s for s in selectors if s != winner]
+
+    def record(self, domain: str, matched: Dict[str, Optional[str]]):
+        """Counts the selectors that matched on a page from this domain"""
+        with self._lock:
+            profile = self._profiles.setdefault(domain, {})
+            for field, selector in matched.items():
+                if selector:
+                    hits = profile.setdefault(field, {})
+                    hits[selector] = hits.get(selector, 0) + 1
+                    self._dirty = True
+
+    def save(self):
+        """Writes profiles to disk if anything changed since the last save"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._profiles, indent=2, sort_keys=True)
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to save selector profiles: {e}")
+
+
+ENGINES = {
+    'fast': lambda: ExtractionEngine(parser=_default_parser(), partial=True),
+    'legacy': lambda: ExtractionEngine(parser='html.parser', partial=False),
+}
+
+_engine: Optional[ExtractionEngine] = None
+_profiles: Optional[SelectorProfiles] = None
+_profiles_lock = threading.Lock()
+
+
+def get_engine() -> ExtractionEngine:
+    """Returns the configured extraction engine"""
+    global _engine
+    if _engine is None:
+        if EXTRACT_ENGINE not in ENGINES:
+            logger.warning(f"Unknown EXTRACT_ENGINE '{EXTRACT_ENGINE}', using 'fast'")
+        _engine = ENGINES.get(EXTRACT_ENGINE, ENGINES['fast'])()
+        logger.info(f"Using {_engine}")
+    return _engine
+
+
+def get_selector_profiles() -> SelectorProfiles:
+    """Returns the process-wide selector profiles, loading them on first use"""
+    global _profiles
+    with _profiles_lock:
+        if _profiles is None:
+            _profiles = SelectorProfiles(os.path.join(KULFY_CACHE_DIR, 'selector_profiles.json'))
+        return _profiles
+
+
+class ParseTimeout(Exception):
+    """Raised inside a parser worker when a page takes too long"""
+
+
+def _raise_parse_timeout(signum, frame):
+    raise ParseTimeout()
+
+
+def _parse_worker(html: bytes, url: str, title_selectors: List[str], content_selectors: List[str], timeout: float):
+    """
+    Runs in a parser worker process. Returns (article, matched, error) - only
+    the small extracted dict crosses back to the parent, never the soup.
+    """
+    signal.signal(signal.SIGALRM, _raise_parse_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        article, matched = get_engine().extract(html, url, title_selectors, content_selectors, verbose=False)
+        return article, matched, None
+    except ParseTimeout:
+        return None, {}, f"Parsing timed out after {timeout:g}s"
+    except Exception as e:
+        return None, {}, f"Parsing failed: {str(e)}"
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class ParsePool:
+    """
+    Process pool for CPU-bound HTML parsing.
+
+    Workers enforce the per-page timeout themselves. As a backstop the parent
+    also waits at most a bounded time per batch; if a worker still has not
+    answered, the whole pool is terminated and rebuilt on next use.
+    """
+
+    def __init__(self, size: int, timeout: float):
+        self.size = size
+        self.timeout = timeout
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: the parent runs event loop and executor threads
+                self._pool = multiprocessing.get_context('spawn').Pool(self.size)
+                logger.info(f"Started HTML parser pool with {self.size} workers")
+            return self._pool
+
+    def _recycle(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.terminate()
+        logger.warning("Terminated stuck HTML parser pool; it will restart on next use")
+
+    def run(self, jobs: List[Tuple]) -> List[Tuple]:
+        """Parses (html, url, title_selectors, content_selectors) jobs, results in input order"""
+        pool = self._get_pool()
+        pending = [pool.apply_async(_parse_worker, job + (self.timeout,)) for job in jobs]
+
+        # Pages queue behind each other when there are more pages than workers
+        rounds = math.ceil(len(jobs) / self.size)
+        deadline = time.monotonic() + self.timeout * rounds + 5
+        results = []
+        stuck = False
+        for result in pending:
+            try:
+                results.append(result.get(timeout=max(0.1, deadline - time.monotonic())))
+            except multiprocessing.TimeoutError:
+                stuck = True
+                results.append((None, {}, f"Parsing timed out after {self.timeout:g}s"))
+        if stuck:
+            self._recycle(pool)
+        return results
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.terminate()
+
+
+_parse_pool: Optional[ParsePool] = None
+_parse_pool_lock = threading.Lock()
+
+
+def get_parse_pool() -> Optional[ParsePool]:
+    """Returns the shared parser pool, or None when parsing in-process"""
+    global _parse_pool
+    if EXTRACT_POOL_SIZE <= 0:
+        return None
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ParsePool(EXTRACT_POOL_SIZE, EXTRACT_PARSE_TIMEOUT)
+        return _parse_pool
+
+
+def extract_articles(pages: List[Tuple[bytes, str]], verbose: bool = True) -> List[Tuple[Optional[Dict[str, str]], Optional[str]]]:
+    """
+    Extracts {title, snippet, url} from a batch of (html, url) pages with the
+    configured engine, trying the selectors that worked before on each domain
+    first. Parsing runs on the parser pool when one is configured.
+
+    Returns (article, error) per page, in input order.
+    Call save_selector_profiles() after a batch to persist what was learned.
+    """
+    profiles = get_selector_profiles()
+    jobs = []
+    for html, url in pages:
+        domain = urlparse(url).netloc.lower()
+        jobs.append((
+            html,
+            url,
+            profiles.order(domain, 'title', TITLE_SELECTORS),
+            profiles.order(domain, 'content', CONTENT_SELECTORS),
+        ))
+
+    pool = get_parse_pool()
+    if pool is not None and jobs:
+        results = pool.run(jobs)
+    else:
+        # No timeout here: parsing runs on graph threads, where SIGALRM cannot
+        # be used and a thread cannot be interrupted
+        results = []
+        for job in jobs:
+            try:
+                article, matched = get_engine().extract(*job, verbose=False)
+                results.append((article, matched, None))
+            except Exception as e:
+                results.append((None, {}, f"Parsing failed: {str(e)}"))
+
+    extracted = []
+    for (html, url), (article, matched, error) in zip(pages, results):
+        profiles.record(urlparse(url).netloc.lower(), matched)
+        if verbose:
+            print(f"\n🔍 [DEBUG] Parsed URL: {url}")
+            if matched.get('title'):
+                print(f"   ✅ Title found via {matched['title']}: {article['title'][:60]}...")
+            if matched.get('content'):
+                print(f"   ✅ Content found via {matched['content']}: {len(article['snippet'])} chars")
+            elif not error:
+                print(f"   ⚠️  Used fallback paragraph extraction")
+        extracted.append((article, error))
+    return extracted
+
+
+def save_selector_profiles():
+    """Persists learned selector profiles"""
+    get_selector_profiles().save()
+
+
+def close():
+    """Stops the parser pool. Registered with atexit."""
+    if _parse_pool is not None:
+        _parse_pool.close()
+
+
+atexit.register(close)
@@ -0,0 +1,275 @@
+"""
+Incremental RSS / Atom / sitemap ingestion for the Kulfy meme agent
+
+Instead of pasting article URLs into a request, a job can name feeds.
+Each poll fetches the feeds with conditional GETs (a 304 costs nothing),
+then keeps only the items newer than that feed's watermark - the newest
+pubDate/lastmod seen so far, plus the GUIDs of recent undated items.
+Watermarks persist to KULFY_CACHE_DIR/feed_watermarks.json, so each poll
+cycle only sends new content into the graph. New items beyond
+FEED_MAX_ITEMS are kept with the watermark as pending, and the next poll
+returns them along with its own new items, newest first.
+
+Supported formats: RSS 2.0 <item>, Atom <entry>, and sitemaps / Google
+News sitemaps <url>. Sitemap indexes are not followed.
+
+Configuration (environment variables):
+    FEED_MAX_ITEMS - Max new items taken per poll, newest first (default: 10)
+"""
+
+import os
+import json
+import threading
+import logging
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, List, Optional
+
+from cache import KULFY_CACHE_DIR
+from fetcher import fetch_urls
+
+logger = logging.getLogger(__name__)
+
+FEED_MAX_ITEMS = int(os.getenv("FEED_MAX_ITEMS", "10"))
+
+FEED_CONTENT_TYPES = (
+    'application/rss+xml',
+    'application/atom+xml',
+    'application/xml',
+    'text/xml',
+)
+
+# Remember this many undated GUIDs per feed
+_MAX_SEEN_GUIDS = 500
+# Keep this many items per feed for later polls when a poll has more than max_items
+_MAX_PENDING_ITEMS = 500
+
+
+def _local(tag: str) -> str:
+    """Strips the XML namespace from a tag name"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _child_text(element: ET.Element, *names: str) -> Optional[str]:
+    """Text of the first direct or nested child with one of the local names"""
+    for child in element.iter():
+        if child is not element and _local(child.tag) in names and child.text and child.text.strip():
+            return child.text.strip()
+    return None
+
+
+def _parse_date(value: Optional[str]) -> Optional[float]:
+    """Parses RFC 822 (RSS) or ISO 8601 (Atom, sitemaps) dates to a timestamp"""
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def parse_feed(content: bytes) -> List[Dict[str, Any]]:
+    """
+    Parses an RSS, Atom or sitemap document into items with
+    url, guid, title and published (timestamp or None).
+    """
+    root = ET.fromstring(content)
+    items = []
+    for element in root.iter():
+        kind = _local(element.tag)
+        if kind == 'item':
+            url = _child_text(element, 'link')
+            guid = _child_text(element, 'guid') or url
+            published = _parse_date(_child_text(element, 'pubDate', 'date'))
+            title = _child_text(element, 'title')
+        elif kind == 'entry':
+            url = None
+            for link in element:
+                if _local(link.tag) == 'link' and link.get('rel', 'alternate') == 'alternate':
+                    url = link.get('href')
+                    break
+            guid = _child_text(element, 'id') or url
+            published = _parse_date(_child_text(element, 'published', 'updated'))
+            title = _child_text(element, 'title')
+        elif kind == 'url':
+            url = _child_text(element, 'loc')
+            guid = url
+            published = _parse_date(_child_text(element, 'publication_date', 'lastmod'))
+            title = _child_text(element, 'title')
+        else:
+            continue
+        if url:
+            items.append({'url': url, 'guid': guid, 'title': title, 'published': published})
+    return items
+
+
+class FeedWatermarks:
+    """
+    Per-feed polling state, persisted as JSON:
+    {feed_url: {'last_published': ts, 'seen_guids': [...], 'pending': [item, ...],
+                'etag': ..., 'last_modified': ...}}
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._feeds: Dict[str, Dict[str, Any]] = {}
+        try:
+            with open(path) as f:
+                self._feeds = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable feed watermarks {path}: {e}")
+
+    def get(self, feed_url: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._feeds.get(feed_url, {}))
+
+    def update(self, feed_url: str, **fields):
+        with self._lock:
+            self._feeds.setdefault(feed_url, {}).update(fields)
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self._feeds, indent=2, sort_keys=True)
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to save feed watermarks: {e}")
+
+
+def _new_items(items: List[Dict[str, Any]], watermark: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Items newer than the watermark; undated items count as new until their GUID is seen"""
+    last_published = watermark.get('last_published')
+    seen_guids = set(watermark.get('seen_guids', []))
+    new = []
+    for item in items:
+        if item['published'] is not None and last_published is not None:
+            if item['published'] > last_published:
+                new.append(item)
+        elif item['guid'] not in seen_guids:
+            new.append(item)
+    return new
+
+
+_watermarks: Optional[FeedWatermarks] = None
+_watermarks_lock = threading.Lock()
+_poll_lock = threading.Lock()
+
+
+def get_watermarks() -> FeedWatermarks:
+    global _watermarks
+    with _watermarks_lock:
+        if _watermarks is None:
+            _watermarks = FeedWatermarks(os.path.join(KULFY_CACHE_DIR, 'feed_watermarks.json'))
+        return _watermarks
+
+
+def poll_feeds(feed_urls: List[str], max_items: int = FEED_MAX_ITEMS, log=print) -> Dict[str, Any]:
+    """
+    Polls feeds once and advances their watermarks.
+
+    Returns {'items': new items (newest first, at most max_items),
+             'errors': [...], 'not_modified': feed count}.
+    New items that do not fit in max_items are returned by a later poll.
+    """
+    # One poller at a time, so two jobs never claim the same new items
+    with _poll_lock:
+        watermarks = get_watermarks()
+        conditional_headers = {}
+        for feed_url in feed_urls:
+            watermark = watermarks.get(feed_url)
+            validators = {}
+            if watermark.get('etag'):
+                validators['If-None-Match'] = watermark['etag']
+            if watermark.get('last_modified'):
+                validators['If-Modified-Since'] = watermark['last_modified']
+            if validators:
+                conditional_headers[feed_url] = validators
+
+        responses = fetch_urls(
+            feed_urls,
+            conditional_headers,
+            content_types=FEED_CONTENT_TYPES,
+            stop_paragraphs=0,
+        )
+
+        candidates = {}
+        errors = []
+        not_modified = 0
+        for response in responses:
+            feed_url = response['url']
+            # Items an earlier poll had no room for are still new
+            pending = watermarks.get(feed_url).get('pending', [])
+            candidates[feed_url] = pending
+            if response['status'] == 304:
+                not_modified += 1
+                log(f"   ♻️  Feed not modified: {feed_url[:60]}")
+                continue
+            if response['error']:
+                errors.append(f"Failed to poll feed {feed_url}: {response['error']}")
+                continue
+            if response['truncated']:
+                errors.append(f"Feed {feed_url} is larger than FETCH_MAX_BYTES; skipped")
+                continue
+            try:
+                items = parse_feed(response['content'])
+            except ET.ParseError as e:
+                errors.append(f"Failed to parse feed {feed_url}: {str(e)}")
+                continue
+
+            watermark = watermarks.get(feed_url)
+            fresh = _new_items(items, watermark)
+            log(f"   📡 {feed_url[:60]}: {len(fresh)} new of {len(items)} items"
+                + (f", {len(pending)} pending from earlier polls" if pending else ""))
+            pending_guids = {item['guid'] for item in pending}
+            candidates[feed_url] = pending + [item for item in fresh if item['guid'] not in pending_guids]
+
+            dated = [item['published'] for item in items if item['published'] is not None]
+            seen_guids = watermark.get('seen_guids', []) + [item['guid'] for item in fresh if item['published'] is None]
+            watermarks.update(
+                feed_url,
+                last_published=max(dated + [watermark.get('last_published') or 0]) or None,
+                seen_guids=seen_guids[-_MAX_SEEN_GUIDS:],
+                etag=response['headers'].get('etag'),
+                last_modified=response['headers'].get('last-modified'),
+            )
+
+        # Newest first; the same article can be listed by several feeds
+        new_items = [item for items in candidates.values() for item in items]
+        new_items.sort(key=lambda item: item['published'] or 0, reverse=True)
+        unique = []
+        seen_urls = set()
+        for item in new_items:
+            if item['url'] not in seen_urls:
+                seen_urls.add(item['url'])
+                unique.append(item)
+        taken = unique[:max_items]
+
+        # The watermarks already moved past the rest, so keep it for the next poll
+        taken_urls = {item['url'] for item in taken}
+        for feed_url, items in candidates.items():
+            left = sorted(
+                (item for item in items if item['url'] not in taken_urls),
+                key=lambda item: item['published'] or 0, reverse=True,
+            )
+            if len(left) > _MAX_PENDING_ITEMS:
+                logger.warning(f"Dropping {len(left) - _MAX_PENDING_ITEMS} oldest pending items of feed {feed_url}")
+            if left or watermarks.get(feed_url).get('pending'):
+                watermarks.update(feed_url, pending=left[:_MAX_PENDING_ITEMS])
+
+        watermarks.save()
+
+    return {'items': taken, 'errors': errors, 'not_modified': not_modified}
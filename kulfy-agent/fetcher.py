@@ -0,0 +1,240 @@
+"""
+Async article fetcher for the Kulfy meme agent
+
+Fetches a batch of article URLs concurrently with aiohttp so that a batch
+takes about as long as its slowest URL instead of the sum of all of them.
+
+Bodies are streamed rather than read whole. A response is rejected from its
+headers when it is not HTML or declares a body over FETCH_MAX_BYTES, and
+reading stops early at the byte cap or once enough closing </p> tags have
+arrived - the extractor only keeps the first few paragraphs anyway.
+
+The fetcher owns a small background event loop thread with one shared
+aiohttp session (connection pool). That keeps keep-alive connections warm
+across jobs and lets the synchronous LangGraph nodes call `fetch_urls()`
+from any thread, including while FastAPI's own event loop is running.
+
+Configuration (environment variables):
+    FETCH_MAX_CONCURRENCY  - Max open connections overall (default: 10)
+    FETCH_PER_HOST_LIMIT   - Max open connections per host (default: 4)
+    FETCH_URL_TIMEOUT      - Timeout per URL in seconds (default: 15)
+    FETCH_BATCH_DEADLINE   - Deadline for the whole batch in seconds (default: 25)
+    FETCH_MAX_BYTES        - Max bytes read per page (default: 2097152)
+    FETCH_STOP_PARAGRAPHS  - Stop reading after this many </p> tags, 0 to
+                             always read up to the byte cap (default: 40)
+"""
+
+import os
+import re
+import time
+import atexit
+import asyncio
+import threading
+import logging
+from typing import List, Dict, Any, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+FETCH_MAX_CONCURRENCY = int(os.getenv("FETCH_MAX_CONCURRENCY", "10"))
+FETCH_PER_HOST_LIMIT = int(os.getenv("FETCH_PER_HOST_LIMIT", "4"))
+FETCH_URL_TIMEOUT = float(os.getenv("FETCH_URL_TIMEOUT", "15"))
+FETCH_BATCH_DEADLINE = float(os.getenv("FETCH_BATCH_DEADLINE", "25"))
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(2 * 1024 * 1024)))
+FETCH_STOP_PARAGRAPHS = int(os.getenv("FETCH_STOP_PARAGRAPHS", "40"))
+
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+_PARAGRAPH_END = re.compile(rb'</p\s*>', re.IGNORECASE)
+_CHUNK_SIZE = 64 * 1024
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+}
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Returns the fetcher's background event loop, starting it on first use"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name="kulfy-fetch-loop", daemon=True)
+            thread.start()
+            logger.info("Started background fetch loop")
+    return _loop
+
+
+async def _get_session() -> aiohttp.ClientSession:
+    """Returns the shared aiohttp session (runs on the fetch loop only)"""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=FETCH_MAX_CONCURRENCY,
+            limit_per_host=FETCH_PER_HOST_LIMIT,
+            ttl_dns_cache=300,
+        )
+        _session = aiohttp.ClientSession(connector=connector, headers=DEFAULT_HEADERS)
+    return _session
+
+
+def _result(url: str, **fields) -> Dict[str, Any]:
+    """Builds a fetch result dict with every key present"""
+    result = {
+        'url': url,
+        'status': None,
+        'headers': {},
+        'content': b'',
+        'error': None,
+        'elapsed': 0.0,
+        'truncated': False,
+    }
+    result.update(fields)
+    return result
+
+
+def _check_headers(response: aiohttp.ClientResponse, content_types: Tuple[str, ...]) -> Optional[str]:
+    """Returns why a response should be rejected before reading its body, if at all"""
+    if response.status >= 400:
+        return f"HTTP {response.status}"
+    content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+    if content_type and content_type not in content_types:
+        return f"Unexpected content type ({content_type})"
+    if response.content_length is not None and response.content_length > FETCH_MAX_BYTES:
+        return f"Page too large ({response.content_length // 1024} KB > {FETCH_MAX_BYTES // 1024} KB)"
+    return None
+
+
+async def _read_capped(response: aiohttp.ClientResponse, stop_paragraphs: int):
+    """
+    Streams a body until it ends, hits FETCH_MAX_BYTES, or has enough paragraphs.
+    Returns (content, truncated).
+    """
+    body = bytearray()
+    paragraphs = 0
+    async for chunk in response.content.iter_chunked(_CHUNK_SIZE):
+        # Re-scan a few bytes before the chunk so a tag split across chunks still counts
+        scan_from = max(0, len(body) - 5)
+        body.extend(chunk[:FETCH_MAX_BYTES - len(body)])
+        if len(body) >= FETCH_MAX_BYTES:
+            return bytes(body), True
+        if stop_paragraphs:
+            paragraphs += len(_PARAGRAPH_END.findall(body, scan_from))
+            if paragraphs >= stop_paragraphs:
+                return bytes(body), True
+    return bytes(body), False
+
+
+async def _fetch_one(
+    session: aiohttp.ClientSession,
+    url: str,
+    headers: Optional[Dict[str, str]],
+    content_types: Tuple[str, ...],
+    stop_paragraphs: int,
+) -> Dict[str, Any]:
+    """Fetches a single URL. Never raises - errors are returned in the result."""
+    start_time = time.monotonic()
+    try:
+        timeout = aiohttp.ClientTimeout(total=FETCH_URL_TIMEOUT)
+        async with session.get(url, headers=headers, timeout=timeout) as response:
+            response_headers = {k.lower(): v for k, v in response.headers.items()}
+            error = _check_headers(response, content_types)
+            if error or response.status == 304:
+                # Leaving the context without reading closes the connection
+                # instead of downloading a body we are going to throw away
+                return _result(
+                    url,
+                    status=response.status,
+                    headers=response_headers,
+                    error=error,
+                    elapsed=time.monotonic() - start_time,
+                )
+            content, truncated = await _read_capped(response, stop_paragraphs)
+            if truncated:
+                response.close()
+            return _result(
+                url,
+                status=response.status,
+                headers=response_headers,
+                content=content,
+                truncated=truncated,
+                elapsed=time.monotonic() - start_time,
+            )
+    except asyncio.TimeoutError:
+        return _result(url, error=f"Timed out after {FETCH_URL_TIMEOUT:.0f}s", elapsed=time.monotonic() - start_time)
+    except Exception as e:
+        return _result(url, error=str(e) or type(e).__name__, elapsed=time.monotonic() - start_time)
+
+
+async def _fetch_batch(
+    urls: List[str],
+    request_headers: Dict[str, Dict[str, str]],
+    content_types: Tuple[str, ...],
+    stop_paragraphs: int,
+) -> List[Dict[str, Any]]:
+    """Fetches all URLs concurrently, giving up on stragglers at the batch deadline"""
+    session = await _get_session()
+    tasks = [
+        asyncio.ensure_future(_fetch_one(session, url, request_headers.get(url), content_types, stop_paragraphs))
+        for url in urls
+    ]
+    if not tasks:
+        return []
+
+    done, pending = await asyncio.wait(tasks, timeout=FETCH_BATCH_DEADLINE)
+    for task in pending:
+        task.cancel()
+
+    results = []
+    for url, task in zip(urls, tasks):
+        if task in done:
+            results.append(task.result())
+        else:
+            results.append(_result(
+                url,
+                error=f"Batch deadline of {FETCH_BATCH_DEADLINE:.0f}s exceeded",
+                elapsed=FETCH_BATCH_DEADLINE,
+            ))
+    return results
+
+
+def fetch_urls(
+    urls: List[str],
+    request_headers: Optional[Dict[str, Dict[str, str]]] = None,
+    content_types: Tuple[str, ...] = HTML_CONTENT_TYPES,
+    stop_paragraphs: int = FETCH_STOP_PARAGRAPHS,
+) -> List[Dict[str, Any]]:
+    """
+    Fetches URLs concurrently and blocks until the batch is done.
+
+    Args:
+        urls: URLs to fetch
+        request_headers: Optional extra request headers per URL
+        content_types: Accepted Content-Type values; others are rejected unread
+        stop_paragraphs: Stop reading after this many </p> tags (0 = never)
+
+    Returns one result dict per URL, in input order, with keys
+    url, status, headers (lower-cased names), content (bytes), error, elapsed,
+    truncated (True if reading stopped before the end of the body).
+    """
+    future = asyncio.run_coroutine_threadsafe(
+        _fetch_batch(list(urls), request_headers or {}, content_types, stop_paragraphs),
+        _get_loop(),
+    )
+    return future.result()
+
+
+def close():
+    """Closes the shared session. Registered with atexit."""
+    if _loop is not None and _session is not None and not _session.closed:
+        try:
+            asyncio.run_coroutine_threadsafe(_session.close(), _loop).result(timeout=5)
+        except Exception as e:
+            logger.warning(f"Failed to close fetch session: {e}")
+
+
+atexit.register(close)
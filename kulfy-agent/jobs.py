@@ -0,0 +1,194 @@
+"""
+Generation job registry for the Kulfy meme agent service
+
+The service used to keep one module-level status dict and answer "busy"
+while any job ran, so one instance served one editor at a time. Each
+request now gets a `Job` with its own ID, status, logs and result, kept
+in a `JobRegistry`. Jobs are asyncio tasks on the server's event loop,
+of which JOB_CONCURRENCY run at a time; up to JOB_QUEUE_SIZE more wait
+their turn, and only beyond that is a request turned away as busy. The
+blocking graph work itself runs on agent.py's graph pool (GRAPH_WORKERS),
+so the event loop stays free for /status, /health and /logs. DALL-E calls
+are still capped across all jobs by IMAGE_CONCURRENCY.
+
+Finished jobs are kept for /jobs/{id} until JOB_HISTORY_SIZE newer jobs
+have been submitted. State is in memory only (use Redis in production).
+
+Configuration (environment variables):
+    JOB_CONCURRENCY  - Jobs that run at the same time (default: 2)
+    JOB_QUEUE_SIZE   - Jobs that may wait for a free worker (default: 10)
+    JOB_HISTORY_SIZE - Jobs kept for status lookups, newest first (default: 50)
+"""
+
+import os
+import uuid
+import asyncio
+import threading
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "10"))
+JOB_HISTORY_SIZE = int(os.getenv("JOB_HISTORY_SIZE", "50"))
+
+
+class Job:
+    """One generation request: its status, logs and result"""
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind  # 'memes' or 'concepts'
+        self.status = 'queued'  # queued -> running -> completed | failed
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.current_step = 'Queued'
+        self.logs: List[Dict[str, Any]] = []
+        self.partial_concepts: List[Dict[str, Any]] = []  # Meme concepts streamed from GPT-4 so far
+        self.result: Optional[Dict[str, Any]] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self.status in ('queued', 'running')
+
+    def log(self, log_type: str, message: str, step: str = None, data: Optional[Dict[str, Any]] = None):
+        """Status callback for the agent: records a log entry for this job"""
+        entry = {'type': log_type, 'message': message, 'timestamp': datetime.now().isoformat()}
+        if data is not None:
+            entry['data'] = data
+        self.logs.append(entry)
+        if log_type == 'concept' and data is not None:
+            self.partial_concepts.append(data)
+        if step:
+            self.current_step = step
+        # Print to terminal with timestamp for better visibility
+        timestamp = datetime.now().strftime('%H:%M:%S')
+        print(f"[{timestamp}] [{self.id}] [{log_type.upper()}] {message}")
+
+    def to_dict(self, include_logs: bool = True) -> Dict[str, Any]:
+        job = {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'is_running': self.is_running,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'current_step': self.current_step,
+            'last_result': self.result,
+            'log_count': len(self.logs),
+        }
+        if include_logs:
+            job['logs'] = list(self.logs)
+            job['partial_concepts'] = list(self.partial_concepts)
+        return job
+
+
+class JobRegistry:
+    """
+    Runs jobs with bounded concurrency and keeps their state by ID.
+
+    Args:
+        max_concurrency: Jobs running at once
+        max_queued: Jobs allowed to wait for a worker
+        history_size: Jobs remembered, including finished ones
+    """
+
+    def __init__(self, max_concurrency: int = JOB_CONCURRENCY, max_queued: int = JOB_QUEUE_SIZE,
+                 history_size: int = JOB_HISTORY_SIZE):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queued = max(0, max_queued)
+        self.history_size = max(1, history_size)
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._lock = threading.Lock()
+        # Created by submit() on the serving loop: the registry is built at import,
+        # and before Python 3.10 a semaphore binds to whatever loop exists then
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def submit(self, kind: str, run: Callable[[Job], Awaitable[Dict[str, Any]]]) -> Optional[Job]:
+        """
+        Queues `await run(job)` and returns the job, or None if the queue is full.
+        Must be called on the event loop. run() returns the job's result and
+        may raise; either way it is recorded.
+        """
+        with self._lock:
+            queued = sum(1 for job in self._jobs.values() if job.status == 'queued')
+            running = sum(1 for job in self._jobs.values() if job.status == 'running')
+            if queued >= self.max_queued and running + queued >= self.max_concurrency:
+                return None
+            job = Job(kind)
+            self._jobs[job.id] = job
+            self._forget_old()
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        task = loop.create_task(self._run(job, run, self._slots))
+        # The loop only keeps weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: Job, run: Callable[[Job], Awaitable[Dict[str, Any]]], slots: asyncio.Semaphore):
+        async with slots:
+            await self._run_now(job, run)
+
+    async def _run_now(self, job: Job, run: Callable[[Job], Awaitable[Dict[str, Any]]]):
+        job.status = 'running'
+        job.started_at = datetime.now().isoformat()
+        try:
+            job.result = await run(job)
+            job.status = 'completed'
+        except Exception as e:
+            logger.error(f"[JOBS] Job {job.id} failed: {e}")
+            job.result = {
+                'success': False,
+                'completed_at': datetime.now().isoformat(),
+                'error': str(e),
+            }
+            job.status = 'failed'
+        finally:
+            job.finished_at = datetime.now().isoformat()
+
+    def _forget_old(self):
+        # Oldest finished jobs go first; queued and running jobs are always kept
+        while len(self._jobs) > self.history_size:
+            finished = next((job_id for job_id, job in self._jobs.items() if not job.is_running), None)
+            if finished is None:
+                return
+            del self._jobs[finished]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def latest(self) -> Optional[Job]:
+        """The most recently submitted job"""
+        with self._lock:
+            return next(reversed(self._jobs.values()), None)
+
+    def jobs(self) -> List[Job]:
+        """Known jobs, newest first"""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            'running': statuses.count('running'),
+            'queued': statuses.count('queued'),
+            'max_concurrency': self.max_concurrency,
+            'max_queued': self.max_queued,
+        }
+
+    def shutdown(self):
+        """Cancels jobs still waiting for a slot; running graphs finish on their own"""
+        for task in list(self._tasks):
+            task.cancel()
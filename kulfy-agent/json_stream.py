@@ -0,0 +1,58 @@
+"""
+Incremental JSON parsing for streamed GPT-4 responses
+
+GPT-4 streams the concepts JSON a few characters at a time. Instead of
+waiting for the whole body, `ConceptStreamParser` scans each chunk as it
+arrives and hands back every meme concept object as soon as its closing
+brace is seen, so concepts can be shown (and acted on) seconds after the
+first one is written.
+
+Concepts are the objects that sit directly inside an array at the top of
+the document, i.e. `[{...}, ...]` or `{"memes": [{...}, ...]}`.
+"""
+
+import json
+from typing import Any, Dict, List, Tuple
+
+
+class ConceptStreamParser:
+    """Feed it text chunks; it returns the concept objects completed by each chunk"""
+
+    def __init__(self):
+        self.text = ''
+        self._scanned = 0
+        self._stack: List[Tuple[str, int]] = []  # (opening bracket, index)
+        self._in_string = False
+        self._escape = False
+        self.concepts: List[Dict[str, Any]] = []
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consumes a chunk and returns any concepts it completed"""
+        self.text += chunk
+        completed = []
+        for i in range(self._scanned, len(self.text)):
+            char = self.text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._stack.append((char, i))
+            elif char in '}]' and self._stack:
+                opener, start = self._stack.pop()
+                # An object closing inside a top-level array, or an array one level down
+                if opener == '{' and self._stack and self._stack[-1][0] == '[' and len(self._stack) <= 2:
+                    try:
+                        concept = json.loads(self.text[start:i + 1])
+                    except ValueError:
+                        continue
+                    if isinstance(concept, dict):
+                        completed.append(concept)
+        self._scanned = len(self.text)
+        self.concepts.extend(completed)
+        return completed
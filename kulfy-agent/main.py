@@ -9,10 +9,12 @@ Usage:
 
 Endpoints:
     POST /generate-memes - Trigger meme generation
+    GET /jobs/{job_id} - Status, logs and result of one job
     GET /health - Health check
+    GET /outbox - Failed uploads waiting for redelivery
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
@@ -22,6 +24,9 @@ import asyncio
 from datetime import datetime
 
 from agent import run_meme_generation, run_meme_generation_concepts_only
+from uploader import upload_stats
+from jobs import JobRegistry
+import outbox
 
 # Load environment variables
 load_dotenv()
@@ -46,24 +51,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory storage for generation status (use Redis in production)
-generation_status = {
-    'is_running': False,
-    'last_run': None,
-    'last_result': None,
-    'logs': [],  # Real-time logs from agent
-    'current_step': '',  # Current step description
-}
-
-
-def update_generation_status(log_type: str, message: str, step: str = None):
-    """Callback to update generation status with logs"""
-    generation_status['logs'].append({'type': log_type, 'message': message, 'timestamp': datetime.now().isoformat()})
-    if step:
-        generation_status['current_step'] = step
-    # Print to terminal with timestamp for better visibility
-    timestamp = datetime.now().strftime('%H:%M:%S')
-    print(f"[{timestamp}] [{log_type.upper()}] {message}")
+# Generation jobs by ID, run on a bounded worker pool (see jobs.py)
+job_registry = JobRegistry()
 
 
 # ============================================================================
@@ -75,12 +64,17 @@ class GenerateMemesRequest(BaseModel):
     count: Optional[int] = 5  # Number of memes to generate
     urls: Optional[List[str]] = None  # URLs to fetch content from
     webhook_url: Optional[str] = None  # Optional webhook to notify on completion
-    custom_prompts: Optional[List[Dict[str, str]]] = None  # Custom prompts for phase 2 (visual_description, text_overlay)
+    custom_prompts: Optional[List[Dict[str, Any]]] = None  # Custom prompts for phase 2 (visual_description, text_overlay, caption_variants)
+    feeds: Optional[List[str]] = None  # RSS/Atom/sitemap URLs - only items new since the last poll are used
+    force_refresh: Optional[bool] = False  # Ignore cached results and call OpenAI again
+    caption_mode: Optional[str] = None  # 'dalle' bakes captions into the image, 'template' renders them locally
 
 
 class GenerateConceptsRequest(BaseModel):
     """Request model for concept generation only (phase 1)"""
     urls: Optional[List[str]] = None  # URLs to fetch content from
+    feeds: Optional[List[str]] = None  # RSS/Atom/sitemap URLs - only items new since the last poll are used
+    force_refresh: Optional[bool] = False  # Ignore cached results and call OpenAI again
 
 
 class GenerateMemesResponse(BaseModel):
@@ -97,6 +91,7 @@ class HealthResponse(BaseModel):
     version: str
     openai_configured: bool
     kulfy_endpoint: str
+    uploads: Dict[str, Any]  # Upload client counters and average latency
 
 
 # ============================================================================
@@ -113,10 +108,24 @@ async def root():
             "generate": "POST /generate-memes",
             "health": "GET /health",
             "status": "GET /status",
+            "job": "GET /jobs/{job_id}",
+            "outbox": "GET /outbox",
         }
     }
 
 
+@app.on_event("startup")
+async def start_outbox_worker():
+    """Resumes delivery of uploads left in the outbox by earlier runs"""
+    outbox.start_worker()
+
+
+@app.on_event("shutdown")
+async def stop_outbox_worker():
+    outbox.close()
+    job_registry.shutdown()
+
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
@@ -125,100 +134,125 @@ async def health_check():
         version="1.0.0",
         openai_configured=bool(os.getenv("OPENAI_API_KEY")),
         kulfy_endpoint=os.getenv("KULFY_UPLOAD_URL", "not_configured"),
+        uploads=upload_stats(),
     )
 
 
 @app.get("/status")
 async def get_status():
-    """Get current generation status with real-time logs"""
+    """Status of the most recent job with real-time logs, plus job pool counts"""
+    job = job_registry.latest()
+    status = job.to_dict() if job else {
+        "is_running": False,
+        "last_result": None,
+        "logs": [],
+        "current_step": '',
+        "log_count": 0,
+        "partial_concepts": [],
+    }
+    status["is_running"] = any(j.is_running for j in job_registry.jobs())
+    status["last_run"] = job.created_at if job else None
+    status["jobs"] = job_registry.stats()
+    return status
+
+
+@app.get("/jobs")
+async def list_jobs():
+    """Recent jobs, newest first, without their logs"""
     return {
-        "is_running": generation_status['is_running'],
-        "last_run": generation_status['last_run'],
-        "last_result": generation_status['last_result'],
-        "logs": generation_status.get('logs', []),
-        "current_step": generation_status.get('current_step', ''),
-        "log_count": len(generation_status.get('logs', [])),
+        "jobs": [job.to_dict(include_logs=False) for job in job_registry.jobs()],
+        **job_registry.stats(),
     }
 
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status, logs and result of one job"""
+    job = job_registry.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.to_dict()
+
+
+@app.get("/outbox")
+def get_outbox():
+    """Depth of the upload outbox and its most recent entries (reads SQLite, so runs on the threadpool)"""
+    return outbox.outbox().stats()
+
+
 @app.get("/logs")
 async def get_logs():
-    """Get all logs from the current/last generation run"""
+    """Get all logs from the most recent job"""
+    job = job_registry.latest()
     return {
-        "logs": generation_status.get('logs', []),
-        "current_step": generation_status.get('current_step', ''),
-        "is_running": generation_status['is_running'],
-        "last_run": generation_status['last_run'],
+        "job_id": job.id if job else None,
+        "logs": list(job.logs) if job else [],
+        "current_step": job.current_step if job else '',
+        "is_running": job.is_running if job else False,
+        "last_run": job.created_at if job else None,
     }
 
 
+def busy_message() -> str:
+    stats = job_registry.stats()
+    return (f"All {stats['max_concurrency']} workers are busy and {stats['queued']} jobs are already queued. "
+            "Please try again shortly.")
+
+
 @app.post("/generate-concepts")
-async def generate_concepts(
-    request: GenerateConceptsRequest,
-    background_tasks: BackgroundTasks
-):
+async def generate_concepts(request: GenerateConceptsRequest):
     """
     Phase 1: Generate meme concepts and DALL-E prompts only.
     User can review and edit prompts before image generation.
     """
-    if generation_status['is_running']:
-        return {
-            "success": False,
-            "message": "Generation already in progress. Please wait.",
-            "status": "busy",
-        }
-    
     if not os.getenv("OPENAI_API_KEY"):
         raise HTTPException(
             status_code=500,
             detail="OpenAI API key not configured"
         )
     
-    generation_status['is_running'] = True
-    generation_status['last_run'] = datetime.now().isoformat()
-    generation_status['logs'] = []
-    generation_status['current_step'] = 'Generating concepts...'
-    
-    async def run_concepts_task():
-        try:
-            result = await run_meme_generation_concepts_only(
-                urls=request.urls,
-                status_callback=update_generation_status
-            )
-            
-            generation_status['last_result'] = {
-                'success': True,
-                'completed_at': datetime.now().isoformat(),
-                'concepts': result,
-            }
-            generation_status['current_step'] = 'Concepts ready for review!'
-        except Exception as e:
-            error_message = f"❌ Concept generation failed: {str(e)}"
-            print(f"\n{error_message}")
-            generation_status['logs'].append({'type': 'error', 'message': error_message})
-            generation_status['last_result'] = {
-                'success': False,
-                'completed_at': datetime.now().isoformat(),
-                'error': str(e),
-            }
-            generation_status['current_step'] = 'Failed'
-        finally:
-            generation_status['is_running'] = False
-    
-    background_tasks.add_task(run_concepts_task)
+    job = job_registry.submit('concepts', lambda job: run_concepts_task(job, request))
+    if job is None:
+        return {
+            "success": False,
+            "message": busy_message(),
+            "status": "busy",
+        }
+    job.current_step = 'Generating concepts...'
     
     return {
         "success": True,
         "message": "Concept generation started! This will take 30-60 seconds.",
-        "job_id": generation_status['last_run'],
-        "status": "running",
+        "job_id": job.id,
+        "status": job.status,
+    }
+
+
+async def run_concepts_task(job, request: GenerateConceptsRequest) -> Dict[str, Any]:
+    """Job body for /generate-concepts"""
+    try:
+        result = await run_meme_generation_concepts_only(
+            urls=request.urls,
+            status_callback=job.log,
+            feeds=request.feeds,
+            force_refresh=bool(request.force_refresh),
+        )
+    except Exception as e:
+        error_message = f"❌ Concept generation failed: {str(e)}"
+        print(f"\n{error_message}")
+        job.log('error', error_message, 'Failed')
+        raise
+    
+    job.current_step = 'Concepts ready for review!'
+    return {
+        'success': True,
+        'completed_at': datetime.now().isoformat(),
+        'concepts': result,
     }
 
 
 @app.post("/generate-memes", response_model=GenerateMemesResponse)
-async def generate_memes(
-    request: GenerateMemesRequest,
-    background_tasks: BackgroundTasks
-):
+async def generate_memes(request: GenerateMemesRequest):
     """
     Trigger meme generation process.
     
@@ -230,15 +264,8 @@ async def generate_memes(
     5. Uploads to Kulfy app
     
     The process runs in the background and typically takes 2-5 minutes.
+    Poll GET /jobs/{job_id} for its progress.
     """
-    # Check if already running
-    if generation_status['is_running']:
-        return GenerateMemesResponse(
-            success=False,
-            message="Meme generation already in progress. Please wait.",
-            status="busy",
-        )
-    
     # Validate OpenAI key
     if not os.getenv("OPENAI_API_KEY"):
         raise HTTPException(
@@ -246,59 +273,49 @@ async def generate_memes(
             detail="OpenAI API key not configured"
         )
     
-    # Mark as running and reset logs
-    generation_status['is_running'] = True
-    generation_status['last_run'] = datetime.now().isoformat()
-    generation_status['logs'] = []
-    generation_status['current_step'] = 'Starting...'
-    
-    # Run agent in background
-    background_tasks.add_task(run_generation_task, request)
+    # Run agent on the job pool
+    job = job_registry.submit('memes', lambda job: run_generation_task(job, request))
+    if job is None:
+        return GenerateMemesResponse(
+            success=False,
+            message=busy_message(),
+            status="busy",
+        )
     
     return GenerateMemesResponse(
         success=True,
         message="Meme generation started! This will take 2-5 minutes.",
-        job_id=generation_status['last_run'],
-        status="running",
+        job_id=job.id,
+        status=job.status,
     )
 
 
-async def run_generation_task(request: GenerateMemesRequest):
+async def run_generation_task(job, request: GenerateMemesRequest) -> Dict[str, Any]:
     """
-    Background task that runs the meme generation agent.
+    Job body for /generate-memes. The graph itself runs on the agent's graph
+    pool, so awaiting it leaves the event loop free for other requests.
     """
     try:
-        log_message = f"🚀 Starting meme generation at {datetime.now().strftime('%H:%M:%S')}"
-        print(f"\n{log_message}")
-        generation_status['logs'].append({'type': 'info', 'message': log_message})
+        job.log('info', f"🚀 Starting meme generation at {datetime.now().strftime('%H:%M:%S')}")
         
         if request.urls and len(request.urls) > 0:
-            log_message = f"📰 Using {len(request.urls)} provided URL(s)"
-            print(log_message)
-            generation_status['logs'].append({'type': 'info', 'message': log_message})
+            job.log('info', f"📰 Using {len(request.urls)} provided URL(s)")
             for url in request.urls:
-                generation_status['logs'].append({'type': 'info', 'message': f"  • {url}"})
+                job.log('info', f"  • {url}")
         
-        generation_status['current_step'] = 'Fetching content...'
+        job.current_step = 'Fetching content...'
         
         # Run the agent with status callback
         result = await run_meme_generation(
             urls=request.urls,
-            status_callback=update_generation_status,
-            custom_prompts=request.custom_prompts
+            status_callback=job.log,
+            custom_prompts=request.custom_prompts,
+            feeds=request.feeds,
+            force_refresh=bool(request.force_refresh),
+            caption_mode=request.caption_mode,
         )
         
-        # Store result
-        generation_status['last_result'] = {
-            'success': True,
-            'completed_at': datetime.now().isoformat(),
-            'summary': result,
-        }
-        
-        log_message = "✅ Meme generation completed successfully!"
-        print(f"\n{log_message}")
-        generation_status['logs'].append({'type': 'success', 'message': log_message})
-        generation_status['current_step'] = 'Completed!'
+        job.log('success', "✅ Meme generation completed successfully!", 'Completed!')
         
         # TODO: Send webhook notification if provided
         if request.webhook_url:
@@ -307,16 +324,14 @@ async def run_generation_task(request: GenerateMemesRequest):
     except Exception as e:
         error_message = f"❌ Meme generation failed: {str(e)}"
         print(f"\n{error_message}")
-        generation_status['logs'].append({'type': 'error', 'message': error_message})
-        generation_status['last_result'] = {
-            'success': False,
-            'completed_at': datetime.now().isoformat(),
-            'error': str(e),
-        }
-        generation_status['current_step'] = 'Failed'
+        job.log('error', error_message, 'Failed')
+        raise
     
-    finally:
-        generation_status['is_running'] = False
+    return {
+        'success': True,
+        'completed_at': datetime.now().isoformat(),
+        'summary': result,
+    }
 
 
 # ============================================================================
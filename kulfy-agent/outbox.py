@@ -0,0 +1,303 @@
+"""
+Durable upload outbox for the Kulfy meme agent
+
+A failed upload used to drop the image bytes and leave only an error
+string, so getting that meme into Kulfy meant paying DALL-E for it again.
+Uploads that fail for a transient reason (connection error, timeout, 429
+or 5xx after the client's own retries) are now parked in an outbox on
+local disk: one SQLite row per upload, holding the form fields, plus the
+file parts as blob files next to it. The outbox survives restarts.
+
+A background worker drains the outbox: every OUTBOX_POLL_SECONDS it sends
+up to OUTBOX_CONCURRENCY due uploads in parallel. A delivery that fails
+again is rescheduled with exponential backoff (capped at
+OUTBOX_MAX_BACKOFF_SECONDS); one the server rejects outright (any other
+4xx) is kept as 'failed' for inspection rather than retried forever.
+Delivered uploads are deleted along with their blobs and recorded in the
+CID and image indexes, exactly like a direct upload.
+
+Configuration (environment variables):
+    OUTBOX_CONCURRENCY        - Uploads sent in parallel by the worker (default: 2)
+    OUTBOX_POLL_SECONDS       - Seconds between checks for due uploads (default: 10)
+    OUTBOX_BACKOFF_SECONDS    - Delay before the first redelivery, doubled each time (default: 30)
+    OUTBOX_MAX_BACKOFF_SECONDS - Longest delay between redeliveries (default: 3600)
+"""
+
+import os
+import json
+import time
+import uuid
+import atexit
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from cache import KULFY_CACHE_DIR, sqlite_transaction
+from cids import cid_index
+from dedupe import image_index
+from uploader import post_upload, Files
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "2"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "10"))
+OUTBOX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_BACKOFF_SECONDS", "30"))
+OUTBOX_MAX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_MAX_BACKOFF_SECONDS", "3600"))
+
+
+class UploadOutbox:
+    """
+    Persistent queue of uploads waiting to be (re)delivered.
+
+    Args:
+        directory: Holds outbox.sqlite3 and a blobs/ subdirectory
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, 'blobs'), exist_ok=True)
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS uploads (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    files TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    image_hash TEXT,
+                    state TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    next_attempt_at REAL NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS uploads_due ON uploads (state, next_attempt_at)")
+            # Deliveries interrupted by a restart are due again
+            db.execute("UPDATE uploads SET state = 'pending' WHERE state = 'sending'")
+
+    def _connect(self):
+        return sqlite_transaction(os.path.join(self.directory, 'outbox.sqlite3'))
+
+    def _blob_path(self, blob: str) -> str:
+        return os.path.join(self.directory, 'blobs', blob)
+
+    def add(self, url: str, title: str, files: Files, data: Dict[str, str],
+            error: str, image_hash: Optional[int] = None) -> int:
+        """
+        Parks an upload whose file parts are still readable and returns its id.
+        The first redelivery is due after OUTBOX_BACKOFF_SECONDS.
+        """
+        parts, size = [], 0
+        for field, (filename, body, mime) in (files.items() if isinstance(files, dict) else files):
+            body.seek(0)
+            payload = body.read()
+            blob = uuid.uuid4().hex
+            with open(self._blob_path(blob), 'wb') as f:
+                f.write(payload)
+            parts.append({'field': field, 'filename': filename, 'mime': mime, 'blob': blob})
+            size += len(payload)
+
+        now = time.time()
+        with self._lock, self._connect() as db:
+            cursor = db.execute(
+                "INSERT INTO uploads (url, title, data, files, size, image_hash, state, attempts, last_error, created_at, next_attempt_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, 'pending', 0, ?, ?, ?)",
+                (url, title, json.dumps(data), json.dumps(parts), size,
+                 format(image_hash, 'x') if image_hash is not None else None,
+                 error, now, now + OUTBOX_BACKOFF_SECONDS),
+            )
+            return cursor.lastrowid
+
+    def claim_due(self, limit: int) -> List[Dict[str, Any]]:
+        """Marks up to `limit` due uploads as being sent and returns them"""
+        with self._lock, self._connect() as db:
+            rows = db.execute(
+                "SELECT id, url, title, data, files, image_hash, attempts FROM uploads "
+                "WHERE state = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+                (time.time(), limit),
+            ).fetchall()
+            db.executemany("UPDATE uploads SET state = 'sending' WHERE id = ?", [(row[0],) for row in rows])
+        return [
+            {'id': row[0], 'url': row[1], 'title': row[2], 'data': json.loads(row[3]),
+             'files': json.loads(row[4]), 'image_hash': int(row[5], 16) if row[5] else None, 'attempts': row[6]}
+            for row in rows
+        ]
+
+    def delivered(self, entry: Dict[str, Any]):
+        """Removes a delivered upload and its blobs"""
+        with self._lock, self._connect() as db:
+            db.execute("DELETE FROM uploads WHERE id = ?", (entry['id'],))
+        for part in entry['files']:
+            try:
+                os.remove(self._blob_path(part['blob']))
+            except OSError:
+                pass
+
+    def retry_later(self, entry: Dict[str, Any], error: str, permanent: bool = False):
+        """Reschedules a failed delivery with backoff, or parks it as 'failed'"""
+        attempts = entry['attempts'] + 1
+        delay = min(OUTBOX_BACKOFF_SECONDS * (2 ** attempts), OUTBOX_MAX_BACKOFF_SECONDS)
+        with self._lock, self._connect() as db:
+            db.execute(
+                "UPDATE uploads SET state = ?, attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                ('failed' if permanent else 'pending', attempts, error, time.time() + delay, entry['id']),
+            )
+
+    def open_files(self, entry: Dict[str, Any]) -> List:
+        """Multipart file parts for a claimed upload; the caller closes them"""
+        return [
+            (part['field'], (part['filename'], open(self._blob_path(part['blob']), 'rb'), part['mime']))
+            for part in entry['files']
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        """Outbox depth by state, bytes held, and the oldest and next-due uploads"""
+        now = time.time()
+        with self._lock, self._connect() as db:
+            counts = dict(db.execute("SELECT state, COUNT(*) FROM uploads GROUP BY state").fetchall())
+            size, oldest = db.execute("SELECT COALESCE(SUM(size), 0), MIN(created_at) FROM uploads").fetchone()
+            next_due = db.execute(
+                "SELECT MIN(next_attempt_at) FROM uploads WHERE state = 'pending'"
+            ).fetchone()[0]
+            recent = db.execute(
+                "SELECT id, title, state, attempts, last_error FROM uploads ORDER BY id DESC LIMIT 10"
+            ).fetchall()
+        return {
+            'depth': counts.get('pending', 0) + counts.get('sending', 0),
+            'pending': counts.get('pending', 0),
+            'sending': counts.get('sending', 0),
+            'failed': counts.get('failed', 0),
+            'bytes': size,
+            'oldest_age_seconds': round(now - oldest, 1) if oldest else None,
+            'next_attempt_in_seconds': round(max(0.0, next_due - now), 1) if next_due else None,
+            'recent': [
+                {'id': r[0], 'title': r[1], 'state': r[2], 'attempts': r[3], 'last_error': r[4]}
+                for r in recent
+            ],
+        }
+
+
+_outbox: Optional[UploadOutbox] = None
+_outbox_lock = threading.Lock()
+
+
+def outbox() -> UploadOutbox:
+    """Returns the process-wide upload outbox"""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = UploadOutbox(os.path.join(KULFY_CACHE_DIR, 'outbox'))
+        return _outbox
+
+
+def is_transient(status: Optional[int]) -> bool:
+    """Whether an upload that ended with this status (None: no response) is worth redelivering"""
+    return status is None or status == 408 or status == 429 or status >= 500
+
+
+def deliver(entry: Dict[str, Any]) -> bool:
+    """Sends one claimed upload; returns True if it was delivered"""
+    box = outbox()
+    try:
+        files = box.open_files(entry)
+    except OSError as e:
+        box.retry_later(entry, f"Outbox blob missing: {str(e)}", permanent=True)
+        return False
+    result = None
+    try:
+        response, timing = post_upload(entry['url'], files, entry['data'], logger.info)
+        status = response.status_code
+        if status == 200:
+            result = response.json()
+            if not isinstance(result, dict):
+                raise ValueError(f"expected a JSON object, got {type(result).__name__}")
+            error = None
+        else:
+            error = f"Upload failed with status {status} after {timing['attempts']} attempt(s)"
+    except ValueError as e:
+        # A 200 whose body is not Kulfy's JSON, e.g. a proxy's HTML error page
+        status, error = None, f"Upload returned an unreadable response: {str(e)}"
+    except Exception as e:
+        status, error = None, f"Upload failed: {str(e)}"
+    finally:
+        for _, (_, body, _) in files:
+            body.close()
+
+    if error is not None:
+        box.retry_later(entry, error, permanent=not is_transient(status))
+        logger.warning(f"[OUTBOX] '{entry['title']}' not delivered (attempt {entry['attempts'] + 1}): {error}")
+        return False
+
+    box.delivered(entry)
+    if result.get('cid'):
+        cid_index().add(result['cid'], result.get('id'), entry['title'])
+    if entry['image_hash'] is not None:
+        image_index().add(entry['image_hash'], entry['title'], result.get('cid'))
+    logger.info(f"[OUTBOX] Delivered '{entry['title']}' (CID {result.get('cid')}, post {result.get('id')})")
+    return True
+
+
+class OutboxWorker:
+    """Background thread that drains the outbox"""
+
+    def __init__(self, concurrency: int = OUTBOX_CONCURRENCY, poll_seconds: float = OUTBOX_POLL_SECONDS):
+        self.concurrency = max(1, concurrency)
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix="kulfy-outbox")
+        self._thread = threading.Thread(target=self._run, name="kulfy-outbox", daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        """Checks for due uploads now instead of at the next poll"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                entries = outbox().claim_due(self.concurrency)
+                # Wait for the batch, so at most `concurrency` uploads are in flight
+                list(self._executor.map(deliver, entries))
+            except Exception as e:
+                logger.exception(f"[OUTBOX] Worker error: {e}")
+                entries = []
+            if len(entries) < self.concurrency:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=self.poll_seconds)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_worker: Optional[OutboxWorker] = None
+_worker_lock = threading.Lock()
+
+
+def start_worker() -> OutboxWorker:
+    """Starts the process-wide outbox worker if it is not running yet"""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = OutboxWorker()
+            logger.info(f"[OUTBOX] Worker started ({_worker.concurrency} concurrent, polling every {_worker.poll_seconds:g}s)")
+        return _worker
+
+
+def close():
+    """Stops the outbox worker. Registered with atexit."""
+    global _worker
+    with _worker_lock:
+        worker, _worker = _worker, None
+    if worker is not None:
+        worker.stop()
+
+
+atexit.register(close)
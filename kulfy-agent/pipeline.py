@@ -0,0 +1,150 @@
+"""
+Multi-stage producer/consumer pipeline for the Kulfy meme agent
+
+Each meme goes through generate -> download -> upload. Running those
+serially leaves the network idle while DALL-E draws and DALL-E idle while
+we upload. `StagePipeline` gives every stage its own worker threads and a
+bounded queue in front of it, so a download or upload for one meme
+overlaps with generation of the next, and a slow stage pushes back on the
+ones before it instead of piling up images in memory.
+
+Items are submitted with a key (the meme index) and come out of `close()`
+as a {key: result} dict. A stage that raises drops the item: its result is
+None and later stages never see it. Per-stage timings are kept for the
+job summary. An optional `finalize(results)` runs once every stage has
+drained, for work that needs the whole job at once (e.g. batch uploads).
+
+Configuration (environment variables):
+    PIPELINE_QUEUE_SIZE - Max items waiting in front of each stage (default: 5)
+"""
+
+import os
+import time
+import queue
+import threading
+import logging
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "5"))
+
+_STOP = object()
+
+
+class Stage(NamedTuple):
+    """One pipeline step: func(item) -> item for the next stage"""
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+
+
+class StagePipeline:
+    """
+    Runs items through a fixed list of stages.
+
+    Args:
+        stages: Stages in order; each gets `workers` threads
+        queue_size: Bound of the queue in front of each stage
+        finalize: Called with the results dict after the last stage drains;
+                  may update results in place
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = PIPELINE_QUEUE_SIZE,
+                 finalize: Optional[Callable[[Dict[Hashable, Any]], None]] = None):
+        self.stages = stages
+        self.finalize = finalize
+        self.results: Dict[Hashable, Any] = {}
+        self._queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in stages]
+        self._lock = threading.Lock()
+        self._timings = {
+            stage.name: {'items': 0, 'failed': 0, 'busy_seconds': 0.0, 'max_seconds': 0.0, 'wall_seconds': 0.0}
+            for stage in stages
+        }
+        if finalize is not None:
+            self._timings['finalize'] = {'items': 0, 'failed': 0, 'busy_seconds': 0.0, 'max_seconds': 0.0, 'wall_seconds': 0.0}
+        self._first_start: Dict[str, float] = {}
+        self._last_end: Dict[str, float] = {}
+        self._threads: List[List[threading.Thread]] = []
+        for position, stage in enumerate(stages):
+            threads = [
+                threading.Thread(
+                    target=self._worker,
+                    args=(position,),
+                    name=f"kulfy-{stage.name}-{n}",
+                    daemon=True,
+                )
+                for n in range(max(1, stage.workers))
+            ]
+            for thread in threads:
+                thread.start()
+            self._threads.append(threads)
+
+    def submit(self, key: Hashable, item: Any):
+        """Queues an item for the first stage; blocks while that queue is full"""
+        self._queues[0].put((key, item))
+
+    def _worker(self, position: int):
+        stage = self.stages[position]
+        while True:
+            job = self._queues[position].get()
+            if job is _STOP:
+                return
+            key, item = job
+            start = time.perf_counter()
+            try:
+                item = stage.func(item)
+                failed = item is None
+            except Exception as e:
+                logger.exception(f"[PIPELINE] Stage '{stage.name}' failed for item {key}: {e}")
+                item, failed = None, True
+            end = time.perf_counter()
+            self._record(stage.name, start, end, failed)
+
+            if item is None or position == len(self.stages) - 1:
+                with self._lock:
+                    self.results[key] = item
+            else:
+                self._queues[position + 1].put((key, item))
+
+    def _record(self, name: str, start: float, end: float, failed: bool):
+        elapsed = end - start
+        with self._lock:
+            timing = self._timings[name]
+            timing['items'] += 1
+            timing['failed'] += int(failed)
+            timing['busy_seconds'] += elapsed
+            timing['max_seconds'] = max(timing['max_seconds'], elapsed)
+            self._first_start[name] = min(self._first_start.get(name, start), start)
+            self._last_end[name] = max(self._last_end.get(name, end), end)
+
+    def close(self) -> Dict[Hashable, Any]:
+        """Waits for every submitted item to leave the pipeline and returns the results"""
+        for position, threads in enumerate(self._threads):
+            for _ in threads:
+                self._queues[position].put(_STOP)
+            for thread in threads:
+                thread.join()
+        if self.finalize is not None:
+            start = time.perf_counter()
+            try:
+                self.finalize(self.results)
+            except Exception as e:
+                logger.exception(f"[PIPELINE] Finalize step failed: {e}")
+            self._record('finalize', start, time.perf_counter(), False)
+        return self.results
+
+    def timings(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-stage counts and seconds. busy_seconds sums the time workers spent
+        on items; wall_seconds spans the stage's first start to its last finish.
+        """
+        with self._lock:
+            timings = {}
+            for name, timing in self._timings.items():
+                timing = dict(timing)
+                if name in self._first_start:
+                    timing['wall_seconds'] = self._last_end[name] - self._first_start[name]
+                timing['avg_seconds'] = timing['busy_seconds'] / timing['items'] if timing['items'] else 0.0
+                timings[name] = {k: round(v, 3) if isinstance(v, float) else v for k, v in timing.items()}
+            return timings
@@ -0,0 +1,160 @@
+"""
+Image renditions for the Kulfy meme agent
+
+DALL-E returns 1024x1024 PNGs that are often over 1 MB. Before upload each
+image is re-encoded with Pillow into a compressed primary image (WebP by
+default, or JPEG) plus a small thumbnail for the feed grid. That cuts upload
+bytes, IPFS pinning size and feed load times several-fold.
+
+Encoding is CPU-bound, so `make_renditions()` runs in a pool of worker
+processes and only bytes cross the process boundary.
+
+Configuration (environment variables):
+    IMAGE_OUTPUT_FORMAT  - 'webp', 'jpeg', or 'png' to upload the original (default: webp)
+    IMAGE_OUTPUT_QUALITY - Encoder quality for the primary image, 1-100 (default: 82)
+    IMAGE_THUMBNAIL_SIZE - Longest side of the thumbnail in pixels, 0 disables (default: 320)
+    TRANSCODE_POOL_SIZE  - Encoder worker processes, 0 encodes in-process (default: 2)
+"""
+
+import os
+import atexit
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+IMAGE_OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "webp").lower()
+IMAGE_OUTPUT_QUALITY = int(os.getenv("IMAGE_OUTPUT_QUALITY", "82"))
+IMAGE_THUMBNAIL_SIZE = int(os.getenv("IMAGE_THUMBNAIL_SIZE", "320"))
+TRANSCODE_POOL_SIZE = int(os.getenv("TRANSCODE_POOL_SIZE", "2"))
+
+# Output format -> (Pillow format, mime type, file extension)
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+    'png': ('PNG', 'image/png', 'png'),
+}
+
+# Thumbnails are small enough that a lower quality is not noticeable
+THUMBNAIL_QUALITY = 70
+
+
+def _encode(image, output_format: str, quality: int) -> bytes:
+    pil_format = FORMATS[output_format][0]
+    if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    if pil_format == 'WEBP':
+        image.save(buffer, pil_format, quality=quality, method=4)
+    elif pil_format == 'JPEG':
+        image.save(buffer, pil_format, quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, pil_format, optimize=True)
+    return buffer.getvalue()
+
+
+def _render(image_data: bytes, output_format: str, quality: int, thumbnail_size: int) -> Dict[str, Any]:
+    """Worker: decodes the image once and encodes the primary image and thumbnail"""
+    from PIL import Image
+
+    with Image.open(BytesIO(image_data)) as image:
+        image.load()
+        width, height = image.size
+        _, mime, extension = FORMATS[output_format]
+
+        primary = image_data
+        if output_format != 'png':
+            encoded = _encode(image, output_format, quality)
+            # Flat, few-colour art can already be smaller as PNG
+            if len(encoded) < len(image_data):
+                primary = encoded
+            else:
+                mime, extension = 'image/png', 'png'
+
+        thumbnail = None
+        if thumbnail_size > 0:
+            # A PNG thumbnail would defeat the point; those get WebP
+            thumbnail_format = 'webp' if output_format == 'png' else output_format
+            small = image.copy()
+            small.thumbnail((thumbnail_size, thumbnail_size), Image.LANCZOS)
+            thumbnail = {
+                'data': _encode(small, thumbnail_format, THUMBNAIL_QUALITY),
+                'mime': FORMATS[thumbnail_format][1],
+                'width': small.size[0],
+                'height': small.size[1],
+            }
+
+    return {
+        'data': primary,
+        'mime': mime,
+        'extension': extension,
+        'width': width,
+        'height': height,
+        'thumbnail': thumbnail,
+    }
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_transcode_pool() -> Optional[ProcessPoolExecutor]:
+    """Returns the shared encoder pool, or None when encoding in-process"""
+    global _pool
+    if TRANSCODE_POOL_SIZE <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the parent runs event loop and executor threads
+            _pool = ProcessPoolExecutor(TRANSCODE_POOL_SIZE, mp_context=multiprocessing.get_context('spawn'))
+            logger.info(f"Started image encoder pool with {TRANSCODE_POOL_SIZE} workers")
+        return _pool
+
+
+def make_renditions(image_data: bytes,
+                    output_format: str = IMAGE_OUTPUT_FORMAT,
+                    quality: int = IMAGE_OUTPUT_QUALITY,
+                    thumbnail_size: int = IMAGE_THUMBNAIL_SIZE) -> Dict[str, Any]:
+    """
+    Re-encodes a generated image for upload.
+
+    Returns {'data', 'mime', 'extension', 'width', 'height', 'thumbnail'}, where
+    thumbnail is None or {'data', 'mime', 'width', 'height'}.
+    """
+    if output_format not in FORMATS:
+        raise ValueError(f"Unsupported IMAGE_OUTPUT_FORMAT '{output_format}' (use one of {', '.join(FORMATS)})")
+    pool = get_transcode_pool()
+    if pool is None:
+        return _render(image_data, output_format, quality, thumbnail_size)
+    try:
+        return pool.submit(_render, image_data, output_format, quality, thumbnail_size).result()
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM); start a fresh pool on next use
+        _discard_pool(pool)
+        raise
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+    logger.warning("Image encoder pool broke; it will restart on next use")
+
+
+def close():
+    """Stops the encoder pool. Registered with atexit."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(close)
@@ -0,0 +1,111 @@
+"""
+Shared setup for the kulfy-agent tests
+
+Run from kulfy-agent/ with `python -m pytest -q tests`. The agent modules
+read their configuration at import time, so the cache directory and a
+placeholder OpenAI key are set here, before any test imports them.
+No test calls OpenAI, Kulfy or the network: the `kulfy` fixture starts a
+local stand-in for the Kulfy upload API and fakes DALL-E.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["KULFY_CACHE_DIR"] = tempfile.mkdtemp(prefix="kulfy-test-cache-")
+if not os.environ.get("OPENAI_API_KEY"):
+    os.environ["OPENAI_API_KEY"] = "sk-test-placeholder"
+
+
+class StubKulfy(BaseHTTPRequestHandler):
+    """Stand-in for the Kulfy app's /api/upload and /api/upload/bulk"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        message = BytesParser(policy=default_policy).parsebytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode('ascii') + body
+        )
+        fields = {
+            part.get_param('name', header='content-disposition'): part.get_payload(decode=True)
+            for part in message.iter_parts()
+        }
+        self.server.requests.append((self.path, fields))
+
+        if self.path == '/api/upload':
+            self.reply(200, self.created(fields['file']))
+        elif self.path == '/api/upload/bulk' and self.server.bulk:
+            indexes = sorted(int(name.split('.')[1]) for name in fields if name.startswith('file.'))
+            self.reply(200, {'ok': True, 'results': [
+                dict(self.created(fields[f'file.{n}']), index=n) for n in indexes
+            ]})
+        else:
+            self.reply(404, {'error': 'Not found'})
+
+    def do_HEAD(self):
+        # Like a page or proxy that ignores ?cid=, unless a post ID is configured
+        self.send_response(200)
+        if self.server.head_post_id:
+            self.send_header('X-Post-Id', self.server.head_post_id)
+        self.end_headers()
+
+    def created(self, data):
+        from cids import ipfs_cid
+
+        # Pinata's CID for the bytes, like the real endpoint
+        digest = hashlib.sha256(data).hexdigest()
+        return {'ok': True, 'id': f"post-{digest[:8]}", 'cid': ipfs_cid(data), 'duplicate': False}
+
+    def reply(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def kulfy(monkeypatch):
+    """Starts a stub Kulfy app, points the agent's batch uploads at it and fakes DALL-E"""
+    import agent
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubKulfy)
+    server.requests = []
+    server.bulk = True
+    server.head_post_id = None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv('KULFY_UPLOAD_URL', f"http://127.0.0.1:{server.server_port}/api/upload")
+    monkeypatch.delenv('KULFY_BULK_UPLOAD_URL', raising=False)
+    monkeypatch.setattr(agent, 'UPLOAD_MODE', 'batch')
+    monkeypatch.setattr(agent, 'UPLOAD_CID_CHECK', 'off')
+    monkeypatch.setattr(agent, 'generate_dalle_image', fake_dalle)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fake_dalle(prompt, log, response_format='b64_json'):
+    """A distinct noise image per prompt, so image dedupe keeps them all"""
+    seed = int.from_bytes(hashlib.sha256(prompt.encode('utf-8')).digest()[:4], 'big')
+    pixels = np.random.default_rng(seed).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+    png = BytesIO()
+    Image.fromarray(pixels).save(png, format='PNG')
+    return SimpleNamespace(data=[SimpleNamespace(url=None, b64_json=base64.b64encode(png.getvalue()).decode('ascii'))])
@@ -0,0 +1,34 @@
+import sqlite3
+
+import pytest
+
+import cache
+from cache import DiskCache
+from cids import CidIndex
+from dedupe import StoryIndex, ImageIndex
+from outbox import UploadOutbox
+
+
+def test_sqlite_connections_are_closed_after_each_call(monkeypatch, tmp_path):
+    opened = []
+    connect = sqlite3.connect
+
+    def tracking_connect(*args, **kwargs):
+        opened.append(connect(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(cache.sqlite3, 'connect', tracking_connect)
+    monkeypatch.setattr(cache, 'KULFY_CACHE_DIR', str(tmp_path))
+
+    disk = DiskCache('test', 1024 * 1024)
+    disk.put('key', b'value', {})
+    assert disk.get('key')['value'] == b'value'
+    CidIndex(str(tmp_path / 'cids.sqlite3')).add('bafkreiexample', 'post-1', 'Meme')
+    StoryIndex(str(tmp_path / 'stories.sqlite3')).find({'title': 'Story', 'snippet': 'Text'})
+    ImageIndex(str(tmp_path / 'images.sqlite3')).add(1234, 'Meme', None)
+    UploadOutbox(str(tmp_path / 'outbox')).stats()
+
+    assert len(opened) >= 10
+    for db in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            db.execute("SELECT 1")
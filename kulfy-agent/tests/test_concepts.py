@@ -0,0 +1,64 @@
+import agent
+
+
+ARTICLES = [
+    {'title': 'Star hero announces pan-India sequel', 'snippet': 'The sequel shoots next month in Hyderabad.', 'url': 'https://example.com/sequel'},
+    {'title': 'OTT platform drops Telugu thriller early', 'snippet': 'The thriller streams from Friday.', 'url': 'https://example.com/thriller'},
+]
+
+CONCEPT = {'title': 'Sequel season', 'text_overlay': 'Me: saving for tickets', 'visual_description': 'A cartoon wallet', 'context': 'Fans'}
+
+
+def concepts_state(force_refresh: bool):
+    return {'scraped_content': [dict(a) for a in ARTICLES], 'errors': [], 'force_refresh': force_refresh}
+
+
+def test_force_refresh_calls_gpt_for_covered_stories(monkeypatch):
+    calls = []
+
+    def fake_request(prompt, log, on_concept=None):
+        calls.append(prompt)
+        return [dict(CONCEPT, title=f"Concept {len(calls)}.{i}") for i in range(5)]
+
+    monkeypatch.setattr(agent, 'request_meme_concepts', fake_request)
+
+    first = agent.generate_meme_concepts(concepts_state(force_refresh=False))
+    assert len(calls) == 1
+
+    # Same URLs again: covered by the story index, no new GPT call
+    cached = agent.generate_meme_concepts(concepts_state(force_refresh=False))
+    assert len(calls) == 1
+    assert cached['meme_concepts'] == first['meme_concepts']
+    assert len(cached['covered_stories']) == len(ARTICLES)
+
+    for run in range(3):
+        refreshed = agent.generate_meme_concepts(concepts_state(force_refresh=True))
+        assert len(calls) == 2 + run
+        assert refreshed['covered_stories'] == []
+        assert refreshed['meme_concepts'][0]['title'] == f"Concept {len(calls)}.0"
+
+
+def test_stream_that_fails_part_way_keeps_only_streamed_concepts(kulfy, monkeypatch):
+    streamed = [
+        dict(CONCEPT, title='Streamed one', visual_description='First streamed scene'),
+        dict(CONCEPT, title='Streamed two', visual_description='Second streamed scene',
+             caption_variants=['Another caption']),
+    ]
+
+    def failing_stream(prompt, log, on_concept=None):
+        for index, concept in enumerate(streamed, 1):
+            on_concept(index, concept)
+        raise Exception("GPT-4 API call failed: connection reset")
+
+    monkeypatch.setattr(agent, 'request_meme_concepts', failing_stream)
+    logs = []
+    state = dict(concepts_state(force_refresh=True), caption_mode='dalle',
+                 status_callback=lambda log_type, message, step=None, data=None: logs.append(message))
+
+    state = agent.generate_concepts_and_images(state)
+
+    assert state['meme_concepts'] == streamed
+    assert [r['title'] for r in state['upload_results']] == ['Streamed one', 'Streamed two', 'Streamed two (2)']
+    # Progress counts the items actually submitted, caption variants included
+    totals = [int(message.split('/')[1].split(':')[0]) for message in logs if 'Generating image' in message]
+    assert totals and max(totals) == 3
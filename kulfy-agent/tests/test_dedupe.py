@@ -0,0 +1,23 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from dedupe import StoryIndex, MAX_STORY_DEDUPE_DISTANCE
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_story_index_rejects_distances_its_bands_cannot_find(tmp_path):
+    StoryIndex(str(tmp_path / 'ok.sqlite3'), distance=MAX_STORY_DEDUPE_DISTANCE)
+    with pytest.raises(ValueError):
+        StoryIndex(str(tmp_path / 'too-far.sqlite3'), distance=MAX_STORY_DEDUPE_DISTANCE + 1)
+
+
+def test_too_large_story_dedupe_distance_fails_at_import():
+    env = dict(os.environ, STORY_DEDUPE_DISTANCE=str(MAX_STORY_DEDUPE_DISTANCE + 1))
+    result = subprocess.run([sys.executable, '-c', 'import dedupe'], cwd=AGENT_DIR, env=env,
+                            capture_output=True, text=True)
+    assert result.returncode != 0
+    assert 'STORY_DEDUPE_DISTANCE must be between 0 and 3' in result.stderr
@@ -0,0 +1,41 @@
+import feeds
+
+FEED_URL = 'https://example.com/rss'
+
+
+def rss(*days):
+    items = ''.join(
+        f"<item><title>Story {day}</title><link>https://example.com/story-{day}</link>"
+        f"<pubDate>{day:02d} Jan 2026 10:00:00 +0000</pubDate></item>"
+        for day in days
+    )
+    return f"<rss><channel>{items}</channel></rss>".encode('utf-8')
+
+
+def serve(monkeypatch, responses):
+    """Answers each poll with the next (status, body) pair"""
+    def fake_fetch_urls(urls, request_headers=None, **kwargs):
+        status, body = responses.pop(0)
+        return [{'url': url, 'status': status, 'headers': {'etag': '"v1"'}, 'content': body,
+                 'error': None, 'elapsed': 0.0, 'truncated': False} for url in urls]
+    monkeypatch.setattr(feeds, 'fetch_urls', fake_fetch_urls)
+
+
+def polled_days(poll):
+    return [int(item['url'].rsplit('-', 1)[1]) for item in poll['items']]
+
+
+def test_items_past_max_items_are_returned_by_later_polls(monkeypatch, tmp_path):
+    monkeypatch.setattr(feeds, '_watermarks', feeds.FeedWatermarks(str(tmp_path / 'watermarks.json')))
+    serve(monkeypatch, [
+        (200, rss(1, 2, 3, 4, 5)),
+        (304, b''),                 # Feed unchanged: the overflow is still due
+        (200, rss(1, 2, 3, 4, 5, 6)),
+        (304, b''),
+    ])
+
+    assert polled_days(feeds.poll_feeds([FEED_URL], max_items=2, log=lambda msg: None)) == [5, 4]
+    assert polled_days(feeds.poll_feeds([FEED_URL], max_items=2, log=lambda msg: None)) == [3, 2]
+    # A newer item is taken first, the oldest pending one still follows
+    assert polled_days(feeds.poll_feeds([FEED_URL], max_items=2, log=lambda msg: None)) == [6, 1]
+    assert polled_days(feeds.poll_feeds([FEED_URL], max_items=2, log=lambda msg: None)) == []
@@ -0,0 +1,26 @@
+import asyncio
+
+from jobs import JobRegistry
+
+
+async def quick_job(job):
+    await asyncio.sleep(0.05)
+    return {'success': True}
+
+
+async def run_jobs(registry, count):
+    jobs = [registry.submit('memes', quick_job) for _ in range(count)]
+    await asyncio.sleep(0.01)
+    started = [job.status for job in jobs]
+    await asyncio.gather(*registry._tasks)
+    return started, [job.status for job in jobs]
+
+
+def test_registry_built_before_the_serving_loop_runs_queued_jobs():
+    # main.py builds its registry at import, before uvicorn starts its loop
+    registry = JobRegistry(max_concurrency=1, max_queued=5)
+
+    for _ in range(2):
+        started, finished = asyncio.run(run_jobs(registry, 3))
+        assert started == ['running', 'queued', 'queued']
+        assert finished == ['completed', 'completed', 'completed']
@@ -0,0 +1,32 @@
+from io import BytesIO
+
+import requests
+
+import outbox
+
+
+def stub_response(status, body):
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    return response
+
+
+def test_unreadable_200_is_retried_later(monkeypatch, tmp_path):
+    box = outbox.UploadOutbox(str(tmp_path / 'outbox'))
+    monkeypatch.setattr(outbox, '_outbox', box)
+    monkeypatch.setattr(outbox, 'OUTBOX_BACKOFF_SECONDS', 0)
+    box.add('http://kulfy.test/api/upload', 'Proxy page', {'file': ('meme.webp', BytesIO(b'image'), 'image/webp')},
+            {'title': 'Proxy page'}, 'Upload failed with status 503')
+
+    def proxy_page(url, files, data, log):
+        return stub_response(200, b'<html>Bad gateway</html>'), {'attempts': 1}
+
+    monkeypatch.setattr(outbox, 'post_upload', proxy_page)
+    [entry] = box.claim_due(1)
+    assert outbox.deliver(entry) is False
+
+    stats = box.stats()
+    assert (stats['pending'], stats['sending'], stats['failed']) == (1, 0, 0)
+    assert stats['recent'][0]['attempts'] == 1
+    assert 'unreadable response' in stats['recent'][0]['last_error']
@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+import httpx
+
+import agent
+import main
+
+
+class BlockingGraph:
+    """Stands in for the LangGraph agent: holds its thread like a real run"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def invoke(self, state):
+        time.sleep(self.seconds)
+        return dict(state, status='completed')
+
+
+def test_health_stays_responsive_while_a_graph_job_runs(monkeypatch):
+    monkeypatch.setattr(agent, 'create_meme_agent', lambda: BlockingGraph(1.5))
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://agent') as client:
+            started = (await client.post('/generate-memes', json={'urls': ['https://example.com/story']})).json()
+            assert started['success'], started
+            job_url = f"/jobs/{started['job_id']}"
+
+            latencies = []
+            for _ in range(10):
+                await asyncio.sleep(0.05)
+                begin = time.perf_counter()
+                response = await client.get('/health')
+                latencies.append(time.perf_counter() - begin)
+                assert response.status_code == 200
+            assert (await client.get(job_url)).json()['status'] == 'running'
+
+            while (await client.get(job_url)).json()['is_running']:
+                await asyncio.sleep(0.1)
+            return latencies, (await client.get(job_url)).json()
+
+    latencies, job = asyncio.run(scenario())
+    assert job['status'] == 'completed', job
+    assert max(latencies) < 0.25, latencies
@@ -0,0 +1,57 @@
+import agent
+from uploader import find_existing
+
+
+def run_job(name, count):
+    prompts = [{'title': f"{name} {n}", 'text_overlay': f"Caption {n}", 'visual_description': f"{name} scene {n}"}
+               for n in range(count)]
+    state = {'scraped_content': [], 'errors': [], 'force_refresh': True, 'caption_mode': 'dalle'}
+    return agent.generate_images(state, prompts)
+
+
+def test_batch_mode_uploads_a_job_in_one_bulk_request(kulfy):
+    state = run_job('Bulk', 3)
+
+    assert [path for path, _ in kulfy.requests] == ['/api/upload/bulk']
+    fields = kulfy.requests[0][1]
+    assert {name for name in fields if name.startswith('file.')} == {'file.0', 'file.1', 'file.2'}
+    assert [r['title'] for r in state['upload_results']] == ['Bulk 0', 'Bulk 1', 'Bulk 2']
+    assert all(r['success'] and r['id'] and r['cid'] for r in state['upload_results'])
+    assert all(r['timing']['batch_size'] == 3 for r in state['upload_results'])
+
+
+def test_batch_mode_falls_back_to_single_uploads_without_bulk_endpoint(kulfy):
+    kulfy.bulk = False
+
+    state = run_job('Fallback', 3)
+    assert [path for path, _ in kulfy.requests] == ['/api/upload/bulk'] + ['/api/upload'] * 3
+    assert all(r['success'] and r['id'] and r['cid'] for r in state['upload_results'])
+
+    # The 404 is remembered: the next job does not probe the bulk endpoint again
+    kulfy.requests.clear()
+    state = run_job('Fallback again', 2)
+    assert [path for path, _ in kulfy.requests] == ['/api/upload'] * 2
+    assert all(r['success'] for r in state['upload_results'])
+
+
+def test_cid_check_needs_a_post_id(kulfy):
+    upload_url = f"http://127.0.0.1:{kulfy.server_port}/api/upload"
+
+    assert find_existing(upload_url, 'bafkreiexample') is None
+    kulfy.head_post_id = 'post-123'
+    assert find_existing(upload_url, 'bafkreiexample') == 'post-123'
+
+
+def test_rerun_of_uploaded_prompt_is_already_uploaded_not_a_duplicate(kulfy, monkeypatch):
+    monkeypatch.setattr(agent, 'UPLOAD_CID_CHECK', 'local')
+
+    first = run_job('Rerun', 1)
+    assert first['upload_results'][0]['success']
+    kulfy.requests.clear()
+
+    results = run_job('Rerun', 1)['upload_results']
+    assert kulfy.requests == []
+    assert sum(1 for r in results if r.get('already_uploaded')) == 1
+    assert sum(1 for r in results if r.get('skipped')) == 0
+    result = results[0]
+    assert (result['cid'], result['id']) == (first['upload_results'][0]['cid'], first['upload_results'][0]['id'])
@@ -0,0 +1,184 @@
+"""
+Pooled upload client for posting memes to the Kulfy app
+
+One `requests.Session` lives for the whole process, so uploads reuse
+keep-alive connections instead of paying a TCP+TLS handshake per meme.
+Uploads that fail with a 5xx, a 429, a connection error or a timeout are
+retried with jittered exponential backoff. Retrying a POST is safe here:
+/api/upload is content-addressed (the same bytes pin to the same CID) and
+returns the existing post when it sees a CID again.
+
+Every call returns its timing (attempts, per-attempt seconds, total), and
+the client keeps process-wide counters for /health-style reporting.
+
+A bulk endpoint (/api/upload/bulk) takes a whole batch in one request. When
+a server answers it with 404/405/501 the URL is remembered as unsupported,
+so callers fall back to per-item uploads without probing it again.
+
+Configuration (environment variables):
+    UPLOAD_POOL_SIZE       - Keep-alive connections kept per host (default: 8)
+    UPLOAD_TIMEOUT         - Seconds per attempt, connect + read (default: 30)
+    UPLOAD_RETRIES         - Retries after the first attempt (default: 3)
+    UPLOAD_BACKOFF_SECONDS - Base delay for exponential backoff (default: 0.5)
+"""
+
+import os
+import time
+import atexit
+import random
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_POOL_SIZE = int(os.getenv("UPLOAD_POOL_SIZE", "8"))
+UPLOAD_TIMEOUT = float(os.getenv("UPLOAD_TIMEOUT", "30"))
+UPLOAD_RETRIES = int(os.getenv("UPLOAD_RETRIES", "3"))
+UPLOAD_BACKOFF_SECONDS = float(os.getenv("UPLOAD_BACKOFF_SECONDS", "0.5"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Statuses meaning "this server has no bulk endpoint"
+BULK_UNSUPPORTED_STATUSES = {404, 405, 501}
+
+# Multipart files as a {field: spec} dict, or a list of (field, spec) pairs
+# when field names repeat or are numbered (bulk uploads)
+Files = Union[Dict[str, Tuple], List[Tuple[str, Tuple]]]
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_stats = {'requests': 0, 'attempts': 0, 'retries': 0, 'failures': 0, 'seconds': 0.0}
+_stats_lock = threading.Lock()
+_bulk_unsupported = set()
+
+
+def _get_session() -> requests.Session:
+    """Returns the shared keep-alive session, creating it on first use"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=UPLOAD_POOL_SIZE, pool_block=False)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+def _rewind(files: Files):
+    """File objects are consumed by each attempt; start them over"""
+    specs = files.values() if isinstance(files, dict) else (spec for _, spec in files)
+    for spec in specs:
+        body = spec[1] if isinstance(spec, tuple) else spec
+        if hasattr(body, 'seek'):
+            body.seek(0)
+
+
+def _backoff(attempt: int, response: Optional[requests.Response]) -> float:
+    delay = UPLOAD_BACKOFF_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    try:
+        delay = max(delay, float(retry_after))
+    except (TypeError, ValueError):
+        pass
+    return delay
+
+
+def post_upload(url: str, files: Files, data: Dict[str, str], log=print) -> Tuple[requests.Response, Dict[str, Any]]:
+    """
+    POSTs a multipart upload, retrying transient failures.
+
+    Returns (response, timing) where timing is {'attempts', 'attempt_seconds',
+    'seconds', 'status'}. The last response is returned even if it is an
+    error status; if every attempt raised, the last exception is re-raised.
+    """
+    session = _get_session()
+    attempt_seconds = []
+    start = time.perf_counter()
+    response = None
+    error = None
+
+    for attempt in range(UPLOAD_RETRIES + 1):
+        _rewind(files)
+        attempt_start = time.perf_counter()
+        try:
+            response = session.post(url, files=files, data=data, timeout=UPLOAD_TIMEOUT)
+            error = None
+        except (requests.ConnectionError, requests.Timeout) as e:
+            response, error = None, e
+        attempt_seconds.append(round(time.perf_counter() - attempt_start, 3))
+
+        retryable = error is not None or response.status_code in RETRY_STATUSES
+        if not retryable or attempt == UPLOAD_RETRIES:
+            break
+        delay = _backoff(attempt, response)
+        reason = f"status {response.status_code}" if response is not None else type(error).__name__
+        log(f"   🔁 Upload attempt {attempt + 1} failed ({reason}), retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+    timing = {
+        'attempts': len(attempt_seconds),
+        'attempt_seconds': attempt_seconds,
+        'seconds': round(time.perf_counter() - start, 3),
+        'status': response.status_code if response is not None else None,
+    }
+    with _stats_lock:
+        _stats['requests'] += 1
+        _stats['attempts'] += timing['attempts']
+        _stats['retries'] += timing['attempts'] - 1
+        _stats['seconds'] += timing['seconds']
+        if response is None or response.status_code != 200:
+            _stats['failures'] += 1
+
+    if error is not None:
+        raise error
+    return response, timing
+
+
+def find_existing(url: str, cid: str) -> Optional[str]:
+    """
+    Asks the upload endpoint whether a CID is already posted, without sending
+    the bytes (HEAD url?cid=...). Returns the post ID, or None if the CID is
+    unknown or the server cannot tell.
+    """
+    try:
+        response = _get_session().head(url, params={'cid': cid}, timeout=UPLOAD_TIMEOUT)
+    except (requests.ConnectionError, requests.Timeout):
+        return None
+    # A bare 200 may come from a server or proxy that ignores the query
+    # (e.g. an /api/upload without a HEAD handler); only X-Post-Id counts
+    if response.status_code != 200:
+        return None
+    return response.headers.get('x-post-id') or None
+
+
+def bulk_supported(url: str) -> bool:
+    """False once the server at url has answered a bulk upload with 404/405/501"""
+    return url not in _bulk_unsupported
+
+
+def mark_bulk_unsupported(url: str):
+    _bulk_unsupported.add(url)
+
+
+def upload_stats() -> Dict[str, Any]:
+    """Process-wide upload counters and average latency"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['avg_seconds'] = round(stats['seconds'] / stats['requests'], 3) if stats['requests'] else 0.0
+    stats['seconds'] = round(stats['seconds'], 3)
+    return stats
+
+
+def close():
+    """Closes the shared session. Registered with atexit."""
+    global _session
+    with _session_lock:
+        session, _session = _session, None
+    if session is not None:
+        session.close()
+
+
+atexit.register(close)
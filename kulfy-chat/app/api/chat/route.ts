@@ -55,11 +55,13 @@ interface ConceptData {
 }
 
 interface AgentStatus {
+  job_id?: string;
+  status?: string;  // queued | running | completed | failed
   is_running?: boolean;
-  status?: string;
   last_result?: {
     success?: boolean;
     completed_at?: string;
+    error?: string;
     concepts?: ConceptData;
     summary?: {
       upload_results?: UploadResult[];
@@ -72,20 +74,27 @@ interface AgentStatus {
   current_step?: string;
 }
 
+// Status URL of one agent job; older agents without job IDs only have /status
+function agentJobStatusUrl(jobId?: string): string {
+  return jobId
+    ? `${KULFY_AGENT_URL}/jobs/${encodeURIComponent(jobId)}`
+    : `${KULFY_AGENT_URL}/status`;
+}
+
 // Helper function to poll for meme generation status
-async function pollMemeGenerationStatus(maxAttempts = 60): Promise<{
+async function pollMemeGenerationStatus(jobId?: string, maxAttempts = 60): Promise<{
   success: boolean;
   images?: Array<{ cid: string; title?: string; id?: string }>;
   error?: string;
 }> {
-  console.log('[POLL] 🔄 Starting polling (max attempts:', maxAttempts, ')');
+  console.log('[POLL] 🔄 Starting polling for job', jobId, '(max attempts:', maxAttempts, ')');
   for (let i = 0; i < maxAttempts; i++) {
     try {
       if (i % 10 === 0) {
         console.log('[POLL] ⏱️ Poll attempt', i + 1, '/', maxAttempts);
       }
       
-      const response = await fetch(`${KULFY_AGENT_URL}/status`);
+      const response = await fetch(agentJobStatusUrl(jobId));
       if (!response.ok) {
         console.log('[POLL] ⚠️ Status check failed, status:', response.status);
         continue;
@@ -96,6 +105,11 @@ async function pollMemeGenerationStatus(maxAttempts = 60): Promise<{
       console.log('[POLL] 📊 is_running:', status.is_running);
       console.log('[POLL] 📊 status field:', status.status);
       
+      if (status.status === 'failed') {
+        console.log('[POLL] ❌ Generation failed:', status.last_result?.error);
+        return { success: false, error: status.last_result?.error || 'Meme generation failed' };
+      }
+
       // Check if generation is complete (not running anymore)
       if (!status.is_running) {
         console.log('[POLL] ✅ Generation completed (is_running=false), checking results...');
@@ -364,7 +378,7 @@ Always be helpful and explain what you're doing.`;
           
           // Poll for completion
           console.log('[CHAT API] ⏳ Polling for image generation...');
-          const pollResult = await pollMemeGenerationStatus(60);
+          const pollResult = await pollMemeGenerationStatus(generateResult.job_id, 60);
           
           console.log('[CHAT API] 📊 Poll result:', JSON.stringify(pollResult));
           
@@ -457,7 +471,7 @@ Always be helpful and explain what you're doing.`;
           
           // Poll for completion
           console.log('[CHAT API] ⏳ Polling for image generation...');
-          const pollResult = await pollMemeGenerationStatus(60);
+          const pollResult = await pollMemeGenerationStatus(imagesInitResult.job_id, 60);
           
           if (pollResult.success && pollResult.images && pollResult.images.length > 0) {
             const imageMarkdown = pollResult.images.map((img, idx) => {
@@ -523,10 +537,14 @@ Always be helpful and explain what you're doing.`;
           for (let i = 0; i < 40; i++) {
             await new Promise(resolve => setTimeout(resolve, 3000));
             
-            const statusResponse = await fetch(`${KULFY_AGENT_URL}/status`);
+            const statusResponse = await fetch(agentJobStatusUrl(conceptsInitResult.job_id));
             if (statusResponse.ok) {
               const status = await statusResponse.json() as AgentStatus;
               
+              if (status.status === 'failed') {
+                console.log('[CHAT API] ❌ Concept generation failed:', status.last_result?.error);
+                break;
+              }
               if (!status.is_running && status.last_result?.concepts) {
                 conceptsReady = true;
                 conceptsData = status.last_result.concepts;
@@ -0,0 +1,119 @@
+import { z } from 'zod';
+import { pinFileToPinata } from '@/lib/pinata';
+import User from '@/models/User';
+import Post from '@/models/Post';
+
+// Validation schema
+export const uploadSchema = z.object({
+  title: z.string().max(140).optional(),
+  sourceUrl: z.string().url().optional().or(z.literal('')),
+  file: z.object({
+    type: z.enum(['image/png', 'image/jpeg', 'image/webp', 'image/gif']),
+    size: z.number().max(6 * 1024 * 1024), // 6MB max
+  }),
+  // Optional small rendition for the feed grid (sent by kulfy-agent)
+  thumbnail: z.object({
+    type: z.enum(['image/png', 'image/jpeg', 'image/webp']),
+    size: z.number().max(512 * 1024), // 512KB max
+  }).optional(),
+  width: z.number().int().positive().max(8192).optional(),
+  height: z.number().int().positive().max(8192).optional(),
+});
+
+export interface UploadFields {
+  title: string | null;
+  sourceUrl: string | null;
+  file: File;
+  thumbnail: File | null;
+  width: string | null;
+  height: string | null;
+}
+
+export type UploadOutcome =
+  | { ok: true; id: string; cid: string; duplicate: boolean }
+  | { ok: false; error: string; details?: string[] };
+
+/**
+ * Validate the fields of one upload
+ * @returns A list of validation errors, empty if the upload is valid
+ */
+export function validateUpload(fields: UploadFields): { errors: string[]; width?: number; height?: number } {
+  const validation = uploadSchema.safeParse({
+    title: fields.title || undefined,
+    sourceUrl: fields.sourceUrl || undefined,
+    file: {
+      type: fields.file.type,
+      size: fields.file.size,
+    },
+    thumbnail: fields.thumbnail ? {
+      type: fields.thumbnail.type,
+      size: fields.thumbnail.size,
+    } : undefined,
+    width: fields.width ? Number(fields.width) : undefined,
+    height: fields.height ? Number(fields.height) : undefined,
+  });
+
+  if (!validation.success) {
+    return { errors: validation.error.errors.map(e => `${e.path.join('.')}: ${e.message}`) };
+  }
+  return { errors: [], width: validation.data.width, height: validation.data.height };
+}
+
+/**
+ * Upsert the demo user that uploads are attributed to
+ */
+export async function getUploadUser() {
+  let user = await User.findOne({ handle: 'demo' });
+  if (!user) {
+    user = await User.create({ handle: 'demo' });
+    console.log('[UPLOAD] Created demo user');
+  }
+  return user;
+}
+
+/**
+ * Pin one validated upload and create its PENDING post.
+ * Expects an open DB connection. Same bytes, same CID: a retried upload
+ * gets the post it already created, flagged as a duplicate.
+ */
+export async function createUpload(
+  fields: UploadFields,
+  dimensions: { width?: number; height?: number },
+  userId: unknown
+): Promise<UploadOutcome> {
+  const { file, thumbnail } = fields;
+
+  // Upload to Pinata
+  console.log(`[UPLOAD] Uploading file to Pinata: ${file.name} (${file.type}, ${file.size} bytes)`);
+  const { cid } = await pinFileToPinata(file);
+  console.log(`[UPLOAD] File uploaded successfully. CID: ${cid}`);
+
+  const existing = await Post.findOne({ cid });
+  if (existing) {
+    console.log(`[UPLOAD] Post already exists for CID ${cid}: ${existing._id}`);
+    return { ok: true, id: existing._id.toString(), cid, duplicate: true };
+  }
+
+  let thumbCid: string | undefined;
+  if (thumbnail) {
+    console.log(`[UPLOAD] Uploading thumbnail to Pinata: ${thumbnail.name} (${thumbnail.type}, ${thumbnail.size} bytes)`);
+    ({ cid: thumbCid } = await pinFileToPinata(thumbnail));
+    console.log(`[UPLOAD] Thumbnail uploaded successfully. CID: ${thumbCid}`);
+  }
+
+  // Create post with PENDING status
+  const post = await Post.create({
+    cid,
+    title: fields.title || undefined,
+    mime: file.type,
+    width: dimensions.width,
+    height: dimensions.height,
+    thumbCid,
+    userId,
+    status: 'PENDING',
+    sourceUrl: fields.sourceUrl || undefined,
+  });
+
+  console.log(`[UPLOAD] Post created with ID: ${post._id}, status: ${post.status}`);
+  return { ok: true, id: post._id.toString(), cid, duplicate: false };
+}
@@ -9,6 +9,7 @@ export interface IPost extends Document {
   mime: string;
   width?: number;
   height?: number;
+  thumbCid?: string;
   userId: mongoose.Types.ObjectId;
   status: PostStatus;
   notes?: string;
@@ -39,6 +40,10 @@ const PostSchema = new Schema<IPost>({
   height: {
     type: Number,
   },
+  thumbCid: {
+    type: String,
+    trim: true,
+  },
   userId: {
     type: Schema.Types.ObjectId,
     ref: 'User',